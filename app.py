@@ -17,6 +17,10 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "senai_classroom_secret_key_2025_development")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+# Whole request cap: werkzeug refuses bigger uploads (413) before reading the body.
+# Per-type limits (image, Excel, logo) are in assets.UPLOAD_LIMITS.
+app.config["MAX_CONTENT_LENGTH"] = int(float(os.environ.get("MAX_UPLOAD_MB", 20)) * 1024 * 1024)
+
 # configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///senai_classrooms.db")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
@@ -30,136 +34,12 @@ db.init_app(app)
 
 with app.app_context():
     try:
-        # Import models to ensure tables are created
+        # Import models so every table is registered on db.metadata
         import models
         
-        # Test database connection first
-        from sqlalchemy import text
-        print(f"Testing database connection to: {app.config['SQLALCHEMY_DATABASE_URI'][:20]}...")
-        with db.engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        import logging
-        logging.info("Database connection successful!")
-        
-        # Create tables if they don't exist
-        db.create_all()
-        logging.info("Tables created/verified successfully!")
-        
-        # Add new columns if they don't exist (for existing databases)
-        try:
-            from sqlalchemy import text
-            with db.engine.connect() as conn:
-                migrations = [
-                    "ALTER TABLE classroom ADD COLUMN image_data BYTEA",
-                    "ALTER TABLE classroom ADD COLUMN excel_data BYTEA",
-                    "ALTER TABLE classroom ADD COLUMN image_mimetype VARCHAR(100)",
-                    "ALTER TABLE classroom ADD COLUMN excel_mimetype VARCHAR(100)",
-                    "ALTER TABLE classroom ADD COLUMN school_id INTEGER",
-                    "ALTER TABLE school ADD COLUMN logo_data BYTEA",
-                    "ALTER TABLE school ADD COLUMN logo_mimetype VARCHAR(100)",
-                    "ALTER TABLE incident ADD COLUMN is_resolved BOOLEAN DEFAULT FALSE",
-                    "ALTER TABLE incident ADD COLUMN admin_response TEXT",
-                    "ALTER TABLE incident ADD COLUMN response_date TIMESTAMP",
-                    "ALTER TABLE incident ADD COLUMN hidden_from_classroom BOOLEAN DEFAULT FALSE",
-                ]
-                
-                for migration in migrations:
-                    try:
-                        conn.execute(text(migration))
-                        conn.commit()
-                        logging.info(f"✅ Migration successful: {migration}")
-                    except Exception as e:
-                        conn.rollback()  # Crucial for PostgreSQL to clear the 'InFailedSqlTransaction' state
-                        pass # Column likely already exists
-        except Exception as migration_error:
-            import logging
-            logging.warning(f"Database migration error (non-critical): {migration_error}")
-            import traceback
-            traceback.print_exc()
-        
-        # Initialize sample data ONLY if no schools exist
-        existing_schools = models.School.query.first()
-        if not existing_schools:
-            try:
-                # Create default school
-                default_school = models.School(name="SENAI Morvan Figueiredo", admin_password="senai103103")
-                db.session.add(default_school)
-                db.session.commit()
-                logging.info("✅ Created default initial school.")
-            except Exception as e:
-                db.session.rollback()
-                logging.warning(f"Could not create default school: {e}")
-                
-        # Fix orphan classrooms (migration to multi-school)
-        try:
-            with db.engine.connect() as conn:
-                first_school = conn.execute(text("SELECT id FROM school LIMIT 1")).scalar()
-                if first_school is not None:
-                    conn.execute(text(f"UPDATE classroom SET school_id = {first_school} WHERE school_id IS NULL"))
-                    conn.execute(text("UPDATE schedule SET is_active = TRUE WHERE is_active IS NULL"))
-                    conn.commit()
-                    logging.info(f"✅ Orphan classrooms mapped to school {first_school}")
-        except Exception as e:
-            logging.warning(f"Error mapping orphan classrooms: {e}")
-
-        # Initialize sample data ONLY if no classrooms exist
-        existing_classrooms = models.Classroom.query.first()
-        if not existing_classrooms:
-            try:
-                # Create sample classrooms with explicit UTF-8 encoding
-                sample_classrooms = [
-                    {
-                        'name': 'Laboratorio de Jogos Digitais',
-                        'capacity': 34,
-                        'has_computers': True,
-                        'software': 'Unity, Unreal Engine, Blender',
-                        'description': 'Laboratorio especializado para desenvolvimento de jogos digitais.',
-                        'block': 'Oficina 1',
-                        'image_filename': ''
-                    },
-                    {
-                        'name': 'SALA DEV',
-                        'capacity': 34,
-                        'has_computers': True,
-                        'software': 'Visual Studio, Git, Docker',
-                        'description': 'Sala de desenvolvimento de sistemas.',
-                        'block': 'Oficina 2',
-                        'image_filename': ''
-                    },
-                    {
-                        'name': 'Sala 208',
-                        'capacity': 34,
-                        'has_computers': True,
-                        'software': 'IDE, Banco de dados',
-                        'description': 'Sala para desenvolvimento e banco de dados.',
-                        'block': 'Bloco A',
-                        'image_filename': ''
-                    },
-                    {
-                        'name': 'Sala 202',
-                        'capacity': 20,
-                        'has_computers': True,
-                        'software': 'Office, Visual Studio',
-                        'description': 'Sala para cursos FIC e desenvolvimento.',
-                        'block': 'Bloco A',
-                        'image_filename': ''
-                    }
-                ]
-                
-                for classroom_data in sample_classrooms:
-                    classroom = models.Classroom(**classroom_data)
-                    db.session.add(classroom)
-                
-                db.session.commit()
-                logging.info("Sample classrooms created successfully!")
-            except Exception as e:
-                logging.error(f"Error creating sample data: {e}")
-                import traceback
-                traceback.print_exc()
-                db.session.rollback()
-        else:
-            logging.info("Database already has data, skipping sample creation")
-            
+        # Apply pending schema migrations once (no-op when already up to date)
+        from migrations import run_migrations
+        run_migrations()
     except Exception as e:
         import logging
         logging.error(f"CRITICAL ERROR initializing database: {str(e)}")
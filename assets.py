@@ -0,0 +1,411 @@
+"""Armazenamento de arquivos binários (imagens, planilhas de patrimônio e logos).
+
+Cada arquivo é uma linha da tabela ``asset``, referenciada por id a partir de
+``Classroom``/``School``, de modo que as consultas de listagem nunca trafegam
+o conteúdo dos arquivos. Os bytes ficam na própria linha ou em disco, conforme
+o backend configurado (ver storage.py).
+
+Um asset nunca muda depois de gravado (trocar a imagem cria outro), então o
+início do seu sha256 serve de versão: as URLs levam ``?v=<versão>`` e podem ser
+guardadas pelo navegador para sempre (ver ``asset_url`` em routes.py).
+
+Os arquivos são deduplicados pelo sha256: enviar o mesmo arquivo para várias
+salas reaproveita o mesmo asset (e as mesmas miniaturas e entradas de cache),
+contando as referências em ``ref_count``. ``release_asset`` solta uma
+referência e apaga o asset quando a última é removida.
+
+Uploads são lidos em blocos (``spool_upload``), calculando o sha256 e
+conferindo o limite de tamanho do tipo de arquivo durante a leitura; o arquivo
+recusado nunca chega a ser copiado para o banco ou para o disco.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import bindparam, inspect, text, update
+
+from app import db
+from cache import register_cache
+from models import Asset
+from storage import StoredAsset, get_backend
+
+# Characters of the sha256 used as URL version and ETag
+VERSION_LENGTH = 16
+MAX_KNOWN_VERSIONS = 4096
+
+# Assets are immutable, so their versions never need invalidation
+_versions_lock = threading.Lock()
+_known_versions = OrderedDict()  # asset_id -> version
+
+# Small database-stored files (logos) kept in memory; never stale since assets are immutable
+BYTES_CACHE_MAX_BYTES = 8 * 1024 * 1024
+BYTES_CACHE_MAX_ITEM_BYTES = 512 * 1024
+
+MB = 1024 * 1024
+# Per-type upload limits; the whole request is capped by MAX_CONTENT_LENGTH (app.py)
+UPLOAD_LIMITS = {
+    'image': int(float(os.environ.get('IMAGE_UPLOAD_MAX_MB', 8)) * MB),
+    'excel': int(float(os.environ.get('EXCEL_UPLOAD_MAX_MB', 10)) * MB),
+    'logo': int(float(os.environ.get('LOGO_UPLOAD_MAX_MB', 2)) * MB),
+}
+CHUNK_SIZE = 64 * 1024
+SPOOL_MEMORY_BYTES = 1 * MB
+
+# An upload read and hashed, ready to be stored: `file` is positioned at the start
+SpooledUpload = namedtuple('SpooledUpload', 'file sha256 size')
+
+
+class UploadTooLarge(ValueError):
+    """Upload bigger than the limit of its file type"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        size = f"{limit / MB:.0f} MB" if limit >= MB else f"{limit / 1024:.0f} KB"
+        super().__init__(f"Arquivo muito grande (máximo {size})")
+
+# Columns that point to an (original) asset; each one holds a reference
+ASSET_REFERENCES = [
+    ('classroom', 'image_asset_id'),
+    ('classroom', 'excel_asset_id'),
+    ('school', 'logo_asset_id'),
+]
+
+# (table, legacy data column, legacy mimetype column, new asset id column)
+LEGACY_BLOB_COLUMNS = [
+    ('classroom', 'image_data', 'image_mimetype', 'image_asset_id'),
+    ('classroom', 'excel_data', 'excel_mimetype', 'excel_asset_id'),
+    ('school', 'logo_data', 'logo_mimetype', 'logo_asset_id'),
+]
+
+
+def _reuse_original(sha256, size):
+    """Existing original with this content, with one more reference; None if there is none"""
+    existing_id = db.session.query(Asset.id).filter(
+        Asset.sha256 == sha256, Asset.parent_id.is_(None)
+    ).order_by(Asset.id).limit(1).scalar()
+    if existing_id is None:
+        return None
+    # Atomic increment: concurrent uploads of the same file can't lose a reference
+    updated = db.session.execute(
+        update(Asset).where(Asset.id == existing_id).values(ref_count=Asset.ref_count + 1)
+    ).rowcount
+    if not updated:
+        return None
+    logging.debug(f"Asset {existing_id} reaproveitado ({size} bytes não duplicados)")
+    return db.session.get(Asset, existing_id)
+
+
+def _add_asset(sha256, size, stored_data, backend, mimetype, parent_id=None, variant=None):
+    asset = Asset(
+        sha256=sha256,
+        mimetype=mimetype,
+        size=size,
+        data=stored_data,
+        storage=backend.name,
+        parent_id=parent_id,
+        variant=variant,
+        ref_count=1
+    )
+    db.session.add(asset)
+    db.session.flush()
+    return asset
+
+
+def store_asset(data, mimetype=None, parent_id=None, variant=None):
+    """Asset for the given bytes, holding one new reference (flushed, not committed).
+
+    An original with the same content is reused instead of stored again.
+    Variants (parent_id set) belong to their original and are not shared.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    if parent_id is None:
+        existing = _reuse_original(sha256, len(data))
+        if existing is not None:
+            return existing
+    backend = get_backend()
+    return _add_asset(sha256, len(data), backend.save(sha256, data), backend, mimetype, parent_id, variant)
+
+
+def spool_upload(stream, max_bytes=None):
+    """Read an upload in chunks, hashing it and enforcing max_bytes (raises UploadTooLarge).
+
+    Seekable streams (werkzeug's temporary files) are hashed in place and
+    rewound; anything else is copied into a spooled temporary file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    in_place = hasattr(stream, 'seekable') and stream.seekable()
+    target = stream if in_place else tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    try:
+        if in_place:
+            stream.seek(0)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(chunk)
+            if not in_place:
+                target.write(chunk)
+    except Exception:
+        if not in_place:
+            target.close()
+        raise
+    target.seek(0)
+    return SpooledUpload(target, digest.hexdigest(), size)
+
+
+def store_spooled(upload, mimetype=None):
+    """Original asset for a spooled upload (see store_asset), without reading it whole when on disk"""
+    existing = _reuse_original(upload.sha256, upload.size)
+    if existing is not None:
+        return existing
+    backend = get_backend()
+    upload.file.seek(0)
+    stored_data = backend.save_file(upload.sha256, upload.file)
+    upload.file.seek(0)
+    return _add_asset(upload.sha256, upload.size, stored_data, backend, mimetype)
+
+
+def store_upload(file_storage, kind):
+    """Store a werkzeug FileStorage within the size limit of its kind ('image', 'excel', 'logo')"""
+    upload = spool_upload(file_storage.stream, UPLOAD_LIMITS[kind])
+    return store_spooled(upload, file_storage.mimetype)
+
+
+def _delete_assets(asset_ids):
+    """Delete originals and their variants (rows only; files are swept by storage.py gc)"""
+    if not asset_ids:
+        return
+    db.session.query(Asset).filter(Asset.parent_id.in_(asset_ids)).delete(synchronize_session=False)
+    db.session.query(Asset).filter(Asset.id.in_(asset_ids)).delete(synchronize_session=False)
+    with _versions_lock:
+        for asset_id in asset_ids:
+            _known_versions.pop(asset_id, None)
+    logo_bytes_cache.discard(asset_ids)
+    from images import forget_image_variants
+    forget_image_variants(asset_ids)
+
+
+def release_asset(asset_id):
+    """Drop one reference to an asset; the last one deletes it (not committed).
+
+    Call it after the referencing column was changed or its row deleted.
+    """
+    if not asset_id:
+        return
+    db.session.flush()  # The old reference must be gone before the row can be deleted
+    db.session.execute(
+        update(Asset).where(Asset.id == asset_id).values(ref_count=Asset.ref_count - 1)
+    )
+    remaining = db.session.query(Asset.ref_count).filter(Asset.id == asset_id).scalar()
+    if remaining is not None and remaining <= 0:
+        _delete_assets([asset_id])
+        logging.debug(f"Asset {asset_id} removido (sem referências)")
+
+
+def recount_references():
+    """Merge duplicate originals, recompute ref_count and delete unreferenced assets.
+
+    Returns (duplicates merged, unreferenced deleted).
+    """
+    duplicates = db.session.execute(text(
+        "SELECT sha256, MIN(id) FROM asset WHERE parent_id IS NULL GROUP BY sha256 HAVING COUNT(*) > 1"
+    )).all()
+    merged = 0
+    for sha256, keep_id in duplicates:
+        duplicate_ids = db.session.execute(text(
+            "SELECT id FROM asset WHERE sha256 = :sha256 AND parent_id IS NULL AND id <> :keep_id"
+        ), {'sha256': sha256, 'keep_id': keep_id}).scalars().all()
+        for table, column in ASSET_REFERENCES:
+            db.session.execute(
+                text(f"UPDATE {table} SET {column} = :keep_id WHERE {column} IN :duplicate_ids").bindparams(
+                    bindparam('duplicate_ids', expanding=True)),
+                {'keep_id': keep_id, 'duplicate_ids': duplicate_ids}
+            )
+        _delete_assets(duplicate_ids)
+        merged += len(duplicate_ids)
+
+    counts = ' + '.join(f"(SELECT COUNT(*) FROM {table} WHERE {table}.{column} = asset.id)"
+                        for table, column in ASSET_REFERENCES)
+    db.session.execute(text(f"UPDATE asset SET ref_count = {counts} WHERE parent_id IS NULL"))
+    orphan_ids = db.session.execute(text(
+        "SELECT id FROM asset WHERE parent_id IS NULL AND ref_count <= 0"
+    )).scalars().all()
+    _delete_assets(orphan_ids)
+    db.session.commit()
+    if merged or orphan_ids:
+        logging.info(f"✅ Assets: {merged} duplicados unificados, {len(orphan_ids)} sem referência removidos")
+    return merged, len(orphan_ids)
+
+
+def get_asset_content(asset_id):
+    """Return (data, mimetype) for an asset id, or (None, None) if missing"""
+    if not asset_id:
+        return None, None
+    row = db.session.query(Asset.data, Asset.mimetype, Asset.sha256, Asset.storage).filter(Asset.id == asset_id).first()
+    if not row:
+        return None, None
+    data = get_backend(row.storage).read(row.sha256, row.data)
+    if not data:
+        return None, None
+    return data, row.mimetype
+
+
+def _remember_versions(pairs):
+    with _versions_lock:
+        for asset_id, sha256 in pairs:
+            _known_versions[asset_id] = sha256[:VERSION_LENGTH] if sha256 else f'a{asset_id}'
+            _known_versions.move_to_end(asset_id)
+        while len(_known_versions) > MAX_KNOWN_VERSIONS:
+            _known_versions.popitem(last=False)
+
+
+def prime_asset_versions(asset_ids):
+    """Load, in one query, the versions of the assets not known yet (pages with many images)"""
+    with _versions_lock:
+        missing = {asset_id for asset_id in asset_ids if asset_id and asset_id not in _known_versions}
+    if missing:
+        _remember_versions(db.session.query(Asset.id, Asset.sha256).filter(Asset.id.in_(missing)).all())
+
+
+def asset_version(asset_id):
+    """Content version of an asset (start of its sha256), None if there is no asset"""
+    if not asset_id:
+        return None
+    with _versions_lock:
+        version = _known_versions.get(asset_id)
+    if version is None:
+        prime_asset_versions([asset_id])
+        with _versions_lock:
+            version = _known_versions.get(asset_id)
+    return version
+
+
+class AssetBytesCache:
+    """LRU of small database-stored assets, bounded by total bytes"""
+
+    def __init__(self, name, max_bytes=BYTES_CACHE_MAX_BYTES, max_item_bytes=BYTES_CACHE_MAX_ITEM_BYTES):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries = OrderedDict()  # asset_id -> StoredAsset
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        register_cache(self)
+
+    def get(self, asset_id):
+        with self._lock:
+            entry = self._entries.get(asset_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(asset_id)
+            self.hits += 1
+            return entry
+
+    def put(self, asset_id, stored):
+        # Files on disk are already served without a database read
+        if stored.data is None or len(stored.data) > self.max_item_bytes:
+            return
+        with self._lock:
+            if asset_id in self._entries:
+                return
+            self._entries[asset_id] = stored
+            self._size += len(stored.data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.data)
+
+    def discard(self, asset_ids):
+        with self._lock:
+            for asset_id in asset_ids:
+                evicted = self._entries.pop(asset_id, None)
+                if evicted is not None:
+                    self._size -= len(evicted.data)
+
+    def stats(self):
+        with self._lock:
+            return {'name': self.name, 'entries': len(self._entries), 'bytes': self._size,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+logo_bytes_cache = AssetBytesCache('logo_bytes')
+
+
+def open_asset(asset_id, cache=None):
+    """StoredAsset to send for an asset id (a file path or the bytes), None if missing.
+
+    With an AssetBytesCache, small database-stored assets are served from memory.
+    """
+    if not asset_id:
+        return None
+    if cache is not None:
+        cached = cache.get(asset_id)
+        if cached is not None:
+            return cached
+        stored = open_asset(asset_id)
+        if stored is not None:
+            cache.put(asset_id, stored)
+        return stored
+    # File-backed rows have an empty data column, so this never drags their bytes along
+    row = db.session.query(Asset.data, Asset.mimetype, Asset.sha256, Asset.storage).filter(Asset.id == asset_id).first()
+    if not row:
+        return None
+    _remember_versions([(asset_id, row.sha256)])
+    backend = get_backend(row.storage)
+    path = backend.path(row.sha256)
+    if path:
+        if not os.path.exists(path):
+            logging.error(f"Arquivo do asset {asset_id} não encontrado: {path}")
+            return None
+        return StoredAsset(row.mimetype, asset_version(asset_id), row.sha256, path, None)
+    if not row.data:
+        return None
+    return StoredAsset(row.mimetype, asset_version(asset_id), row.sha256, None, bytes(row.data))
+
+
+def migrate_legacy_blobs():
+    """Move BYTEA columns from classroom/school into the asset table.
+
+    Rows are moved one at a time so memory stays bounded by the largest file,
+    and the legacy column is cleared once its asset exists. Safe to run repeatedly.
+    """
+    inspector = inspect(db.engine)
+    moved = 0
+    for table, data_column, mime_column, asset_column in LEGACY_BLOB_COLUMNS:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if data_column not in columns or asset_column not in columns:
+            continue
+        mime_select = mime_column if mime_column in columns else 'NULL'
+
+        pending_ids = db.session.execute(text(
+            f"SELECT id FROM {table} WHERE {data_column} IS NOT NULL AND {asset_column} IS NULL"
+        )).scalars().all()
+
+        for row_id in pending_ids:
+            try:
+                data, mimetype = db.session.execute(text(
+                    f"SELECT {data_column}, {mime_select} FROM {table} WHERE id = :id"
+                ), {'id': row_id}).one()
+                if data:
+                    asset = store_asset(bytes(data), mimetype)
+                    db.session.execute(text(
+                        f"UPDATE {table} SET {asset_column} = :asset_id, {data_column} = NULL WHERE id = :id"
+                    ), {'asset_id': asset.id, 'id': row_id})
+                    moved += 1
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Erro ao migrar {table}.{data_column} (id={row_id}): {e}")
+
+    if moved:
+        logging.info(f"✅ {moved} arquivos movidos para a tabela asset")
+    return moved
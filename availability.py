@@ -0,0 +1,394 @@
+"""Motor de disponibilidade de salas por escola, data e turno.
+
+Uma única consulta carrega todos os horários ativos da escola que valem na
+data (dia da semana + período do curso); a partir desse snapshot os turnos são
+resolvidos em memória, sem novas idas ao banco. Usado por /available_now, pelo
+assistente virtual e pelos demais pontos que precisam saber quais salas estão
+livres.
+
+Para intervalos (semana, semestre) ``load_range_availability`` faz também uma
+única consulta e expande cada horário pelas suas datas de recorrência uma vez,
+montando a matriz salas × datas × turnos.
+
+Os resultados por (escola, data, turno) ficam em cache até a próxima escrita
+na escola (ver cache.py). Eles são carregados numa sessão própria e guardados
+desanexados, então um commit no request não os expira.
+"""
+from datetime import timedelta
+
+from sqlalchemy.orm import Session
+
+from app import db
+from cache import VersionedCache, get_data_version
+from models import Classroom, Schedule, Incident
+
+SHIFTS = ['morning', 'afternoon', 'fullday', 'night']
+SHIFT_NAMES = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
+DAY_NAMES = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+# Shift windows in minutes since midnight, used to detect the current period
+SHIFT_WINDOWS = {
+    'morning': (450, 720),     # 7:30-12:00
+    'afternoon': (780, 1080),  # 13:00-18:00
+    'night': (1110, 1350),     # 18:30-22:30
+    'fullday': (480, 1020),    # 8:00-17:00
+}
+
+# Which schedule shifts make a room busy for a requested shift.
+# Fullday classes (8:00-17:00) overlap morning and afternoon, never night.
+OVERLAPPING_SHIFTS = {
+    'morning': ('morning', 'fullday'),
+    'afternoon': ('afternoon', 'fullday'),
+    'fullday': ('morning', 'afternoon', 'fullday'),
+    'night': ('night',),
+}
+
+# Inverse of OVERLAPPING_SHIFTS: requested shifts made busy by a schedule of each shift
+BLOCKED_SHIFTS = {
+    busy: tuple(shift for shift in SHIFTS if busy in OVERLAPPING_SHIFTS[shift])
+    for busy in SHIFTS
+}
+
+# Upper bound for range queries (a full year covers any semester)
+MAX_RANGE_DAYS = 366
+
+availability_cache = VersionedCache('availability', max_entries=512)
+snapshot_cache = VersionedCache('school_snapshot', max_entries=64)
+
+# When several shifts are running at once, the specific one wins over fullday
+PRIMARY_SHIFT_ORDER = ['morning', 'afternoon', 'night', 'fullday']
+
+
+def current_shifts(now):
+    """Shifts running at the given time"""
+    minutes = now.hour * 60 + now.minute
+    return [shift for shift in ['morning', 'afternoon', 'night', 'fullday']
+            if SHIFT_WINDOWS[shift][0] <= minutes <= SHIFT_WINDOWS[shift][1]]
+
+
+def primary_shift(shifts):
+    for shift in PRIMARY_SHIFT_ORDER:
+        if shift in shifts:
+            return shift
+    return None
+
+
+def active_on_date_filter(target_date):
+    """SQL filter: schedule is active and its course period covers target_date"""
+    return db.and_(
+        Schedule.is_active == True,
+        Schedule.day_of_week == target_date.weekday(),
+        db.or_(Schedule.start_date.is_(None), Schedule.start_date <= target_date),
+        db.or_(Schedule.end_date.is_(None), Schedule.end_date >= target_date)
+    )
+
+
+def active_in_range_filter(start_date, end_date):
+    """SQL filter: schedule is active and its course period intersects [start_date, end_date]"""
+    return db.and_(
+        Schedule.is_active == True,
+        db.or_(Schedule.start_date.is_(None), Schedule.start_date <= end_date),
+        db.or_(Schedule.end_date.is_(None), Schedule.end_date >= start_date)
+    )
+
+
+def schedule_dates(schedule, start_date, end_date):
+    """Dates within [start_date, end_date] on which a weekly schedule runs"""
+    first = max(start_date, schedule.start_date) if schedule.start_date else start_date
+    last = min(end_date, schedule.end_date) if schedule.end_date else end_date
+    if schedule.day_of_week is None or schedule.day_of_week == 6 or first > last:
+        return
+    current = first + timedelta(days=(schedule.day_of_week - first.weekday()) % 7)
+    while current <= last:
+        yield current
+        current += timedelta(days=7)
+
+
+class DayAvailability:
+    """Snapshot of one school's rooms and the schedules running on one date"""
+
+    def __init__(self, target_date, classrooms, schedules):
+        self.date = target_date
+        self.classrooms = classrooms
+        self.schedules = schedules
+        self.schedules_by_shift = {shift: [] for shift in SHIFTS}
+        for schedule in schedules:
+            self.schedules_by_shift.setdefault(schedule.shift, []).append(schedule)
+
+    @classmethod
+    def from_schedules(cls, target_date, classrooms, schedules):
+        """Build the snapshot from schedules already loaded (one pass, no query)"""
+        if target_date.weekday() == 6:
+            return cls(target_date, classrooms, [])
+        weekday = target_date.weekday()
+        running = [
+            s for s in schedules
+            if s.is_active and s.day_of_week == weekday
+            and (s.start_date is None or s.start_date <= target_date)
+            and (s.end_date is None or s.end_date >= target_date)
+        ]
+        return cls(target_date, classrooms, running)
+
+    def occupied_schedules(self, shift=None, exact=False):
+        """Schedules that occupy rooms during `shift` (None = any shift of the day).
+
+        With exact=True only schedules registered under that very shift count.
+        """
+        if shift is None:
+            return list(self.schedules)
+        busy_shifts = (shift,) if exact else OVERLAPPING_SHIFTS.get(shift, (shift,))
+        result = []
+        for busy_shift in busy_shifts:
+            result.extend(self.schedules_by_shift.get(busy_shift, []))
+        return result
+
+    def for_shift(self, shift=None, exact=False):
+        """Available/occupied rooms for one shift (None = any shift of the day)"""
+        occupied_schedules = self.occupied_schedules(shift, exact=exact)
+        schedule_map = {}
+        for schedule in occupied_schedules:
+            schedule_map.setdefault(schedule.classroom_id, []).append(schedule)
+        return {
+            'available_rooms': [room for room in self.classrooms if room.id not in schedule_map],
+            'occupied_rooms': [room for room in self.classrooms if room.id in schedule_map],
+            'occupied_schedules': occupied_schedules,
+            'occupied_schedule_map': schedule_map,
+        }
+
+    def by_shift(self):
+        """{shift: for_shift(shift)} for every shift at once"""
+        return {shift: self.for_shift(shift) for shift in SHIFTS}
+
+
+def load_day_availability(school_id, target_date, classrooms=None, session=None):
+    """Load rooms and all schedules active on target_date for a school.
+
+    `classrooms` can be passed when the caller already has them loaded.
+    """
+    session = session or db.session
+    if classrooms is None:
+        classroom_query = session.query(Classroom)
+        if school_id:
+            classroom_query = classroom_query.filter_by(school_id=school_id)
+        classrooms = classroom_query.order_by(Classroom.id).all()
+
+    if target_date.weekday() == 6:  # Sunday - school closed
+        return DayAvailability(target_date, classrooms, [])
+
+    schedule_query = session.query(Schedule).filter(active_on_date_filter(target_date))
+    if school_id:
+        schedule_query = schedule_query.join(Classroom).filter(Classroom.school_id == school_id)
+    return DayAvailability(target_date, classrooms, schedule_query.all())
+
+
+class RangeAvailability:
+    """Occupancy matrix of one school's rooms over a date range.
+
+    ``occupancy`` is {classroom_id: {date: {shift: [schedule, ...]}}} and only
+    holds busy cells; a missing cell means the room is free in that shift.
+    """
+
+    def __init__(self, start_date, end_date, classrooms, schedules):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.classrooms = classrooms
+        self.schedules = schedules
+        self.occupancy = {}
+        for schedule in schedules:
+            blocked = BLOCKED_SHIFTS.get(schedule.shift, (schedule.shift,))
+            room_cells = None
+            for day in schedule_dates(schedule, start_date, end_date):
+                if room_cells is None:
+                    room_cells = self.occupancy.setdefault(schedule.classroom_id, {})
+                cell = room_cells.setdefault(day, {})
+                for shift in blocked:
+                    cell.setdefault(shift, []).append(schedule)
+
+    @property
+    def dates(self):
+        return [self.start_date + timedelta(days=offset)
+                for offset in range((self.end_date - self.start_date).days + 1)]
+
+    def busy_schedules(self, classroom_id, target_date, shift):
+        return self.occupancy.get(classroom_id, {}).get(target_date, {}).get(shift, [])
+
+    def is_free(self, classroom_id, target_date, shift):
+        return target_date.weekday() != 6 and not self.busy_schedules(classroom_id, target_date, shift)
+
+    def free_counts(self, shifts=None):
+        """{date: {shift: number of free rooms}}, Sundays count as closed (0)"""
+        shifts = shifts or SHIFTS
+        counts = {}
+        for day in self.dates:
+            counts[day] = {}
+            for shift in shifts:
+                if day.weekday() == 6:
+                    counts[day][shift] = 0
+                else:
+                    counts[day][shift] = sum(
+                        1 for room in self.classrooms if not self.busy_schedules(room.id, day, shift)
+                    )
+        return counts
+
+    def to_dict(self, shifts=None):
+        """JSON-ready representation: schedules are listed once and referenced by id"""
+        shifts = shifts or SHIFTS
+        occupancy = {}
+        used_schedules = {}
+        for classroom_id, days in self.occupancy.items():
+            room_days = {}
+            for day, cells in sorted(days.items()):
+                room_cells = {shift: [schedule.id for schedule in cells[shift]]
+                              for shift in shifts if shift in cells}
+                if room_cells:
+                    room_days[day.isoformat()] = room_cells
+                    for shift in room_cells:
+                        for schedule in cells[shift]:
+                            used_schedules[schedule.id] = schedule
+            if room_days:
+                occupancy[str(classroom_id)] = room_days
+
+        return {
+            'start': self.start_date.isoformat(),
+            'end': self.end_date.isoformat(),
+            'shifts': list(shifts),
+            'dates': [day.isoformat() for day in self.dates],
+            'rooms': [{
+                'id': room.id,
+                'name': room.name,
+                'block': room.block,
+                'capacity': room.capacity,
+            } for room in self.classrooms],
+            'schedules': {str(schedule_id): {
+                'classroom_id': schedule.classroom_id,
+                'shift': schedule.shift,
+                'course_name': schedule.course_name,
+                'instructor': schedule.instructor,
+                'start_time': schedule.start_time,
+                'end_time': schedule.end_time,
+            } for schedule_id, schedule in sorted(used_schedules.items())},
+            'occupancy': occupancy,
+            'free_counts': {day.isoformat(): counts for day, counts in self.free_counts(shifts).items()},
+        }
+
+
+def load_range_availability(school_id, start_date, end_date, classroom_id=None):
+    """Load rooms and every schedule intersecting [start_date, end_date] in one query each.
+
+    Raises ValueError for an inverted range or one longer than MAX_RANGE_DAYS.
+    """
+    if end_date < start_date:
+        raise ValueError("Data final anterior à data inicial")
+    if (end_date - start_date).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"Intervalo máximo de {MAX_RANGE_DAYS} dias")
+
+    classroom_query = Classroom.query
+    schedule_query = Schedule.query.filter(active_in_range_filter(start_date, end_date))
+    if school_id:
+        classroom_query = classroom_query.filter_by(school_id=school_id)
+        schedule_query = schedule_query.join(Classroom).filter(Classroom.school_id == school_id)
+    if classroom_id:
+        classroom_query = classroom_query.filter(Classroom.id == classroom_id)
+        schedule_query = schedule_query.filter(Schedule.classroom_id == classroom_id)
+
+    classrooms = classroom_query.order_by(Classroom.id).all()
+    return RangeAvailability(start_date, end_date, classrooms, schedule_query.all())
+
+
+def describe_period(target_date, shift_filter, now_shifts=None):
+    """Human readable description of the period being checked"""
+    day_name = DAY_NAMES[target_date.weekday()]
+    if shift_filter and shift_filter != 'all':
+        return f"{day_name} - {SHIFT_NAMES.get(shift_filter, shift_filter)} (Filtro Específico)"
+    if now_shifts is not None:
+        if now_shifts:
+            names = []
+            for shift in now_shifts:
+                name = SHIFT_NAMES.get(shift, shift)
+                if name not in names:
+                    names.append(name)
+            return f"{day_name} - {', '.join(names)} (Agora)"
+        return f"{day_name} - Fora do horário"
+    return f"{day_name} - Todos os turnos"
+
+
+def shift_availability(school_id, target_date, shift=None, exact=False):
+    """DayAvailability.for_shift() plus 'classrooms' and 'total_rooms', cached per
+    (school, date, shift) until the school's data version changes.
+
+    The returned lists are shared with the cache and must not be modified.
+    """
+    def compute():
+        with Session(db.engine) as session:
+            day = load_day_availability(school_id, target_date, session=session)
+        result = day.for_shift(shift, exact=exact)
+        result['classrooms'] = day.classrooms
+        result['total_rooms'] = len(day.classrooms)
+        return result
+
+    if not school_id:
+        return compute()
+    key = (school_id, target_date, shift, exact)
+    return dict(availability_cache.get_or_compute(key, get_data_version(school_id), compute))
+
+
+def load_school_snapshot(school_id):
+    """(classrooms, active schedules, active incidents) of a school, cached until its next write"""
+    def compute():
+        with Session(db.engine) as session:
+            classrooms = session.query(Classroom).filter_by(school_id=school_id).order_by(Classroom.id).all()
+            schedules = session.query(Schedule).join(Classroom).filter(
+                Classroom.school_id == school_id,
+                Schedule.is_active == True
+            ).all()
+            incidents = session.query(Incident).join(Classroom).filter(
+                Classroom.school_id == school_id,
+                Incident.is_active == True
+            ).all()
+        return classrooms, schedules, incidents
+
+    return snapshot_cache.get_or_compute(school_id, get_data_version(school_id), compute)
+
+
+def get_availability(school_id, target_date, shift_filter=None, now=None):
+    """Resolve availability for a date.
+
+    - shift_filter 'morning'/'afternoon'/'fullday'/'night': rooms busy in that shift
+      (fullday classes count for morning and afternoon)
+    - no filter and target_date is today (`now` given): the shift running now
+    - no filter on any other date: rooms busy at any time of the day
+    """
+    is_today = now is not None and target_date == now.date()
+
+    now_shifts = None
+    if target_date.weekday() == 6:
+        closed_description = "Domingo - Escola fechada"
+    elif shift_filter and shift_filter != 'all':
+        closed_description = None
+        result = shift_availability(school_id, target_date, shift_filter)
+    elif is_today:
+        now_shifts = current_shifts(now)
+        closed_description = None if now_shifts else "Fora do horário de funcionamento"
+        if now_shifts:
+            shift = primary_shift(now_shifts)
+            # Between 12:00 and 13:00 only fullday classes are actually running
+            result = shift_availability(school_id, target_date, shift, exact=(shift == 'fullday'))
+    else:
+        closed_description = None
+        result = shift_availability(school_id, target_date, None)
+
+    if closed_description:
+        day = shift_availability(school_id, target_date, None)
+        return {
+            'available_rooms': day['classrooms'],
+            'occupied_rooms': [],
+            'occupied_schedules': [],
+            'occupied_schedule_map': {},
+            'period_description': closed_description,
+            'total_rooms': day['total_rooms'],
+            'closed': True
+        }
+
+    result['period_description'] = describe_period(target_date, shift_filter, now_shifts)
+    result['closed'] = False
+    return result
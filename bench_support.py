@@ -0,0 +1,54 @@
+"""Base comum dos benchmarks e das verificações de número de consultas.
+
+Cada script chama use_scratch_database() antes de `import app` (o app lê
+DATABASE_URL ao ser importado), popula a própria escola e mede com
+QueryCounter. Por padrão o banco é um SQLite novo num diretório temporário;
+BENCH_DATABASE_URL aponta para outro banco (ex.: um PostgreSQL de teste).
+"""
+import os
+import tempfile
+
+from sqlalchemy import event
+
+
+def use_scratch_database(prefix, filename='bench.db'):
+    """Point DATABASE_URL at BENCH_DATABASE_URL or a fresh SQLite file; call before importing app"""
+    if os.environ.get('BENCH_DATABASE_URL'):
+        os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix=prefix)
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp_dir, filename)}"
+    return os.environ['DATABASE_URL']
+
+
+class QueryCounter:
+    """Counts SQL statements run on `engine` inside a `with` block (reset on every entry)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+        return False
+
+
+def get_or_create_school(name, admin_password='benchmark'):
+    """Id of the school called `name`, created on the first run; needs an app context"""
+    from app import db
+    from models import School
+
+    school = School.query.filter_by(name=name).first()
+    if not school:
+        school = School(name=name, admin_password=admin_password)
+        db.session.add(school)
+        db.session.commit()
+    return school.id
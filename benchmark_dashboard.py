@@ -0,0 +1,92 @@
+"""Benchmark do serviço de dados do dashboard com escolas de até 500 salas.
+
+Cria um banco SQLite temporário (ou usa BENCH_DATABASE_URL), popula uma escola
+com N salas e 12 horários por sala, e mede para cada tamanho:
+- quantas consultas SQL o dashboard faz (deve ser constante);
+- o tempo mediano de dashboard_service.get_dashboard_data;
+- o tempo da contagem antiga de ocupação (lista de ids refeita por horário).
+
+Uso: python benchmark_dashboard.py [repetições]
+"""
+import statistics
+import sys
+import time
+
+from bench_support import use_scratch_database, QueryCounter, get_or_create_school
+
+use_scratch_database('dashboard_bench_')
+
+from datetime import date  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import Classroom, Schedule  # noqa: E402
+import dashboard_service  # noqa: E402
+
+SIZES = [50, 100, 250, 500]
+SHIFTS_PER_DAY = [('morning', '07:30', '12:00'), ('night', '18:30', '22:30')]
+SOFTWARE = ['Office', 'Unity', 'Blender', 'Visual Studio', 'AutoCAD', 'Python', 'Git', 'Docker']
+
+
+def populate(school_id, start, end):
+    for number in range(start, end):
+        classroom = Classroom(
+            name=f'Sala {number:03d}',
+            capacity=16 + number % 30,
+            has_computers=number % 3 != 0,
+            software=', '.join(SOFTWARE[number % len(SOFTWARE):][:3]),
+            description='',
+            block=f'Bloco {chr(65 + number % 6)}',
+            school_id=school_id
+        )
+        db.session.add(classroom)
+        db.session.flush()
+        for day in range(6):
+            for shift, start_time, end_time in SHIFTS_PER_DAY:
+                db.session.add(Schedule(
+                    classroom_id=classroom.id, day_of_week=day, shift=shift,
+                    course_name=f'Curso {number % 40}', instructor=f'Professor {number % 25}',
+                    start_time=start_time, end_time=end_time,
+                    start_date=date(2025, 1, 1), end_date=date(2030, 12, 31)
+                ))
+    db.session.commit()
+
+
+def legacy_occupied_slots(classrooms, schedules):
+    # Old dashboard(): the id list was rebuilt for every schedule (rooms x schedules)
+    return len([s for s in schedules if s.classroom_id in [c.id for c in classrooms]])
+
+
+def run(repetitions):
+    with app.app_context():
+        school_id = get_or_create_school('Benchmark Dashboard')
+        counter = QueryCounter(db.engine)
+        existing = Classroom.query.filter_by(school_id=school_id).count()
+        today = date(2026, 3, 4)
+
+        print(f"{'salas':>6} {'horários':>9} {'consultas':>10} {'mediana ms':>11} {'ms/sala':>8} {'contagem antiga ms':>19}")
+        for size in SIZES:
+            if existing < size:
+                populate(school_id, existing, size)
+                existing = size
+
+            timings = []
+            for _ in range(repetitions):
+                db.session.expire_all()
+                with counter:
+                    started = time.perf_counter()
+                    data = dashboard_service.get_dashboard_data(school_id, today)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = counter.count
+
+            schedules = [s for day in data['schedule_map'].values() for shifts in day.values() for s in shifts.values()]
+            started = time.perf_counter()
+            legacy_occupied_slots(data['classrooms'], schedules)
+            legacy_ms = (time.perf_counter() - started) * 1000
+
+            median = statistics.median(timings)
+            print(f"{len(data['classrooms']):>6} {data['occupied_slots']:>9} {queries:>10} "
+                  f"{median:>11.1f} {median / len(data['classrooms']):>8.3f} {legacy_ms:>19.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
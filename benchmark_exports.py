@@ -0,0 +1,86 @@
+"""Benchmark da exportação para Excel com escolas de até 40 mil horários.
+
+Cria um banco SQLite temporário (ou usa BENCH_DATABASE_URL), popula uma escola
+com N salas e 20 horários por sala, e mede para cada tamanho, em
+exports.write_school_workbook:
+- quantas consultas SQL são feitas (deve ser constante);
+- o tempo total e o tempo por mil horários (deve ser constante: custo linear);
+- o pico de memória Python alocada durante a exportação (tracemalloc, numa
+  segunda execução).
+
+Uso: python benchmark_exports.py
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_support import use_scratch_database, QueryCounter, get_or_create_school
+
+use_scratch_database('exports_bench_')
+
+from datetime import date  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import Classroom, Schedule  # noqa: E402
+import exports  # noqa: E402
+
+SIZES = [100, 500, 2000]
+SHIFTS_PER_DAY = [('morning', '07:30', '12:00'), ('afternoon', '13:00', '17:00'),
+                  ('night', '18:30', '22:30'), ('fullday', '08:00', '17:00')]
+
+
+def populate(school_id, start, end):
+    classrooms = [dict(name=f'Sala {number:04d}', capacity=16 + number % 30, has_computers=number % 3 != 0,
+                       software='Office, Python, Git', description='Sala de benchmark',
+                       block=f'Bloco {chr(65 + number % 6)}', school_id=school_id)
+                  for number in range(start, end)]
+    db.session.execute(db.insert(Classroom), classrooms)
+    room_ids = [room_id for (room_id,) in db.session.query(Classroom.id).filter(
+        Classroom.school_id == school_id).order_by(Classroom.id).offset(start)]
+    db.session.execute(db.insert(Schedule), [
+        dict(classroom_id=room_id, day_of_week=day, shift=shift, course_name=f'Curso {room_id % 40}',
+             instructor=f'Professor {room_id % 25}', start_time=start_time, end_time=end_time,
+             start_date=date(2025, 1, 1), end_date=date(2030, 12, 31), is_active=True)
+        for room_id in room_ids for day in range(5) for shift, start_time, end_time in SHIFTS_PER_DAY
+    ])
+    db.session.commit()
+
+
+def run():
+    with app.app_context():
+        school_id = get_or_create_school('Benchmark Exports')
+        counter = QueryCounter(db.engine)
+        existing = Classroom.query.filter_by(school_id=school_id).count()
+
+        print(f"{'salas':>6} {'horários':>9} {'consultas':>10} {'tempo ms':>9} {'ms/mil':>7} {'pico MB':>8} {'arquivo KB':>11}")
+        for size in SIZES:
+            if existing < size:
+                populate(school_id, existing, size)
+                existing = size
+            schedules = Schedule.query.join(Classroom).filter(Classroom.school_id == school_id).count()
+            db.session.expire_all()
+
+            with tempfile.TemporaryFile() as output:
+                with counter:
+                    started = time.perf_counter()
+                    exports.write_school_workbook(output, school_id)
+                    elapsed = (time.perf_counter() - started) * 1000
+                file_kb = output.tell() / 1024
+
+            # Second run only for the memory peak: tracemalloc slows everything down
+            with tempfile.TemporaryFile() as output:
+                tracemalloc.start()
+                exports.write_school_workbook(output, school_id)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            print(f"{size:>6} {schedules:>9} {counter.count:>10} {elapsed:>9.0f} "
+                  f"{elapsed / schedules * 1000:>7.0f} {peak / 1024 / 1024:>8.1f} {file_kb:>11.0f}")
+
+
+if __name__ == '__main__':
+    if not exports.openpyxl:
+        print("openpyxl não está instalado.")
+        sys.exit(1)
+    run()
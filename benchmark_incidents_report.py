@@ -0,0 +1,95 @@
+"""Benchmark do relatório de ocorrências em PDF com até 5 mil ocorrências.
+
+Cria um banco SQLite temporário (ou usa BENCH_DATABASE_URL), popula uma escola
+com 50 salas e N ocorrências, e mede para cada tamanho, em
+reports.load_report_incidents + pdf_generator.generate_incidents_report:
+- quantas consultas SQL são feitas (deve ser constante: uma só, com JOIN);
+- o tempo total e o tempo por mil ocorrências (deve ser constante: custo linear);
+- o pico de memória Python alocada (tracemalloc, numa segunda execução) e o
+  pico por mil ocorrências;
+- o tamanho e o número de páginas do PDF.
+
+Uso: python benchmark_incidents_report.py
+"""
+import sys
+import time
+import tracemalloc
+
+from bench_support import use_scratch_database, QueryCounter, get_or_create_school
+
+use_scratch_database('incidents_bench_')
+
+from datetime import datetime, timedelta  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import Classroom, Incident  # noqa: E402
+import reports  # noqa: E402
+
+SIZES = [250, 1000, 5000]
+ROOMS = 50
+DESCRIPTION = 'Projetor não liga e o cabo HDMI da mesa do professor está com mau contato <urgente> & sem peça. '
+
+
+def populate(school_id, start, end):
+    room_ids = [room_id for (room_id,) in db.session.query(Classroom.id).filter(
+        Classroom.school_id == school_id).order_by(Classroom.id)]
+    if not room_ids:
+        db.session.execute(db.insert(Classroom), [
+            dict(name=f'Sala {number:03d}', capacity=30, has_computers=True, software='', description='',
+                 block='Bloco A', school_id=school_id) for number in range(ROOMS)])
+        room_ids = [room_id for (room_id,) in db.session.query(Classroom.id).filter(
+            Classroom.school_id == school_id).order_by(Classroom.id)]
+    first = datetime(2025, 1, 1, 8, 0)
+    db.session.execute(db.insert(Incident), [
+        dict(classroom_id=room_ids[number % len(room_ids)], reporter_name=f'Professor {number % 25}',
+             reporter_email=f'professor{number % 25}@senai.br', description=DESCRIPTION * (1 + number % 3),
+             created_at=first + timedelta(hours=number), is_active=True, hidden_from_classroom=False,
+             is_resolved=number % 2 == 0,
+             admin_response='Chamado aberto com a manutenção.' if number % 2 == 0 else None,
+             response_date=first + timedelta(hours=number + 4) if number % 2 == 0 else None)
+        for number in range(start, end)
+    ])
+    db.session.commit()
+
+
+def build_report(school_id):
+    incidents = reports.load_report_incidents(school_id)
+    return reports.generate_incidents_report(incidents, school_name='Benchmark', filter_info=[])
+
+
+def run():
+    with app.app_context():
+        school_id = get_or_create_school('Benchmark Ocorrências')
+        counter = QueryCounter(db.engine)
+        existing = Incident.query.join(Classroom).filter(Classroom.school_id == school_id).count()
+
+        print(f"{'ocorrências':>11} {'consultas':>10} {'tempo ms':>9} {'ms/mil':>7} "
+              f"{'pico MB':>8} {'MB/mil':>7} {'páginas':>8} {'PDF KB':>7}")
+        for size in SIZES:
+            if existing < size:
+                populate(school_id, existing, size)
+                existing = size
+            db.session.expire_all()
+
+            with counter:
+                started = time.perf_counter()
+                pdf = build_report(school_id).getvalue()
+                elapsed = (time.perf_counter() - started) * 1000
+            pages = pdf.count(b'/Type /Page\n')
+
+            # Second run only for the memory peak: tracemalloc slows everything down
+            tracemalloc.start()
+            build_report(school_id)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peak_mb = peak / 1024 / 1024
+
+            print(f"{size:>11} {counter.count:>10} {elapsed:>9.0f} {elapsed / size * 1000:>7.0f} "
+                  f"{peak_mb:>8.1f} {peak_mb / size * 1000:>7.1f} {pages:>8} {len(pdf) / 1024:>7.0f}")
+
+
+if __name__ == '__main__':
+    if not reports.generate_incidents_report:
+        print("reportlab não está instalado.")
+        sys.exit(1)
+    run()
@@ -0,0 +1,196 @@
+"""Cache em memória versionado por escola.
+
+Cada escola tem um ``data_version`` (coluna em ``school``) incrementado por
+todas as rotas que alteram salas, horários ou ocorrências. As entradas do cache
+guardam a versão com que foram calculadas, então uma escrita invalida tudo o
+que foi calculado antes dela, em todos os workers, sem precisar apagar nada.
+
+Recalcular é "single-flight": se vários requests pedem a mesma chave ao mesmo
+tempo (ex.: vários QR codes lidos na troca de turma), só um vai ao banco e os
+outros esperam o resultado.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+from app import db
+
+# How long a worker trusts the data version it read from the database.
+# Writes made by this process are visible immediately; writes made by other
+# gunicorn workers are picked up after at most this many seconds.
+VERSION_TTL_SECONDS = 2.0
+
+_version_lock = threading.Lock()
+_known_versions = {}  # school_id -> (version, read_at)
+
+# Every in-process cache, for /admin/cache_stats
+_registry = []
+
+
+def register_cache(cache):
+    """Make a cache (anything with a stats() method) show up in all_cache_stats"""
+    _registry.append(cache)
+    return cache
+
+
+def all_cache_stats():
+    return [cache.stats() for cache in _registry]
+
+
+def get_data_version(school_id):
+    """Current data version of a school (0 when unknown)"""
+    if not school_id:
+        return 0
+    now = time.monotonic()
+    with _version_lock:
+        known = _known_versions.get(school_id)
+    if known and now - known[1] < VERSION_TTL_SECONDS:
+        return known[0]
+
+    version = db.session.execute(
+        text("SELECT data_version FROM school WHERE id = :school_id"), {'school_id': school_id}
+    ).scalar() or 0
+    with _version_lock:
+        _known_versions[school_id] = (version, now)
+    return version
+
+
+def bump_data_version(school_id):
+    """Invalidate every cached value of a school.
+
+    Runs inside the caller's transaction, so the new version becomes visible
+    together with the write it describes (call it before db.session.commit()).
+    """
+    if not school_id:
+        return
+    db.session.execute(
+        text("UPDATE school SET data_version = COALESCE(data_version, 0) + 1 WHERE id = :school_id"),
+        {'school_id': school_id}
+    )
+    with _version_lock:
+        _known_versions.pop(school_id, None)
+
+
+class _Flight:
+    """A computation in progress that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class VersionedCache:
+    """LRU cache of values tagged with the school data version they were built from
+
+    With max_bytes the cache is also bounded by the total len() of its values
+    (bytes), and a value bigger than max_bytes is returned but not kept.
+    """
+
+    def __init__(self, name, max_entries=256, wait_timeout=30, max_bytes=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # key -> (version, value, size)
+        self._size = 0
+        self._flights = {}  # (key, version) -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        register_cache(self)
+
+    def get_or_compute(self, key, version, compute):
+        """Return the value cached for key at this version, computing it once if needed"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            flight = self._flights.get((key, version))
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[(key, version)] = flight
+
+        if not leader:
+            # Someone else is already rebuilding this key: wait for their result
+            if flight.done.wait(self.wait_timeout) and not flight.failed:
+                return flight.value
+            return compute()
+
+        try:
+            value = compute()
+            flight.value = value
+            with self._lock:
+                self.rebuilds += 1
+                self._store(key, version, value)
+            return value
+        except Exception:
+            flight.failed = True
+            raise
+        finally:
+            flight.done.set()
+            with self._lock:
+                self._flights.pop((key, version), None)
+
+    def peek(self, key, version):
+        """The value cached for key at this version, or None (never computes)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, value):
+        """Store a value built elsewhere (e.g. by a batch) for key at this version"""
+        with self._lock:
+            self._store(key, version, value)
+
+    def _store(self, key, version, value):
+        # Caller holds the lock
+        size = len(value) if self.max_bytes is not None and value is not None else 0
+        current = self._entries.get(key)
+        # Never replace a value built from a newer version
+        if (current is None or current[0] <= version) and (self.max_bytes is None or size <= self.max_bytes):
+            self._remove(key)
+            self._entries[key] = (version, value, size)
+            self._size += size
+        while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._size > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        # Caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def discard(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'name': self.name,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'rebuilds': self.rebuilds,
+            }
+            if self.max_bytes is not None:
+                stats['bytes'] = self._size
+            return stats
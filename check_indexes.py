@@ -0,0 +1,34 @@
+"""Confere via EXPLAIN se as consultas quentes usam os índices gerenciados.
+
+Uso: python check_indexes.py [school_id]
+"""
+import sys
+
+from app import app
+from models import School
+from indexes import ensure_indexes, explain_hot_queries
+
+
+def check_indexes(school_id=None):
+    with app.app_context():
+        ensure_indexes()
+        if school_id is None:
+            school = School.query.first()
+            if not school:
+                print("Nenhuma escola cadastrada.")
+                return False
+            school_id = school.id
+
+        all_ok = True
+        for name, (plan, used) in explain_hot_queries(school_id).items():
+            status = "OK" if used else "SEM ÍNDICE"
+            print(f"[{status}] {name}: {', '.join(used) or '-'}")
+            for line in plan:
+                print(f"    {line}")
+            all_ok = all_ok and bool(used)
+        return all_ok
+
+
+if __name__ == "__main__":
+    ok = check_indexes(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    sys.exit(0 if ok else 1)
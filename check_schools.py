@@ -7,7 +7,7 @@ if not os.path.exists(db_path):
 else:
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    cursor.execute("SELECT id, name, logo_data IS NOT NULL, logo_mimetype FROM school")
+    cursor.execute("SELECT school.id, school.name, school.logo_asset_id IS NOT NULL, asset.mimetype FROM school LEFT JOIN asset ON asset.id = school.logo_asset_id")
     schools = cursor.fetchall()
     print("Schools in DB:")
     for s in schools:
@@ -0,0 +1,157 @@
+"""Fichas em PDF de todas as salas de uma escola, num único arquivo ZIP.
+
+Antes era preciso baixar a ficha de cada sala em /generate_pdf, uma por vez.
+``write_classroom_pdfs_zip`` busca as salas e os horários ativos da escola em
+duas consultas (os horários de todas as salas de uma vez, agrupados por sala),
+reaproveita as fichas que já estão em ``reports.pdf_cache`` e gera as demais em
+paralelo num pool de processos (``PDF_WORKERS``, padrão: número de CPUs, até 4).
+Cada ficha vai direto para o ZIP, na ordem das salas, e fica no ``pdf_cache``:
+o /generate_pdf seguinte da mesma sala não gera o PDF de novo.
+
+Os processos do pool são criados com "spawn" (fork a partir das threads do
+servidor não é seguro) e recebem só dados simples, sem objetos do SQLAlchemy:
+não precisam do banco. Com PDF_WORKERS=1 tudo roda no próprio processo.
+
+Pela web: /classroom_pdfs (job em segundo plano, ver jobs.py). Linha de comando:
+python classroom_pdfs.py <school_id> <arquivo.zip>
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app import app, db
+from cache import get_data_version
+from jobs import job_kind
+from models import Classroom, Schedule
+from reports import pdf_cache, pdf_cache_key
+from schools import get_school_info
+
+try:
+    from pdf_generator import render_classroom_pdf
+except ImportError:
+    render_classroom_pdf = None
+
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+ZIP_MIMETYPE = 'application/zip'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    # Started on first use and kept for the next batches
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def classroom_tasks(school_id, school_name):
+    """[(classroom id, name, render task)] for every classroom of a school, by name
+
+    Two queries: the classrooms, then the active schedules of all of them.
+    """
+    classrooms = db.session.query(
+        Classroom.id, Classroom.name, Classroom.capacity, Classroom.block, Classroom.has_computers,
+        Classroom.software, Classroom.description
+    ).filter(Classroom.school_id == school_id).order_by(Classroom.name, Classroom.id).all()
+
+    schedules = {}
+    rows = db.session.query(
+        Schedule.classroom_id, Schedule.day_of_week, Schedule.shift, Schedule.start_time, Schedule.end_time,
+        Schedule.course_name, Schedule.instructor
+    ).join(Classroom).filter(
+        Classroom.school_id == school_id,
+        Schedule.is_active == True
+    ).order_by(Schedule.classroom_id, Schedule.id)
+    for row in rows:
+        schedule = row._asdict()
+        schedules.setdefault(schedule.pop('classroom_id'), []).append(schedule)
+
+    return [(room.id, room.name, (room._asdict(), schedules.get(room.id, []), school_name)) for room in classrooms]
+
+
+def _render(tasks):
+    """PDF bytes of each task, in order"""
+    if PDF_WORKERS <= 1 or len(tasks) < 2:
+        yield from map(render_classroom_pdf, tasks)
+        return
+    pool = _get_pool()
+    try:
+        yield from pool.map(render_classroom_pdf, tasks, chunksize=max(1, len(tasks) // (PDF_WORKERS * 4)))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): start a new pool next time
+        _discard_pool(pool)
+        raise
+
+
+def _entry_name(room_name, room_id, used):
+    name = f'sala_{room_name.replace(" ", "_").replace("/", "-")}'
+    if name in used:
+        name = f'{name}_{room_id}'
+    used.add(name)
+    return f'{name}.pdf'
+
+
+def _no_progress(percent):
+    pass
+
+
+def write_classroom_pdfs_zip(output, school_id, progress=_no_progress):
+    """Room sheet of every classroom of a school into a ZIP (path or binary file); returns the count"""
+    school = get_school_info(school_id)
+    school_name = school.name if school else 'SENAI'
+    version = get_data_version(school_id)
+    rooms = classroom_tasks(school_id, school_name)
+    cached = {room_id: pdf_cache.peek(pdf_cache_key('classroom', school_id, room_id), version)
+              for room_id, _, _ in rooms}
+    rendered = _render([task for room_id, _, task in rooms if cached[room_id] is None])
+    progress(5)
+
+    used_names = set()
+    reported = 5
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for done, (room_id, room_name, _) in enumerate(rooms, 1):
+            pdf = cached[room_id]
+            if pdf is None:
+                pdf = next(rendered)
+                pdf_cache.put(pdf_cache_key('classroom', school_id, room_id), version, pdf)
+            archive.writestr(_entry_name(room_name, room_id, used_names), pdf)
+            percent = 5 + done * 90 // len(rooms)
+            if percent >= reported + 5:
+                progress(percent)
+                reported = percent
+    return len(rooms)
+
+
+@job_kind('classroom_pdfs', 'Fichas de todas as salas (ZIP)', 'zip', ZIP_MIMETYPE,
+          'fichas_salas_{timestamp}.zip', admin=True)
+def build_classroom_pdfs(path, school_id, params, progress):
+    write_classroom_pdfs_zip(path, school_id, progress=progress)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or not sys.argv[1].isdigit():
+        print("Uso: python classroom_pdfs.py <school_id> <arquivo.zip>")
+        sys.exit(1)
+    if not render_classroom_pdf:
+        print("reportlab não está instalado.")
+        sys.exit(1)
+    with app.app_context():
+        started = time.perf_counter()
+        total = write_classroom_pdfs_zip(sys.argv[2], int(sys.argv[1]))
+        print(f"{total} fichas em {sys.argv[2]} ({time.perf_counter() - started:.1f}s)")
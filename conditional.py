@@ -0,0 +1,88 @@
+"""GET condicional (ETag / If-None-Match) para as páginas públicas.
+
+O ETag de uma página é derivado de tudo o que muda o HTML gerado:
+- a versão de dados da escola ativa (``school.data_version``, incrementada em
+  toda escrita de salas, horários e ocorrências, ver cache.py);
+- a versão do código e dos templates (RENDER_VERSION);
+- o que a página lê da sessão (escola ativa, login de administrador) e a URL
+  com os filtros;
+- uma chave de tempo opcional da rota (o dia atual, o turno atual).
+
+Se o navegador já tem essa versão, a resposta é 304 antes de qualquer consulta
+ou renderização. Páginas com mensagens flash pendentes são sempre geradas, para
+que a mensagem seja exibida.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from flask import make_response, request, session
+
+from cache import get_data_version
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _compute_render_version():
+    """Hash of the application code and templates, so a deploy changes every ETag"""
+    if os.environ.get('APP_VERSION'):
+        return os.environ['APP_VERSION']
+    digest = hashlib.sha1()
+    template_dir = os.path.join(_BASE_DIR, 'templates')
+    paths = [os.path.join(_BASE_DIR, name) for name in os.listdir(_BASE_DIR) if name.endswith('.py')]
+    if os.path.isdir(template_dir):
+        paths += [os.path.join(template_dir, name) for name in os.listdir(template_dir)]
+    for path in sorted(paths):
+        try:
+            with open(path, 'rb') as source:
+                digest.update(path.encode('utf-8'))
+                digest.update(source.read())
+        except OSError:
+            continue
+    return digest.hexdigest()[:12]
+
+
+RENDER_VERSION = _compute_render_version()
+
+
+def page_etag(school_id, time_key=None):
+    """Strong ETag of the current request's page for a school"""
+    parts = [
+        RENDER_VERSION,
+        str(school_id),
+        str(get_data_version(school_id)),
+        str(session.get('active_school_name', '')),
+        '1' if session.get('admin_authenticated') else '0',
+        request.full_path,
+        repr(time_key),
+    ]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def conditional_page(time_key=None):
+    """Answer 304 when the client already has this version of the page.
+
+    time_key is an optional callable returning whatever, besides the school
+    data, makes the page change over time (e.g. the current date).
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            school_id = session.get('active_school_id')
+            # No school yet (redirect) or a flash message waiting to be shown
+            if not school_id or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            etag = page_etag(school_id, time_key() if time_key else None)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Private (depends on the session) and always revalidated
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,248 @@
+"""Detecção de conflitos de horário por sala.
+
+Os horários ativos das salas envolvidas são carregados uma única vez num
+índice de intervalos por (sala, dia da semana), ordenado pelo início da janela
+de horário. Cada consulta olha só os horários que começam antes do fim da
+janela pedida e confere o fim e o período de datas. Assim, vários horários
+candidatos (vários dias de um cadastro, várias datas de uma solicitação) são
+verificados de uma vez.
+
+Dois horários conflitam quando são da mesma sala e do mesmo dia da semana, e
+quando seus períodos de datas se cruzam (sem data = sem limite) e suas janelas
+de horário se sobrepõem. A janela é o start_time/end_time informado ou, na
+falta dele, a janela do turno. Por isso um Integral (8:00-17:00) conflita com
+Manhã e Tarde, mas não com Noite.
+
+``precheck_requests`` aplica a mesma regra às solicitações de horário: todas as
+datas geradas por várias solicitações são conferidas de uma vez contra os
+horários existentes e contra as demais solicitações pendentes.
+"""
+import bisect
+import json
+import logging
+from collections import namedtuple
+from datetime import datetime
+from itertools import count
+
+from app import db
+from models import Schedule, ScheduleRequest
+from availability import SHIFT_WINDOWS
+
+# A candidate schedule to check; `ref` is free for the caller (e.g. the requested date)
+Slot = namedtuple('Slot', 'classroom_id day_of_week shift start_time end_time start_date end_date ref')
+Slot.__new__.__defaults__ = (None, None, None)
+
+WHOLE_DAY = (0, 24 * 60)
+
+
+def parse_minutes(value):
+    """'HH:MM' (or 'HH:MM:SS') -> minutes since midnight, None if unparseable"""
+    try:
+        hours, minutes = str(value).strip().split(':')[:2]
+        return int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+
+
+def time_window(shift, start_time, end_time):
+    """Minutes window of a schedule: its own times when valid, else its shift window"""
+    start, end = parse_minutes(start_time), parse_minutes(end_time)
+    if start is not None and end is not None and end > start:
+        return start, end
+    return SHIFT_WINDOWS.get(shift, WHOLE_DAY)
+
+
+def dates_overlap(start_a, end_a, start_b, end_b):
+    """Date ranges overlap; None means unbounded on that side"""
+    return ((start_a is None or end_b is None or start_a <= end_b) and
+            (end_a is None or start_b is None or end_a >= start_b))
+
+
+class ConflictIndex:
+    """Interval index of schedules keyed by (classroom, weekday)"""
+
+    def __init__(self, schedules=()):
+        self._buckets = {}  # (classroom_id, weekday) -> sorted [(window start, seq, window end, item)]
+        self._seq = count()
+        for schedule in schedules:
+            self.add(schedule)
+
+    @classmethod
+    def for_slots(cls, slots):
+        """Load, in one query, every active schedule that may collide with the slots"""
+        slots = list(slots)
+        classroom_ids = {slot.classroom_id for slot in slots}
+        if not classroom_ids:
+            return cls()
+        query = Schedule.query.filter(
+            Schedule.classroom_id.in_(classroom_ids),
+            Schedule.is_active == True
+        )
+        # Narrow to the candidates' date span when every candidate is bounded
+        if all(slot.start_date and slot.end_date for slot in slots):
+            span_start = min(slot.start_date for slot in slots)
+            span_end = max(slot.end_date for slot in slots)
+            query = query.filter(
+                db.or_(Schedule.start_date.is_(None), Schedule.start_date <= span_end),
+                db.or_(Schedule.end_date.is_(None), Schedule.end_date >= span_start)
+            )
+        return cls(query.all())
+
+    def add(self, item):
+        """Index a schedule (or an accepted Slot, so later candidates see it)"""
+        start, end = time_window(item.shift, item.start_time, item.end_time)
+        bucket = self._buckets.setdefault((item.classroom_id, item.day_of_week), [])
+        bisect.insort(bucket, (start, next(self._seq), end, item))
+
+    def conflicts(self, slot):
+        """Indexed items that collide with the slot"""
+        bucket = self._buckets.get((slot.classroom_id, slot.day_of_week))
+        if not bucket:
+            return []
+        start, end = time_window(slot.shift, slot.start_time, slot.end_time)
+        # Only entries starting before the slot ends can overlap it
+        upper = bisect.bisect_left(bucket, (end,))
+        return [
+            item for item_start, _, item_end, item in bucket[:upper]
+            if item_end > start and dates_overlap(item.start_date, item.end_date, slot.start_date, slot.end_date)
+        ]
+
+    def check(self, slots, accept=False):
+        """[(slot, conflicts)] for many slots at once.
+
+        With accept=True every slot without conflicts is added to the index,
+        so duplicates inside the same batch are reported too.
+        """
+        results = []
+        for slot in slots:
+            found = self.conflicts(slot)
+            if accept and not found:
+                self.add(slot)
+            results.append((slot, found))
+        return results
+
+
+def describe_conflicts(found):
+    """Short Portuguese description of the schedules a slot collides with"""
+    names = []
+    for item in found:
+        name = getattr(item, 'course_name', None) or 'novo horário'
+        if item.start_time and item.end_time:
+            name = f"{name} ({item.start_time}-{item.end_time})"
+        if name not in names:
+            names.append(name)
+    return ', '.join(names)
+
+
+def request_dates(schedule_request):
+    """Every date of a schedule request: requested_date plus additional_dates (JSON)"""
+    dates = [schedule_request.requested_date]
+    if schedule_request.additional_dates:
+        try:
+            for date_str in json.loads(schedule_request.additional_dates):
+                dates.append(datetime.strptime(date_str, '%Y-%m-%d').date())
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Datas adicionais inválidas na solicitação {schedule_request.id}: {e}")
+    return dates
+
+
+def request_slots(schedule_request):
+    """One single-day Slot per date of the request; ref is (request, date)"""
+    return [
+        Slot(schedule_request.classroom_id, request_date.weekday(), schedule_request.shift,
+             schedule_request.start_time, schedule_request.end_time,
+             request_date, request_date, ref=(schedule_request, request_date))
+        for request_date in request_dates(schedule_request)
+    ]
+
+
+class RequestCheck:
+    """Conflicts found for the dates of one schedule request"""
+
+    def __init__(self, schedule_request, dates):
+        self.request = schedule_request
+        self.dates = dates
+        self.schedule_conflicts = {}  # date -> [Schedule]
+        self.request_conflicts = {}   # date -> [ScheduleRequest]
+
+    @property
+    def conflicting_dates(self):
+        return sorted(set(self.schedule_conflicts) | set(self.request_conflicts))
+
+    @property
+    def has_conflicts(self):
+        return bool(self.schedule_conflicts or self.request_conflicts)
+
+    @property
+    def conflicting_requests(self):
+        """Other pending requests colliding on any date, without repeats"""
+        found = []
+        for others in self.request_conflicts.values():
+            for other in others:
+                if other not in found:
+                    found.append(other)
+        return found
+
+    def summary(self, limit=5, include_requests=True):
+        """Portuguese one-liner: 'dd/mm/aaaa: Curso (08:00-12:00); ...'"""
+        conflict_dates = sorted(self.schedule_conflicts) if not include_requests else self.conflicting_dates
+        parts = []
+        for conflict_date in conflict_dates[:limit]:
+            names = []
+            if conflict_date in self.schedule_conflicts:
+                names.append(describe_conflicts(self.schedule_conflicts[conflict_date]))
+            if include_requests:
+                names.extend(f"solicitação pendente de {other.requester_name} ({other.start_time}-{other.end_time})"
+                             for other in self.request_conflicts.get(conflict_date, []))
+            parts.append(f"{conflict_date.strftime('%d/%m/%Y')}: {', '.join(names)}")
+        if len(conflict_dates) > limit:
+            parts.append(f"e mais {len(conflict_dates) - limit} data(s)")
+        return '; '.join(parts)
+
+
+def precheck_requests(schedule_requests):
+    """Check many schedule requests at once. Returns one RequestCheck per request, in order.
+
+    Two queries in total, whatever the number of requests: the active
+    schedules of the rooms involved and the other pending requests for them.
+    """
+    schedule_requests = list(schedule_requests)
+    checks = []
+    all_slots = []
+    for schedule_request in schedule_requests:
+        slots = request_slots(schedule_request)
+        checks.append(RequestCheck(schedule_request, [slot.start_date for slot in slots]))
+        all_slots.append(slots)
+
+    flat_slots = [slot for slots in all_slots for slot in slots]
+    if not flat_slots:
+        return checks
+
+    schedule_index = ConflictIndex.for_slots(flat_slots)
+
+    classroom_ids = {slot.classroom_id for slot in flat_slots}
+    pending = ScheduleRequest.query.filter(
+        ScheduleRequest.classroom_id.in_(classroom_ids),
+        ScheduleRequest.status == 'pending'
+    ).all()
+    pending_index = ConflictIndex()
+    for other in pending:
+        for slot in request_slots(other):
+            pending_index.add(slot)
+    # Requests being checked that are not stored yet still collide with each other
+    for schedule_request, slots in zip(schedule_requests, all_slots):
+        if schedule_request.id is None:
+            for slot in slots:
+                pending_index.add(slot)
+
+    for check, slots in zip(checks, all_slots):
+        own = check.request
+        for slot in slots:
+            found = schedule_index.conflicts(slot)
+            if found:
+                check.schedule_conflicts[slot.start_date] = found
+            others = [item.ref[0] for item in pending_index.conflicts(slot)
+                      if item.ref[0] is not own and (own.id is None or item.ref[0].id != own.id)]
+            if others:
+                check.request_conflicts[slot.start_date] = others
+    return checks
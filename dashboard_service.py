@@ -0,0 +1,129 @@
+"""Dados do dashboard em um número fixo de consultas.
+
+``get_dashboard_data`` devolve as salas filtradas, a grade ``schedule_map``
+(sala → dia → turno → horário), os contadores de ocupação e as opções dos
+filtros (blocos, professores, softwares). São sempre as mesmas duas consultas,
+independente do número de salas e horários da escola: salas e horários. As
+opções dos filtros vêm do cache de facets.py.
+
+Benchmark: python benchmark_dashboard.py
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import load_only
+
+from app import db
+from facets import get_facets
+from models import Classroom, Schedule
+
+CAPACITY_RANGES = {
+    'small': (0, 20),
+    'medium': (21, 35),
+    'large': (36, 100)
+}
+
+# 6 days * 4 shifts - 1 (no Saturday night)
+SLOTS_PER_ROOM = 23
+
+# Columns the dashboard grid actually shows
+GRID_SCHEDULE_COLUMNS = (
+    Schedule.id, Schedule.classroom_id, Schedule.day_of_week, Schedule.shift,
+    Schedule.course_name, Schedule.instructor, Schedule.start_time, Schedule.end_time
+)
+
+
+def week_bounds(week_filter, current_date):
+    """Monday and Sunday of the week containing week_filter (YYYY-MM-DD) or current_date"""
+    reference = current_date
+    if week_filter:
+        try:
+            reference = datetime.strptime(week_filter, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            reference = current_date
+    week_monday = reference - timedelta(days=reference.weekday())
+    return week_monday, week_monday + timedelta(days=6)
+
+
+def _schedule_conditions(school_id, current_date, week_filter, week_monday, week_sunday,
+                         day_filter='', shift_filter='', instructor_filter=''):
+    """WHERE clauses for the schedules shown on the dashboard (active, not expired)"""
+    conditions = [Classroom.school_id == school_id, Schedule.is_active == True]
+    if week_filter:
+        # Courses running at some point of the selected week
+        conditions.append(db.or_(Schedule.start_date.is_(None), Schedule.start_date <= week_sunday))
+        conditions.append(db.or_(Schedule.end_date.is_(None), Schedule.end_date >= week_monday))
+    else:
+        # Courses that haven't ended yet
+        conditions.append(db.or_(Schedule.end_date.is_(None), Schedule.end_date >= current_date))
+    if day_filter:
+        conditions.append(Schedule.day_of_week == int(day_filter))
+    if shift_filter:
+        conditions.append(Schedule.shift == shift_filter)
+    if instructor_filter:
+        conditions.append(Schedule.instructor.ilike(f'%{instructor_filter}%'))
+    return conditions
+
+
+def get_dashboard_data(school_id, current_date, block='', instructor='', software='', has_computers='',
+                       capacity='', day='', shift='', week='', course_name=''):
+    """Everything dashboard.html needs, from a fixed number of queries"""
+    week_monday, week_sunday = week_bounds(week, current_date)
+
+    classroom_query = Classroom.query.filter(Classroom.school_id == school_id)
+    if block:
+        classroom_query = classroom_query.filter(Classroom.block.contains(block))
+    if software:
+        classroom_query = classroom_query.filter(Classroom.software.contains(software))
+    if has_computers:
+        classroom_query = classroom_query.filter(Classroom.has_computers == (has_computers.lower() == 'true'))
+    if capacity in CAPACITY_RANGES:
+        min_cap, max_cap = CAPACITY_RANGES[capacity]
+        classroom_query = classroom_query.filter(Classroom.capacity >= min_cap, Classroom.capacity <= max_cap)
+    if course_name:
+        classroom_query = classroom_query.filter(Classroom.id.in_(
+            db.session.query(Schedule.classroom_id).filter(
+                Schedule.course_name.ilike(f'%{course_name}%'),
+                Schedule.is_active == True
+            )
+        ))
+
+    conditions = _schedule_conditions(school_id, current_date, week, week_monday, week_sunday,
+                                      day, shift, instructor)
+    if instructor:
+        # Only rooms where the instructor teaches in the selected period
+        classroom_query = classroom_query.filter(Classroom.id.in_(
+            db.session.query(Schedule.classroom_id).join(Classroom).filter(*conditions)
+        ))
+
+    classrooms = classroom_query.all()
+
+    schedules = []
+    if classrooms:
+        schedules = Schedule.query.join(Classroom).filter(
+            *conditions,
+            Schedule.classroom_id.in_(classroom_query.with_entities(Classroom.id))
+        ).options(load_only(*GRID_SCHEDULE_COLUMNS)).all()
+    logging.debug(f"Dashboard showing {len(schedules)} active/current schedules (expired courses hidden)")
+
+    # Organize schedules by classroom and day
+    schedule_map = {}
+    for schedule in schedules:
+        schedule_map.setdefault(schedule.classroom_id, {}).setdefault(schedule.day_of_week, {})[schedule.shift] = schedule
+
+    total_slots = len(classrooms) * SLOTS_PER_ROOM
+    occupied_slots = len(schedules)
+    data = {
+        'classrooms': classrooms,
+        'schedule_map': schedule_map,
+        'free_slots': total_slots - occupied_slots,
+        'occupied_slots': occupied_slots,
+        'occupancy_rate': (occupied_slots / total_slots * 100) if total_slots > 0 else 0,
+        'week_dates': {
+            'monday': week_monday,
+            'sunday': week_sunday,
+            'formatted': f"{week_monday.strftime('%d/%m')} - {week_sunday.strftime('%d/%m/%Y')}"
+        },
+    }
+    data.update(get_facets(school_id))
+    return data
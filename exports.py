@@ -0,0 +1,193 @@
+"""Exportação das salas e horários para Excel (.xlsx) sem montar a planilha em memória.
+
+As planilhas são escritas no modo write-only do openpyxl: cada linha vai direto
+para o arquivo temporário da planilha, lida de uma única consulta (horários já
+com o nome da sala, via JOIN) em lotes de ``EXPORT_BATCH_SIZE`` com
+``yield_per``. A memória não cresce com o número de horários da escola.
+
+No modo write-only a largura das colunas precisa ser definida antes da primeira
+linha, então ela vem de uma consulta ``max(length(...))`` por planilha, feita
+pelo banco, em vez de percorrer as células depois de escritas.
+
+Benchmark: python benchmark_exports.py
+"""
+import logging
+
+from app import db
+from dashboard_service import CAPACITY_RANGES, SLOTS_PER_ROOM
+from models import Classroom, Schedule
+
+try:
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.utils import get_column_letter
+except ImportError as e:
+    logging.warning(f"openpyxl não disponível, exportação para Excel desativada: {e}")
+    openpyxl = None
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_BATCH_SIZE = 1000
+MAX_COLUMN_WIDTH = 50
+
+DAYS = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+SHIFTS = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
+YES_NO = ('Sim', 'Não')
+
+# (header, source of the width): a column measured by the database, or the labels the cell can show
+CLASSROOM_COLUMNS = [
+    ('ID', Classroom.id),
+    ('Nome', Classroom.name),
+    ('Capacidade', Classroom.capacity),
+    ('Bloco', Classroom.block),
+    ('Tem Computadores', YES_NO),
+    ('Softwares', Classroom.software),
+    ('Descrição', Classroom.description),
+]
+SCHEDULE_COLUMNS = [
+    ('ID', Schedule.id),
+    ('Sala', Classroom.name),
+    ('Dia da Semana', DAYS),
+    ('Turno', Schedule.shift),  # Unknown shifts are written as stored
+    ('Curso', Schedule.course_name),
+    ('Professor', Schedule.instructor),
+    ('Início', Schedule.start_time),
+    ('Fim', Schedule.end_time),
+    ('Ativo', YES_NO),
+]
+
+if openpyxl:
+    HEADER_FONT = Font(bold=True, color='FFFFFF')
+    HEADER_FILL = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+    HEADER_ALIGNMENT = Alignment(horizontal='center')
+
+
+def _width(longest):
+    return min(longest + 2, MAX_COLUMN_WIDTH)
+
+
+def _column_widths(query, columns):
+    """Width of each column: longest header, label or value (measured with one aggregate query)"""
+    measured = [source for _, source in columns if not isinstance(source, (list, tuple))]
+    lengths = iter(query.with_entities(
+        *[db.func.max(db.func.length(db.cast(source, db.String))) for source in measured]
+    ).one())
+    widths = []
+    for header, source in columns:
+        if isinstance(source, (list, tuple)):
+            longest = max(len(label) for label in source)
+        else:
+            longest = next(lengths) or 0
+            if source is Schedule.shift:
+                longest = max([longest] + [len(label) for label in SHIFTS.values()])
+        widths.append(_width(max(longest, len(header))))
+    return widths
+
+
+def _start_sheet(workbook, title, headers, widths):
+    sheet = workbook.create_sheet(title=title)
+    for index, width in enumerate(widths, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.alignment = HEADER_ALIGNMENT
+        header_cells.append(cell)
+    sheet.append(header_cells)
+    return sheet
+
+
+def _write_classrooms(workbook, title, query):
+    """Stream the classrooms of a query into a new sheet; returns (total, with computers)"""
+    sheet = _start_sheet(workbook, title, [header for header, _ in CLASSROOM_COLUMNS],
+                         _column_widths(query, CLASSROOM_COLUMNS))
+    total = with_computers = 0
+    rows = query.with_entities(
+        Classroom.id, Classroom.name, Classroom.capacity, Classroom.block,
+        Classroom.has_computers, Classroom.software, Classroom.description
+    ).order_by(Classroom.id).yield_per(EXPORT_BATCH_SIZE)
+    for row in rows:
+        sheet.append([row.id, row.name, row.capacity, row.block, 'Sim' if row.has_computers else 'Não',
+                      row.software, row.description])
+        total += 1
+        with_computers += 1 if row.has_computers else 0
+    return total, with_computers
+
+
+def _write_schedules(workbook, title, query):
+    """Stream the schedules of a query (joined to Classroom) into a new sheet; returns the active count"""
+    sheet = _start_sheet(workbook, title, [header for header, _ in SCHEDULE_COLUMNS],
+                         _column_widths(query, SCHEDULE_COLUMNS))
+    active = 0
+    rows = query.with_entities(
+        Schedule.id, Classroom.name, Schedule.day_of_week, Schedule.shift, Schedule.course_name,
+        Schedule.instructor, Schedule.start_time, Schedule.end_time, Schedule.is_active
+    ).order_by(Schedule.id).yield_per(EXPORT_BATCH_SIZE)
+    for row in rows:
+        sheet.append([row.id, row.name, DAYS[row.day_of_week], SHIFTS.get(row.shift, row.shift),
+                      row.course_name, row.instructor, row.start_time, row.end_time,
+                      'Sim' if row.is_active else 'Não'])
+        active += 1 if row.is_active else 0
+    return active
+
+
+def _write_statistics(workbook, total_classrooms, with_computers, active_schedules):
+    total_slots = total_classrooms * SLOTS_PER_ROOM
+    occupancy_rate = (active_schedules / total_slots * 100) if total_slots > 0 else 0
+    stats_data = [
+        ['Total de Salas', total_classrooms],
+        ['Total de Horários Ativos', active_schedules],
+        ['Taxa de Ocupação (%)', f"{occupancy_rate:.1f}%"],
+        ['Salas com Computadores', with_computers],
+        ['Salas sem Computadores', total_classrooms - with_computers],
+    ]
+    widths = [_width(max(len(str(row[column])) for row in stats_data + [['Estatística', 'Valor']]))
+              for column in (0, 1)]
+    sheet = _start_sheet(workbook, "Estatísticas", ['Estatística', 'Valor'], widths)
+    for row in stats_data:
+        sheet.append(row)
+
+
+def filtered_classroom_query(school_id, block='', has_computers='', capacity=''):
+    """Classrooms of a school with the dashboard's block / computers / capacity filters"""
+    query = db.session.query(Classroom).filter(Classroom.school_id == school_id)
+    if block:
+        query = query.filter(Classroom.block == block)
+    if has_computers:
+        query = query.filter(Classroom.has_computers == (has_computers.lower() == 'true'))
+    if capacity in CAPACITY_RANGES:
+        min_cap, max_cap = CAPACITY_RANGES[capacity]
+        query = query.filter(Classroom.capacity >= min_cap, Classroom.capacity <= max_cap)
+    return query
+
+
+def _no_progress(percent):
+    pass
+
+
+def write_school_workbook(output, school_id, progress=_no_progress):
+    """Full export of a school (classrooms, schedules, statistics) into output (path or binary file)
+
+    progress(percent) is called between sheets (see jobs.py).
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    total_classrooms, with_computers = _write_classrooms(
+        workbook, "Salas de Aula", db.session.query(Classroom).filter(Classroom.school_id == school_id))
+    progress(20)
+    active_schedules = _write_schedules(
+        workbook, "Horários",
+        db.session.query(Schedule).join(Classroom).filter(Classroom.school_id == school_id))
+    progress(80)
+    _write_statistics(workbook, total_classrooms, with_computers, active_schedules)
+    workbook.save(output)
+
+
+def write_filtered_workbook(output, school_id, block='', has_computers='', capacity='', progress=_no_progress):
+    """Classrooms matching the dashboard filters into output (path or binary file)"""
+    workbook = openpyxl.Workbook(write_only=True)
+    _write_classrooms(workbook, "Salas Filtradas",
+                      filtered_classroom_query(school_id, block, has_computers, capacity))
+    progress(80)
+    workbook.save(output)
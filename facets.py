@@ -0,0 +1,80 @@
+"""Opções dos filtros (blocos, professores, softwares, cursos) por escola.
+
+Calculadas com SELECT DISTINCT e guardadas em cache até a próxima escrita em
+salas ou horários da escola (ver cache.py), de modo que o custo não cresce com
+o número de horários a cada acesso. Usadas pelos filtros do dashboard e da
+página inicial e expostas em /api/facets.
+
+O texto de busca de cada sala da página inicial (cursos e professores dos seus
+horários) também é montado aqui, com uma consulta para a escola toda, em vez de
+percorrer ``classroom.schedules`` sala por sala no template.
+"""
+from app import db
+from cache import VersionedCache, get_data_version
+from models import Classroom, Schedule
+
+facet_cache = VersionedCache('facets', max_entries=64)
+search_text_cache = VersionedCache('room_search_text', max_entries=64)
+
+
+def compute_facets(school_id):
+    """Filter options for a school, straight from the database"""
+    blocks = db.session.query(Classroom.block).filter(
+        Classroom.school_id == school_id,
+        Classroom.block.isnot(None),
+        Classroom.block != ''
+    ).distinct().all()
+
+    schedule_values = db.session.query(Schedule.instructor, Schedule.course_name).join(Classroom).filter(
+        Classroom.school_id == school_id,
+        Schedule.is_active == True
+    ).distinct().all()
+
+    # Distinct comma-separated lists; only these (few) strings are split in Python
+    software_lists = db.session.query(Classroom.software).filter(
+        Classroom.school_id == school_id,
+        Classroom.software.isnot(None),
+        Classroom.software != ''
+    ).distinct().all()
+
+    return {
+        'blocks': sorted(row.block for row in blocks),
+        'instructors': sorted({row.instructor.strip() for row in schedule_values
+                               if row.instructor and row.instructor.strip()}),
+        'courses': sorted({row.course_name.strip() for row in schedule_values
+                           if row.course_name and row.course_name.strip()}),
+        'software_list': sorted({software.strip() for row in software_lists
+                                 for software in row.software.split(',') if software.strip()}),
+    }
+
+
+def get_facets(school_id):
+    """Cached filter options; the lists are shared with the cache and must not be modified"""
+    return facet_cache.get_or_compute(school_id, get_data_version(school_id), lambda: compute_facets(school_id))
+
+
+def compute_room_search_text(school_id):
+    """{classroom_id: {'courses': ..., 'instructors': ...}} lowercase text used by the index filters"""
+    rows = db.session.query(
+        Schedule.classroom_id, Schedule.course_name, Schedule.instructor, Schedule.is_active
+    ).join(Classroom).filter(Classroom.school_id == school_id).order_by(Schedule.id).all()
+
+    courses, instructors = {}, {}
+    for row in rows:
+        # Same content the template used to build: courses of active schedules, every instructor
+        if row.is_active:
+            courses.setdefault(row.classroom_id, []).append(f"{str(row.course_name).lower()} ")
+        instructors.setdefault(row.classroom_id, []).append(f"{str(row.instructor).lower()} ")
+    return {
+        classroom_id: {
+            'courses': ''.join(courses.get(classroom_id, [])),
+            'instructors': ''.join(instructors.get(classroom_id, [])),
+        }
+        for classroom_id in set(courses) | set(instructors)
+    }
+
+
+def get_room_search_text(school_id):
+    """Cached per-room search text of a school, rebuilt after any write"""
+    return search_text_cache.get_or_compute(school_id, get_data_version(school_id),
+                                            lambda: compute_room_search_text(school_id))
@@ -0,0 +1,37 @@
+"""Gera miniaturas e versões WebP das fotos de salas enviadas antes de images.py.
+
+Fotos novas já ganham as variantes no upload. Este script percorre as salas com
+foto sem variantes, gera as que faltam (uma foto por vez) e invalida o cache
+das páginas das escolas alteradas.
+
+Uso: python generate_image_variants.py
+"""
+from app import app, db
+from cache import bump_data_version
+from images import PIL_AVAILABLE, backfill_image_variants
+from models import Classroom
+
+
+def generate_image_variants():
+    if not PIL_AVAILABLE:
+        print("Pillow não está instalado.")
+        return 0
+
+    with app.app_context():
+        rooms = db.session.query(Classroom.school_id, Classroom.image_asset_id).filter(
+            Classroom.image_asset_id.isnot(None)
+        ).all()
+        total = 0
+        for school_id in sorted({room.school_id for room in rooms if room.school_id}):
+            processed = backfill_image_variants([room.image_asset_id for room in rooms if room.school_id == school_id])
+            if processed:
+                bump_data_version(school_id)
+                db.session.commit()
+                print(f"Escola {school_id}: {processed} foto(s) processada(s)")
+            total += processed
+        print(f"✅ {total} foto(s) com novas variantes.")
+        return total
+
+
+if __name__ == "__main__":
+    generate_image_variants()
@@ -0,0 +1,199 @@
+"""Variantes reduzidas das fotos das salas (miniatura do card, tamanho de detalhe, WebP).
+
+Na hora do upload a foto original é guardada como está e, com o Pillow, são
+geradas versões menores em JPEG (ou PNG, se a imagem tem transparência) e em
+WebP. Cada variante é um ``Asset`` com ``parent_id`` apontando para o
+original, então continua servida por /image/<id> (``?variant=``) com o mesmo
+cache imutável do original. Os templates escolhem o tamanho com ``srcset``.
+
+Sem o Pillow, ou se a imagem não puder ser lida, só o original é guardado e as
+páginas continuam usando o original.
+
+Fotos antigas: python generate_image_variants.py
+"""
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+from app import db
+from assets import (UPLOAD_LIMITS, store_asset, store_spooled, spool_upload, get_asset_content,
+                    prime_asset_versions, asset_version)
+from models import Asset
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError as e:
+    logging.warning(f"Pillow não disponível, fotos sem miniaturas: {e}")
+    Image = ImageOps = None
+    PIL_AVAILABLE = False
+
+# (name, max width in pixels); cards are 120px tall and up to ~400px wide
+IMAGE_SIZES = [('card', 640), ('detail', 1280)]
+JPEG_QUALITY = 82
+WEBP_QUALITY = 78
+MAX_KNOWN_VARIANTS = 4096
+
+# Variants of an asset never change once generated, except for originals that
+# had none yet; those are not remembered so a later backfill shows up.
+_variants_lock = threading.Lock()
+_known_variants = OrderedDict()  # original asset_id -> {variant: asset_id}
+
+
+def _encode(image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+
+def render_variants(data):
+    """[(variant, bytes, mimetype)] for an uploaded photo (bytes or file), [] if it can't be processed"""
+    if not PIL_AVAILABLE:
+        return []
+    try:
+        with Image.open(io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data) as source:
+            if getattr(source, 'is_animated', False):
+                return []  # Animated GIFs are kept as uploaded
+            # Phone photos are often stored sideways with an EXIF rotation
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except Exception as e:
+        logging.warning(f"Imagem não pôde ser processada, usando apenas o original: {e}")
+        return []
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = []
+    for name, max_width in IMAGE_SIZES:
+        resized = image.copy()
+        resized.thumbnail((max_width, max_width * 4), Image.LANCZOS)  # Never upscales
+        if has_alpha:
+            variants.append((name, _encode(resized, 'PNG', optimize=True), 'image/png'))
+        else:
+            variants.append((name, _encode(resized, 'JPEG', quality=JPEG_QUALITY, optimize=True,
+                                           progressive=True), 'image/jpeg'))
+        variants.append((f'{name}-webp', _encode(resized, 'WEBP', quality=WEBP_QUALITY, method=4), 'image/webp'))
+    return variants
+
+
+def store_variants(original, source=None):
+    """Generate and store the variants of an original asset (flushed, not committed)
+
+    source is the original's content (bytes or file); read from storage when omitted.
+    """
+    if source is None:
+        source, _ = get_asset_content(original.id)
+        if not source:
+            return {}
+    stored = {}
+    for name, variant_data, mimetype in render_variants(source):
+        if not name.endswith('-webp') and len(variant_data) >= original.size:
+            continue  # Already small enough: srcset points to the original for this size
+        stored[name] = store_asset(variant_data, mimetype, parent_id=original.id, variant=name).id
+    if stored:
+        logging.debug(f"Asset {original.id}: {len(stored)} variantes, {original.size} bytes no original")
+    return stored
+
+
+def store_image(stream, mimetype=None, max_bytes=UPLOAD_LIMITS['image']):
+    """Store an uploaded photo (file object) plus its variants; returns the original Asset.
+
+    Raises UploadTooLarge past max_bytes, before anything is stored.
+    """
+    upload = spool_upload(stream, max_bytes)
+    original = store_spooled(upload, mimetype)
+    # A photo already uploaded to another room keeps its variants
+    if not image_variants(original.id):
+        store_variants(original, upload.file)
+    return original
+
+
+def prime_image_variants(asset_ids):
+    """Load, in one query, the variants (and their versions) of many originals"""
+    with _variants_lock:
+        missing = {asset_id for asset_id in asset_ids if asset_id and asset_id not in _known_variants}
+    if not missing:
+        return
+    found = {}
+    for asset_id, parent_id, variant in db.session.query(Asset.id, Asset.parent_id, Asset.variant).filter(
+            Asset.parent_id.in_(missing)).all():
+        found.setdefault(parent_id, {})[variant] = asset_id
+    prime_asset_versions([asset_id for variants in found.values() for asset_id in variants.values()])
+    with _variants_lock:
+        for parent_id, variants in found.items():
+            _known_variants[parent_id] = variants
+            _known_variants.move_to_end(parent_id)
+        while len(_known_variants) > MAX_KNOWN_VARIANTS:
+            _known_variants.popitem(last=False)
+
+
+def forget_image_variants(asset_ids):
+    """Drop deleted originals from the variants cache"""
+    with _variants_lock:
+        for asset_id in asset_ids:
+            _known_variants.pop(asset_id, None)
+
+
+def image_variants(asset_id):
+    """{variant: asset_id} of an original, {} if it has none"""
+    if not asset_id:
+        return {}
+    with _variants_lock:
+        variants = _known_variants.get(asset_id)
+    if variants is None:
+        prime_image_variants([asset_id])
+        with _variants_lock:
+            variants = _known_variants.get(asset_id, {})
+    return variants
+
+
+def variant_sources(url_for_variant, asset_id):
+    """src/srcset for a photo: {'src', 'srcset', 'webp_srcset'} (srcsets empty without variants)
+
+    url_for_variant(variant, version) builds the URL; variant None is the original.
+    """
+    variants = image_variants(asset_id)
+    sources = {'src': url_for_variant(None, asset_version(asset_id)), 'srcset': '', 'webp_srcset': ''}
+    if not variants:
+        return sources
+
+    srcset, webp_srcset = [], []
+    for name, width in IMAGE_SIZES:
+        if name in variants:
+            srcset.append(f"{url_for_variant(name, asset_version(variants[name]))} {width}w")
+        else:
+            srcset.append(f"{sources['src']} {width}w")
+        if f'{name}-webp' in variants:
+            webp_srcset.append(f"{url_for_variant(name + '-webp', asset_version(variants[name + '-webp']))} {width}w")
+    if 'card' in variants:
+        sources['src'] = url_for_variant('card', asset_version(variants['card']))
+    sources['srcset'] = ', '.join(srcset)
+    sources['webp_srcset'] = ', '.join(webp_srcset)
+    return sources
+
+
+def backfill_image_variants(asset_ids):
+    """Generate variants for originals that have none. Returns how many were processed."""
+    with_variants = {parent_id for (parent_id,) in db.session.query(Asset.parent_id).filter(
+        Asset.parent_id.in_(asset_ids)).distinct()}
+    processed = 0
+    for asset_id in asset_ids:
+        if not asset_id or asset_id in with_variants:
+            continue
+        original = db.session.get(Asset, asset_id)
+        if original is None:
+            continue
+        try:
+            if store_variants(original):
+                processed += 1
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Erro ao gerar variantes do asset {asset_id}: {e}")
+        finally:
+            db.session.expunge_all()  # Keep memory bounded by one photo at a time
+    with _variants_lock:
+        _known_variants.clear()
+    return processed
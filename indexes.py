@@ -0,0 +1,96 @@
+"""Índices gerenciados das tabelas quentes e verificação via EXPLAIN.
+
+As definições ficam em ``__table_args__`` dos modelos; ``ensure_indexes`` cria
+as que faltam em bancos existentes (``db.create_all`` só cria índices junto com
+tabelas novas) e ``explain_hot_queries`` confere se as consultas do dashboard,
+da disponibilidade e da gestão de ocorrências realmente usam esses índices.
+"""
+import logging
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from app import db
+from models import Asset, Classroom, Schedule, Incident, ScheduleRequest
+
+MANAGED_MODELS = [Asset, Classroom, Schedule, Incident, ScheduleRequest]
+
+
+def managed_indexes():
+    """All indexes declared on the hot tables"""
+    indexes = []
+    for model in MANAGED_MODELS:
+        indexes.extend(sorted(model.__table__.indexes, key=lambda index: index.name))
+    return indexes
+
+
+def ensure_indexes(bind=None):
+    """Create any managed index missing from the database. Returns the names created."""
+    bind = bind or db.engine
+    created = []
+    existing = set()
+    inspector = inspect(bind)
+    for model in MANAGED_MODELS:
+        existing.update(index['name'] for index in inspector.get_indexes(model.__tablename__))
+
+    for index in managed_indexes():
+        if index.name in existing:
+            continue
+        try:
+            index.create(bind=bind, checkfirst=True)
+            created.append(index.name)
+        except Exception as e:
+            logging.warning(f"Não foi possível criar o índice {index.name}: {e}")
+    if created:
+        logging.info(f"✅ Índices criados: {', '.join(created)}")
+    return created
+
+
+def _hot_queries(school_id, target_date):
+    """Representative statements for the dashboard, availability and incidents pages"""
+    dashboard = Schedule.query.join(Classroom).filter(
+        Classroom.school_id == school_id,
+        Schedule.is_active == True,
+        db.or_(Schedule.end_date == None, Schedule.end_date >= target_date)
+    )
+    availability = Schedule.query.join(Classroom).filter(
+        Classroom.school_id == school_id,
+        Schedule.day_of_week == target_date.weekday(),
+        Schedule.shift == 'morning',
+        Schedule.is_active == True
+    )
+    incidents = Incident.query.join(Classroom).filter(
+        Classroom.school_id == school_id,
+        Incident.is_active == True,
+        db.func.coalesce(Incident.hidden_from_classroom, False) == False
+    ).order_by(Incident.created_at.desc())
+    return {
+        'dashboard': dashboard,
+        'get_availability_for_date': availability,
+        'incidents_management': incidents,
+    }
+
+
+def explain_hot_queries(school_id, target_date=None):
+    """Return {query name: (plan lines, index names used)} for the hot queries.
+
+    On PostgreSQL sequential scans are disabled for the EXPLAIN so that small
+    development tables still show whether an index is usable at all.
+    """
+    target_date = target_date or date.today()
+    is_postgres = db.engine.dialect.name == 'postgresql'
+    index_names = {index.name for index in managed_indexes()}
+    results = {}
+
+    with db.engine.connect() as conn:
+        with conn.begin():
+            if is_postgres:
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for name, query in _hot_queries(school_id, target_date).items():
+                compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+                prefix = "EXPLAIN " if is_postgres else "EXPLAIN QUERY PLAN "
+                rows = conn.execute(text(prefix + str(compiled))).fetchall()
+                plan = [str(row[-1]) for row in rows]
+                used = sorted(index for index in index_names if any(index in line for line in plan))
+                results[name] = (plan, used)
+    return results
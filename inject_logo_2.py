@@ -1,6 +1,7 @@
 import io
 from app import app, db
 from models import School
+from assets import store_asset
 
 def inject_logo_2():
     with app.app_context():
@@ -11,8 +12,7 @@ def inject_logo_2():
             img = Image.new('RGB', (100, 100), color = (0, 0, 255))
             img_byte_arr = io.BytesIO()
             img.save(img_byte_arr, format='PNG')
-            school.logo_data = img_byte_arr.getvalue()
-            school.logo_mimetype = 'image/png'
+            school.logo_asset_id = store_asset(img_byte_arr.getvalue(), 'image/png').id
             db.session.commit()
             print(f"Logo injected for {school.name}")
         else:
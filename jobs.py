@@ -0,0 +1,196 @@
+"""Exportações e relatórios gerados em segundo plano, fora do request.
+
+As planilhas e os PDFs grandes prendiam um worker do gunicorn por segundos.
+``start_job`` registra um ``ExportJob`` e entrega o trabalho a um pool de
+threads deste processo (``EXPORT_WORKERS``, padrão 2); o request volta na hora
+e o navegador acompanha o progresso em /jobs/<id>. O arquivo pronto fica em
+``EXPORT_DIR`` (padrão ``instance/exports``) e é baixado em /jobs/<id>/download.
+
+Um pedido igual (mesmo tipo, escola e parâmetros) com a versão de dados da
+escola inalterada (ver cache.py) reaproveita o job anterior: o arquivo pronto,
+ou o job que ainda está rodando. Arquivos que ficam prontos em até
+``EXPORT_INLINE_WAIT_SECONDS`` (padrão 1) são enviados no próprio request.
+Arquivos com mais de ``EXPORT_RETENTION_HOURS`` (padrão 24) são apagados junto
+com os seus jobs.
+
+Os tipos de job ficam em reports.py e classroom_pdfs.py (decorador ``job_kind``).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from app import app, db
+from cache import get_data_version
+from models import ExportJob
+
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', '2'))
+EXPORT_DIR = os.environ.get('EXPORT_DIR') or os.path.join(app.instance_path, 'exports')
+EXPORT_RETENTION_HOURS = int(os.environ.get('EXPORT_RETENTION_HOURS', '24'))
+# Files ready within this time are sent in the same request, without the progress page
+EXPORT_INLINE_WAIT_SECONDS = float(os.environ.get('EXPORT_INLINE_WAIT_SECONDS', '1'))
+
+# A job still queued or running after this long died with its worker process
+JOB_TIMEOUT_SECONDS = 15 * 60
+CLEANUP_INTERVAL_SECONDS = 10 * 60
+
+PENDING_STATUSES = ('queued', 'running')
+
+# build(path, school_id, params, progress) writes the file; progress(percent) reports 0-100
+JobKind = namedtuple('JobKind', 'name title build extension mimetype download_name admin')
+JOB_KINDS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+_start_lock = threading.Lock()
+_futures = {}  # job id -> Future, for the jobs started by this process
+_last_cleanup = [0.0]
+
+
+def job_kind(name, title, extension, mimetype, download_name, admin=False):
+    """Register a build function as a job kind.
+
+    download_name may contain {timestamp}; admin kinds are only visible to authenticated admins.
+    """
+    def register(build):
+        JOB_KINDS[name] = JobKind(name, title, build, extension, mimetype, download_name, admin)
+        return build
+    return register
+
+
+def _get_executor():
+    # Created on first use, so each gunicorn worker (after the fork) gets its own threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+        return _executor
+
+
+def job_cache_key(kind, school_id, params):
+    payload = json.dumps([kind, school_id, params], sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def artifact_path(job):
+    return os.path.join(EXPORT_DIR, f"{job.id}.{JOB_KINDS[job.kind].extension}")
+
+
+def is_stale(job):
+    """Queued or running for longer than JOB_TIMEOUT_SECONDS (its process is gone)"""
+    started = job.started_at or job.created_at
+    return (job.status in PENDING_STATUSES and started is not None
+            and datetime.utcnow() - started > timedelta(seconds=JOB_TIMEOUT_SECONDS))
+
+
+def _reusable(job):
+    if job.status == 'done':
+        return os.path.exists(artifact_path(job))
+    return job.status in PENDING_STATUSES and not is_stale(job)
+
+
+def _update_job(job_id, **values):
+    # Own connection: the build function's session stays untouched (no commit, no expired objects)
+    with db.engine.begin() as conn:
+        conn.execute(db.update(ExportJob).where(ExportJob.id == job_id).values(**values))
+
+
+def start_job(kind, school_id, params=None):
+    """ExportJob for a request: a reusable one for the same data, or a new one submitted to the pool"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Tipo de job desconhecido: {kind}")
+    params = {key: value for key, value in (params or {}).items() if value not in ('', None)}
+    cache_key = job_cache_key(kind, school_id, params)
+    version = get_data_version(school_id)
+    remove_expired_jobs()
+
+    with _start_lock:
+        candidates = ExportJob.query.filter(
+            ExportJob.cache_key == cache_key,
+            ExportJob.data_version == version,
+            ExportJob.status.in_(PENDING_STATUSES + ('done',))
+        ).order_by(ExportJob.created_at.desc()).limit(3).all()
+        for job in candidates:
+            if _reusable(job):
+                logging.debug(f"Job {job.id} reaproveitado ({kind}, escola {school_id})")
+                return job
+
+        job = ExportJob(id=uuid.uuid4().hex, school_id=school_id, kind=kind,
+                        params=json.dumps(params, sort_keys=True), cache_key=cache_key,
+                        data_version=version, status='queued', progress=0)
+        job_id = job.id
+        db.session.add(job)
+        db.session.commit()
+        future = _get_executor().submit(run_job, job_id)
+        _futures[job_id] = future
+        future.add_done_callback(lambda _: _futures.pop(job_id, None))
+    return job
+
+
+def run_job(job_id):
+    """Build a job's file (runs on a pool thread, with its own app context and session)"""
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        if job is None or job.status != 'queued':
+            return
+        kind = JOB_KINDS[job.kind]
+        path = artifact_path(job)
+        temp_path = f"{path}.part"
+        _update_job(job_id, status='running', started_at=datetime.utcnow(), progress=1)
+        started = time.perf_counter()
+        try:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            kind.build(temp_path, job.school_id, json.loads(job.params or '{}'),
+                       lambda percent: _update_job(job_id, progress=max(1, min(int(percent), 99))))
+            os.replace(temp_path, path)
+            db.session.rollback()  # End the build's read transaction before writing
+            _update_job(job_id, status='done', progress=100, size=os.path.getsize(path),
+                        filename=kind.download_name.format(timestamp=datetime.now().strftime("%Y%m%d_%H%M%S")),
+                        finished_at=datetime.utcnow())
+            logging.info(f"Job {job_id} ({job.kind}) pronto em {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Erro no job {job_id} ({job.kind}): {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            _update_job(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+        finally:
+            db.session.remove()
+
+
+def wait_for_job(job, timeout):
+    """Wait up to timeout seconds for a job started by this process; returns it reloaded"""
+    future = _futures.get(job.id)
+    if future is not None:
+        wait([future], timeout=timeout)
+    db.session.refresh(job)
+    return job
+
+
+def remove_expired_jobs(force=False):
+    """Delete jobs (and files) older than EXPORT_RETENTION_HOURS; at most every CLEANUP_INTERVAL_SECONDS"""
+    now = time.monotonic()
+    if not force and now - _last_cleanup[0] < CLEANUP_INTERVAL_SECONDS:
+        return 0
+    _last_cleanup[0] = now
+
+    cutoff = datetime.utcnow() - timedelta(hours=EXPORT_RETENTION_HOURS)
+    expired = ExportJob.query.filter(ExportJob.created_at < cutoff).all()
+    for job in expired:
+        path = artifact_path(job) if job.kind in JOB_KINDS else None
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logging.warning(f"Não foi possível apagar {path}: {e}")
+        db.session.delete(job)
+    if expired:
+        db.session.commit()
+        logging.info(f"✅ {len(expired)} exportações antigas removidas")
+    return len(expired)
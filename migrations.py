@@ -0,0 +1,262 @@
+"""Migrações de schema versionadas, aplicadas uma única vez.
+
+Cada migração tem um número de versão; as aplicadas ficam registradas na
+tabela ``schema_version``. A migração e o registro da sua versão são gravados
+na mesma transação: se o processo cair no meio, nada fica aplicado pela metade
+e a migração roda de novo por inteiro. Uma migração já publicada não muda
+mais; colunas novas entram numa migração nova, com a própria lista. No boot, ``run_migrations`` faz uma única consulta
+quando o banco já está atualizado. Quando há migrações pendentes, elas rodam
+em ordem sob um advisory lock do PostgreSQL, para que vários workers do
+gunicorn subindo ao mesmo tempo não disputem o mesmo DDL.
+
+Uso manual: python migrations.py
+"""
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from app import app, db
+
+# Arbitrary key for pg_advisory_lock, shared by every worker of this app
+MIGRATION_LOCK_ID = 5301_2025
+
+version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a migration function under a version number.
+
+    The function receives the connection of the migration's transaction; db.session
+    is bound to it while the function runs (see migration_session).
+    """
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        return func
+    return register
+
+
+def latest_version():
+    return max(version for version, _, _ in MIGRATIONS)
+
+
+def current_version(conn):
+    if not inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar() or 0
+
+
+@contextmanager
+def migration_session(conn):
+    """Point db.session at `conn` for one migration; its commits become savepoints"""
+    app_session = db.session
+    db.session = scoped_session(sessionmaker(bind=conn, join_transaction_mode='create_savepoint'))
+    try:
+        yield
+    finally:
+        db.session.remove()
+        db.session = app_session
+
+
+def run_migrations():
+    """Apply pending migrations. Returns the list of versions applied."""
+    with db.engine.connect() as conn:
+        if current_version(conn) >= latest_version():
+            return []
+
+    is_postgres = db.engine.dialect.name == 'postgresql'
+    applied_now = []
+    with db.engine.connect() as lock_conn:
+        if is_postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+            lock_conn.commit()
+        try:
+            version_metadata.create_all(db.engine, checkfirst=True)
+            with db.engine.connect() as conn:
+                # Re-read after taking the lock: another worker may have finished already
+                applied = set(conn.execute(text("SELECT version FROM schema_version")).scalars().all())
+
+            for version, name, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version in applied:
+                    continue
+                logging.info(f"Aplicando migração {version}: {name}")
+                # The migration and its schema_version row commit (or roll back) together
+                with db.engine.begin() as conn:
+                    if conn.dialect.name == 'sqlite':
+                        # pysqlite only opens a transaction before DML; make the DDL part of it too
+                        conn.exec_driver_sql("BEGIN")
+                    with migration_session(conn):
+                        func(conn)
+                    conn.execute(schema_version.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    ))
+                applied_now.append(version)
+                logging.info(f"✅ Migração {version} aplicada: {name}")
+        finally:
+            if is_postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+                lock_conn.commit()
+    return applied_now
+
+
+@migration(1, 'create_tables')
+def create_tables(conn):
+    import models  # noqa: F401  (register every model on db.metadata)
+    db.metadata.create_all(bind=conn)
+
+
+def add_columns(conn, columns):
+    """ALTER TABLE ADD COLUMN for each (table, column, DDL type) the table lacks"""
+    inspector = inspect(conn)
+    for table, column, ddl_type in columns:
+        existing = {c['name'] for c in inspector.get_columns(table)}
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+            logging.info(f"Coluna adicionada: {table}.{column}")
+
+
+@migration(2, 'add_missing_columns')
+def add_missing_columns(conn):
+    # Columns added after the first deployments
+    add_columns(conn, [
+        ('classroom', 'school_id', 'INTEGER'),
+        ('classroom', 'image_asset_id', 'INTEGER REFERENCES asset(id)'),
+        ('classroom', 'excel_asset_id', 'INTEGER REFERENCES asset(id)'),
+        ('school', 'logo_asset_id', 'INTEGER REFERENCES asset(id)'),
+        ('incident', 'is_resolved', 'BOOLEAN DEFAULT FALSE'),
+        ('incident', 'admin_response', 'TEXT'),
+        ('incident', 'response_date', 'TIMESTAMP'),
+        ('incident', 'hidden_from_classroom', 'BOOLEAN DEFAULT FALSE'),
+    ])
+
+
+@migration(3, 'map_orphan_classrooms')
+def map_orphan_classrooms(conn):
+    first_school = conn.execute(text("SELECT MIN(id) FROM school")).scalar()
+    if first_school is not None:
+        conn.execute(text("UPDATE classroom SET school_id = :school_id WHERE school_id IS NULL"),
+                     {'school_id': first_school})
+    conn.execute(text("UPDATE schedule SET is_active = TRUE WHERE is_active IS NULL"))
+    conn.execute(text("UPDATE incident SET hidden_from_classroom = FALSE WHERE hidden_from_classroom IS NULL"))
+
+
+@migration(4, 'legacy_blobs_to_assets')
+def legacy_blobs_to_assets(conn):
+    from assets import migrate_legacy_blobs
+    migrate_legacy_blobs()
+
+
+@migration(5, 'managed_indexes')
+def managed_indexes(conn):
+    from indexes import ensure_indexes
+    ensure_indexes(bind=conn)
+
+
+SAMPLE_CLASSROOMS = [
+    {
+        'name': 'Laboratorio de Jogos Digitais',
+        'capacity': 34,
+        'has_computers': True,
+        'software': 'Unity, Unreal Engine, Blender',
+        'description': 'Laboratorio especializado para desenvolvimento de jogos digitais.',
+        'block': 'Oficina 1',
+    },
+    {
+        'name': 'SALA DEV',
+        'capacity': 34,
+        'has_computers': True,
+        'software': 'Visual Studio, Git, Docker',
+        'description': 'Sala de desenvolvimento de sistemas.',
+        'block': 'Oficina 2',
+    },
+    {
+        'name': 'Sala 208',
+        'capacity': 34,
+        'has_computers': True,
+        'software': 'IDE, Banco de dados',
+        'description': 'Sala para desenvolvimento e banco de dados.',
+        'block': 'Bloco A',
+    },
+    {
+        'name': 'Sala 202',
+        'capacity': 20,
+        'has_computers': True,
+        'software': 'Office, Visual Studio',
+        'description': 'Sala para cursos FIC e desenvolvimento.',
+        'block': 'Bloco A',
+    },
+]
+
+
+@migration(6, 'seed_initial_data')
+def seed_initial_data(conn):
+    """Create the default school and sample classrooms on an empty database"""
+    from models import School, Classroom
+    school = School.query.order_by(School.id).first()
+    if not school:
+        school = School(name="SENAI Morvan Figueiredo", admin_password="senai103103")
+        db.session.add(school)
+        db.session.flush()
+        logging.info("✅ Created default initial school.")
+
+    if not Classroom.query.first():
+        for classroom_data in SAMPLE_CLASSROOMS:
+            db.session.add(Classroom(school_id=school.id, **classroom_data))
+        logging.info("Sample classrooms created successfully!")
+    db.session.commit()
+
+
+
+@migration(7, 'school_data_version')
+def school_data_version(conn):
+    add_columns(conn, [('school', 'data_version', 'INTEGER NOT NULL DEFAULT 0')])
+
+
+@migration(8, 'image_variants')
+def image_variants(conn):
+    """Columns and index for derived images; existing photos get theirs via generate_image_variants.py"""
+    add_columns(conn, [
+        ('asset', 'parent_id', 'INTEGER REFERENCES asset(id)'),
+        ('asset', 'variant', 'VARCHAR(20)'),
+    ])
+    from indexes import ensure_indexes
+    ensure_indexes(bind=conn)
+
+
+@migration(9, 'asset_storage_backend')
+def asset_storage_backend(conn):
+    # Existing rows keep their bytes in the database; see storage.py to move them
+    add_columns(conn, [('asset', 'storage', "VARCHAR(20) NOT NULL DEFAULT 'database'")])
+
+
+@migration(10, 'asset_deduplication')
+def asset_deduplication(conn):
+    """Reference counts for the existing assets, merging byte-identical copies"""
+    add_columns(conn, [('asset', 'ref_count', 'INTEGER NOT NULL DEFAULT 1')])
+    from assets import recount_references
+    recount_references()
+
+
+@migration(11, 'export_jobs')
+def export_jobs(conn):
+    # New table for jobs.py; create_all only adds what is missing
+    create_tables(conn)
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        applied = run_migrations()
+        if applied:
+            print(f"🎉 Migrações aplicadas: {', '.join(str(v) for v in applied)}")
+        else:
+            print("✅ Banco já está na versão mais recente.")
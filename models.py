@@ -1,16 +1,41 @@
 from app import db
 from datetime import datetime
 
+# Predicates for partial indexes over active rows (PostgreSQL and SQLite spell TRUE differently)
+ACTIVE_PG = db.text('is_active = TRUE')
+ACTIVE_SQLITE = db.text('is_active = 1')
+
+class Asset(db.Model):
+    """Binary file (image, Excel workbook, logo) kept out of the classroom/school rows."""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    size = db.Column(db.Integer, default=0)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))  # Only loaded when explicitly requested
+    # Derived images (thumbnails, WebP) point to their original; see images.py
+    parent_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=True, index=True)
+    variant = db.Column(db.String(20), nullable=True)
+    # 'database': bytes in `data`; 'filesystem': content-addressed file, `data` empty (see storage.py)
+    storage = db.Column(db.String(20), nullable=False, default='database', server_default='database')
+    # Classroom/school columns pointing to this (original) asset; see assets.release_asset
+    ref_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Asset {self.id} {self.sha256[:12]}>'
+
 class School(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     admin_password = db.Column(db.String(255), nullable=False)
-    logo_data = db.Column(db.LargeBinary, nullable=True)
-    logo_mimetype = db.Column(db.String(100), nullable=True)
+    logo_asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=True)
+    # Bumped on every write to the school's rooms, schedules or incidents (see cache.py)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship with classrooms
     classrooms = db.relationship('Classroom', backref='school', lazy=True, cascade='all, delete-orphan')
+    logo_asset = db.relationship('Asset', foreign_keys=[logo_asset_id])
 
     def __repr__(self):
         return f'<School {self.name}>'
@@ -23,6 +48,10 @@ class School(db.Model):
         }
 
 class Classroom(db.Model):
+    __table_args__ = (
+        db.Index('ix_classroom_school_id', 'school_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     capacity = db.Column(db.Integer, nullable=False)
@@ -32,10 +61,8 @@ class Classroom(db.Model):
     block = db.Column(db.String(50), nullable=False)
     image_filename = db.Column(db.String(255), default='')  # Store filename instead of URL
     excel_filename = db.Column(db.String(255), default='')  # Store Excel filename
-    image_data = db.Column(db.LargeBinary)  # Store image data in PostgreSQL (BYTEA)
-    excel_data = db.Column(db.LargeBinary)  # Store Excel file data in PostgreSQL (BYTEA)
-    image_mimetype = db.Column(db.String(100))  # Store image MIME type
-    excel_mimetype = db.Column(db.String(100))  # Store Excel MIME type
+    image_asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=True)  # Image bytes live in the asset table
+    excel_asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=True)  # Excel bytes live in the asset table
     admin_password = db.Column(db.String(255), default='')  # Admin password for classroom access
     school_id = db.Column(db.Integer, db.ForeignKey('school.id'), nullable=True) # Temporarily nullable for migration
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -55,6 +82,8 @@ class Classroom(db.Model):
     
     # Relationship with schedules
     schedules = db.relationship('Schedule', backref='classroom', lazy=True, cascade='all, delete-orphan')
+    image_asset = db.relationship('Asset', foreign_keys=[image_asset_id])
+    excel_asset = db.relationship('Asset', foreign_keys=[excel_asset_id])
     
     def __repr__(self):
         return f'<Classroom {self.name}>'
@@ -72,6 +101,17 @@ class Classroom(db.Model):
         }
 
 class Schedule(db.Model):
+    __table_args__ = (
+        # classroom_detail, add_schedule and edit_classroom lookups
+        db.Index('ix_schedule_classroom_day_shift_active', 'classroom_id', 'day_of_week', 'shift', 'is_active'),
+        # School-wide availability/dashboard scans: only active rows, by weekday and shift
+        db.Index('ix_schedule_active_day_shift', 'day_of_week', 'shift', 'classroom_id',
+                 postgresql_where=ACTIVE_PG, sqlite_where=ACTIVE_SQLITE),
+        # "Not expired yet" filters (end_date >= today / start_date <= week end)
+        db.Index('ix_schedule_active_dates', 'end_date', 'start_date',
+                 postgresql_where=ACTIVE_PG, sqlite_where=ACTIVE_SQLITE),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
     day_of_week = db.Column(db.Integer, nullable=False)  # 0=Monday, 1=Tuesday, ..., 6=Sunday
@@ -125,6 +165,12 @@ class AdminSession(db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
 class Incident(db.Model):
+    __table_args__ = (
+        db.Index('ix_incident_classroom_visible', 'classroom_id', 'is_active', 'hidden_from_classroom', 'created_at'),
+        db.Index('ix_incident_active_created', 'created_at',
+                 postgresql_where=ACTIVE_PG, sqlite_where=ACTIVE_SQLITE),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
     reporter_name = db.Column(db.String(100), nullable=False)
@@ -167,6 +213,11 @@ class Incident(db.Model):
         return f'<Incident {self.id} - {self.reporter_name}>'
 
 class ScheduleRequest(db.Model):
+    __table_args__ = (
+        db.Index('ix_schedule_request_status_created', 'status', 'created_at'),
+        db.Index('ix_schedule_request_classroom', 'classroom_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
     requester_name = db.Column(db.String(100), nullable=False)
@@ -240,3 +291,40 @@ class ScheduleRequest(db.Model):
     
     def __repr__(self):
         return f'<ScheduleRequest {self.id} - {self.event_name}>'
+
+class ExportJob(db.Model):
+    """Spreadsheet or PDF report built in the background; see jobs.py"""
+    __table_args__ = (
+        db.Index('ix_export_job_cache_key', 'cache_key', 'data_version'),
+        db.Index('ix_export_job_created', 'created_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, also the artifact file name
+    school_id = db.Column(db.Integer, nullable=False, index=True)
+    kind = db.Column(db.String(40), nullable=False)
+    params = db.Column(db.Text, default='')  # JSON of the request arguments
+    # Same kind + school + params; reused while the school's data_version doesn't change
+    cache_key = db.Column(db.String(40), nullable=False)
+    data_version = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    error = db.Column(db.Text)
+    filename = db.Column(db.String(200))  # Download name
+    size = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error or '',
+            'filename': self.filename or '',
+            'size': self.size or 0,
+        }
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.kind} {self.status}>'
@@ -1,10 +1,12 @@
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, LongTable, TableStyle, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import io
+from types import SimpleNamespace
+from xml.sax.saxutils import escape
 from datetime import datetime
 from datetime import datetime
 
@@ -182,6 +184,15 @@ def generate_classroom_pdf(classroom, schedules, school_name='SENAI'):
     buffer.seek(0)
     return buffer
 
+def render_classroom_pdf(task):
+    """Process pool entry point (see classroom_pdfs.py): (classroom dict, schedule dicts, school name) -> PDF bytes
+
+    Takes plain data so it can be pickled; the worker process doesn't need the app or the database.
+    """
+    classroom, schedules, school_name = task
+    return generate_classroom_pdf(SimpleNamespace(**classroom), [SimpleNamespace(**schedule) for schedule in schedules],
+                                  school_name=school_name).getvalue()
+
 def generate_general_report(classrooms, all_schedules, school_name='SENAI'):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
@@ -446,3 +457,112 @@ def generate_availability_report(classrooms, schedules, school_name='SENAI'):
     doc.build(story)
     buffer.seek(0)
     return buffer
+
+# Incidents report styles, built once: the report can list thousands of incidents
+_INCIDENTS_SHEET = getSampleStyleSheet()
+INCIDENTS_TITLE_STYLE = ParagraphStyle('IncidentsTitle', parent=_INCIDENTS_SHEET['Heading1'], fontSize=16, spaceAfter=30, textColor=colors.HexColor('#1f2937'))
+INCIDENTS_SUBTITLE_STYLE = ParagraphStyle('IncidentsSubtitle', parent=_INCIDENTS_SHEET['Heading2'], fontSize=12, spaceAfter=20, textColor=colors.HexColor('#374151'))
+INCIDENTS_NORMAL_STYLE = _INCIDENTS_SHEET['Normal']
+INCIDENT_HEADER_STYLE = ParagraphStyle('IncidentHeader', parent=_INCIDENTS_SHEET['Heading3'], fontSize=11, textColor=colors.HexColor('#1f2937'))
+INCIDENT_DETAILS_STYLE = ParagraphStyle('IncidentDetails', parent=INCIDENTS_NORMAL_STYLE, spaceAfter=12)
+INCIDENTS_TABLE_WIDTHS = [0.8*inch, 1.5*inch, 1.5*inch, 1*inch, 1*inch, 2.2*inch]
+INCIDENTS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+def _incident_details(incident):
+    """Detail paragraph markup of one incident (user text escaped)"""
+    details = f"""<b>Reportado por:</b> {escape(incident.reporter_name)} ({escape(incident.reporter_email)})<br/>
+    <b>Data:</b> {incident.created_at.strftime('%d/%m/%Y às %H:%M') if incident.created_at else 'Não informada'}<br/>
+    <b>Status:</b> {'Resolvida' if incident.is_resolved else 'Pendente'}<br/>
+    <b>Descrição:</b> {escape(incident.description)}<br/>"""
+    
+    if incident.admin_response:
+        details += f"<b>Resposta do Admin:</b> {escape(incident.admin_response)}<br/>"
+        if incident.response_date:
+            details += f"<b>Data da Resposta:</b> {incident.response_date.strftime('%d/%m/%Y às %H:%M')}<br/>"
+    return details
+
+def _incidents_story(incidents, school_name, filter_info, generated_at):
+    """Flowables of the incidents report, built in one pass over the rows.
+
+    The whole story, with every table row and detail paragraph, exists before
+    doc.build() starts (see generate_incidents_report for the memory cost).
+    """
+    story = [
+        Paragraph(f"Relatório de Ocorrências - {escape(school_name)}", INCIDENTS_TITLE_STYLE),
+        Paragraph(f"Gerado em: {(generated_at or datetime.now()).strftime('%d/%m/%Y às %H:%M')}", INCIDENTS_NORMAL_STYLE),
+        Spacer(1, 12),
+    ]
+    
+    if filter_info:
+        story.append(Paragraph("Filtros aplicados: " + escape(", ".join(filter_info)), INCIDENTS_SUBTITLE_STYLE))
+        story.append(Spacer(1, 12))
+    
+    total_incidents = pending_incidents = 0
+    data = [['ID', 'Sala', 'Reportado por', 'Data', 'Status', 'Descrição']]
+    details = []
+    for incident in incidents:
+        total_incidents += 1
+        pending_incidents += 0 if incident.is_resolved else 1
+        # Truncate description for table
+        description = incident.description[:50] + '...' if len(incident.description) > 50 else incident.description
+        data.append([
+            f"#{incident.id}",
+            incident.classroom_name,
+            incident.reporter_name,
+            incident.created_at.strftime('%d/%m/%Y') if incident.created_at else '',
+            'Resolvida' if incident.is_resolved else 'Pendente',
+            description
+        ])
+        details.append(Paragraph(f"Ocorrência #{incident.id} - {escape(incident.classroom_name)}", INCIDENT_HEADER_STYLE))
+        details.append(Paragraph(_incident_details(incident), INCIDENT_DETAILS_STYLE))
+    
+    if total_incidents:
+        # LongTable lays out long tables in linear time; the header repeats on every page
+        table = LongTable(data, colWidths=INCIDENTS_TABLE_WIDTHS, repeatRows=1)
+        table.setStyle(INCIDENTS_TABLE_STYLE)
+        story.append(table)
+        story.append(Spacer(1, 20))
+        
+        # Add detailed incidents
+        story.append(Paragraph("Detalhes das Ocorrências", INCIDENTS_SUBTITLE_STYLE))
+        story.extend(details)
+    else:
+        story.append(Paragraph("Nenhuma ocorrência encontrada com os filtros aplicados.", INCIDENTS_NORMAL_STYLE))
+    
+    # Add summary
+    summary = f"""<b>Resumo:</b><br/>
+    Total de ocorrências: {total_incidents}<br/>
+    Pendentes: {pending_incidents}<br/>
+    Resolvidas: {total_incidents - pending_incidents}"""
+    
+    story.append(Spacer(1, 20))
+    story.append(Paragraph(summary, INCIDENTS_SUBTITLE_STYLE))
+    return story
+
+def generate_incidents_report(incidents, school_name='SENAI', filter_info=None, generated_at=None):
+    """incidents: rows with id, classroom_name, reporter, dates, status, description and response
+    (see reports.load_report_incidents). Not streamed: the story holds every table row and
+    detail paragraph while doc.build() runs, so peak memory grows linearly with the number
+    of rows (about 14 KB per incident, 68 MB for 5000, see benchmark_incidents_report.py).
+    """
+    buffer = io.BytesIO()
+    
+    # Create the PDF object
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    
+    # Build PDF
+    doc.build(_incidents_story(incidents, school_name, filter_info, generated_at))
+    buffer.seek(0)
+    return buffer
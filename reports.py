@@ -0,0 +1,160 @@
+"""Tipos de job de exportação (ver jobs.py): planilhas Excel e relatórios em PDF.
+
+Cada função recebe o caminho do arquivo a escrever, a escola, os parâmetros do
+pedido (os filtros da tela) e ``progress(percent)``. Roda numa thread do pool
+de jobs, com a própria sessão do banco, então não pode usar ``request`` nem
+``session``.
+
+A ficha em PDF de cada sala (/generate_pdf) continua síncrona, mas os bytes
+ficam em ``pdf_cache`` até a próxima mudança na versão de dados da escola:
+baixar de novo a mesma ficha não gera o PDF outra vez. O cache é limitado por
+``PDF_CACHE_MAX_MB`` (padrão 32) por worker. As fichas de todas as salas num
+ZIP ficam em classroom_pdfs.py.
+"""
+import os
+import shutil
+
+from app import db
+from cache import VersionedCache, get_data_version
+from exports import XLSX_MIMETYPE, write_school_workbook, write_filtered_workbook
+from jobs import job_kind
+from models import Classroom, Incident, Schedule
+from schools import get_school_info
+
+try:
+    from pdf_generator import (generate_classroom_pdf, generate_general_report, generate_availability_report,
+                               generate_incidents_report)
+except ImportError:
+    generate_classroom_pdf = generate_general_report = generate_availability_report = None
+    generate_incidents_report = None
+
+PDF_MIMETYPE = 'application/pdf'
+PDF_CACHE_MAX_BYTES = int(float(os.environ.get('PDF_CACHE_MAX_MB', 32)) * 1024 * 1024)
+
+# (report, school_id, classroom_id) -> PDF bytes, tagged with the school's data version
+pdf_cache = VersionedCache('pdf', max_entries=512, max_bytes=PDF_CACHE_MAX_BYTES)
+
+# Request arguments each kind accepts (anything else is ignored and not part of the cache key)
+FILTERED_EXCEL_PARAMS = ('block', 'has_computers', 'capacity')
+INCIDENTS_REPORT_PARAMS = ('status', 'reporter', 'classroom')
+
+
+def _school_name(school_id):
+    school = get_school_info(school_id)
+    return school.name if school else 'SENAI'
+
+
+def _write_buffer(path, buffer):
+    with open(path, 'wb') as output:
+        shutil.copyfileobj(buffer, output)
+
+
+def pdf_cache_key(report, school_id, classroom_id):
+    return (report, school_id, classroom_id)
+
+
+def cached_pdf(report, school_id, classroom_id, build):
+    """PDF bytes from build(), reused until the school's data changes"""
+    return pdf_cache.get_or_compute(pdf_cache_key(report, school_id, classroom_id), get_data_version(school_id), build)
+
+
+def classroom_pdf(classroom, school_name):
+    """Room sheet PDF (bytes) of a classroom, from pdf_cache when its school hasn't changed"""
+    def build():
+        schedules = Schedule.query.filter_by(classroom_id=classroom.id, is_active=True).all()
+        return generate_classroom_pdf(classroom, schedules, school_name=school_name).getvalue()
+    return cached_pdf('classroom', classroom.school_id, classroom.id, build)
+
+
+def _active_rooms_and_schedules(school_id):
+    classrooms = Classroom.query.filter_by(school_id=school_id).all()
+    schedules = Schedule.query.join(Classroom).filter(
+        Classroom.school_id == school_id,
+        Schedule.is_active == True
+    ).all()
+    return classrooms, schedules
+
+
+@job_kind('school_excel', 'Planilha completa (Excel)', 'xlsx', XLSX_MIMETYPE,
+          'relatorio_senai_{timestamp}.xlsx', admin=True)
+def build_school_excel(path, school_id, params, progress):
+    write_school_workbook(path, school_id, progress=progress)
+
+
+@job_kind('filtered_excel', 'Planilha filtrada (Excel)', 'xlsx', XLSX_MIMETYPE,
+          'relatorio_filtrado_{timestamp}.xlsx', admin=True)
+def build_filtered_excel(path, school_id, params, progress):
+    write_filtered_workbook(path, school_id, progress=progress,
+                            **{key: params.get(key, '') for key in FILTERED_EXCEL_PARAMS})
+
+
+@job_kind('general_report', 'Relatório geral (PDF)', 'pdf', PDF_MIMETYPE, 'relatorio_geral.pdf')
+def build_general_report(path, school_id, params, progress):
+    classrooms, schedules = _active_rooms_and_schedules(school_id)
+    progress(30)
+    _write_buffer(path, generate_general_report(classrooms, schedules, school_name=_school_name(school_id)))
+
+
+@job_kind('availability_report', 'Relatório de disponibilidade (PDF)', 'pdf', PDF_MIMETYPE,
+          'relatorio_disponibilidade.pdf')
+def build_availability_report(path, school_id, params, progress):
+    classrooms, schedules = _active_rooms_and_schedules(school_id)
+    progress(30)
+    _write_buffer(path, generate_availability_report(classrooms, schedules, school_name=_school_name(school_id)))
+
+
+def load_report_incidents(school_id, status_filter='', reporter_filter='', classroom_filter=''):
+    """Visible incidents of a school with the incidents_management filters, newest first
+
+    One joined query: each row carries its room name (classroom_name) instead of
+    loading the Classroom of every incident.
+    """
+    query = db.session.query(
+        Incident.id, Classroom.name.label('classroom_name'), Incident.reporter_name, Incident.reporter_email,
+        Incident.description, Incident.created_at, Incident.is_resolved, Incident.admin_response,
+        Incident.response_date
+    ).join(Classroom, Incident.classroom_id == Classroom.id).filter(
+        Classroom.school_id == school_id,
+        Incident.is_active == True,
+        db.func.coalesce(Incident.hidden_from_classroom, False) == False
+    )
+
+    if status_filter == 'pending':
+        query = query.filter(Incident.is_resolved == False)
+    elif status_filter == 'resolved':
+        query = query.filter(Incident.is_resolved == True)
+
+    if reporter_filter:
+        query = query.filter(Incident.reporter_name.ilike(f'%{reporter_filter}%'))
+
+    if classroom_filter.isdigit():
+        query = query.filter(Incident.classroom_id == int(classroom_filter))
+
+    return query.order_by(Incident.created_at.desc()).all()
+
+
+def incidents_filter_info(status_filter='', reporter_filter='', classroom_filter=''):
+    """Human-readable description of the filters, for the report header"""
+    filter_info = []
+    if status_filter:
+        filter_info.append(f"Status: {'Pendentes' if status_filter == 'pending' else 'Resolvidas'}")
+    if reporter_filter:
+        filter_info.append(f"Reportado por: {reporter_filter}")
+    if classroom_filter.isdigit():
+        classroom = db.session.get(Classroom, int(classroom_filter))
+        if classroom:
+            filter_info.append(f"Sala: {classroom.name}")
+    return filter_info
+
+
+@job_kind('incidents_report', 'Relatório de ocorrências (PDF)', 'pdf', PDF_MIMETYPE,
+          'relatorio_ocorrencias_{timestamp}.pdf', admin=True)
+def build_incidents_report(path, school_id, params, progress):
+    from routes import get_brazil_time
+
+    filters = [params.get(key, '') for key in INCIDENTS_REPORT_PARAMS]
+    incidents = load_report_incidents(school_id, *filters)
+    progress(30)
+    _write_buffer(path, generate_incidents_report(incidents, school_name=_school_name(school_id),
+                                                  filter_info=incidents_filter_info(*filters),
+                                                  generated_at=get_brazil_time()))
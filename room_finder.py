@@ -0,0 +1,110 @@
+"""Busca de salas livres por atributos.
+
+Responde em uma chamada perguntas como "salas livres com pelo menos 30 lugares,
+computadores e Unity na noite de 03/11". Os atributos das salas de cada escola
+são indexados uma vez por versão de dados (capacidade ordenada, salas com
+computadores, software → salas, bloco → salas) e cruzados com o motor de
+disponibilidade; os dois ficam em cache até a próxima escrita na escola.
+"""
+import bisect
+
+import availability as availability_engine
+from cache import VersionedCache, get_data_version
+
+room_index_cache = VersionedCache('room_index', max_entries=64)
+
+
+def _normalize(value):
+    return (value or '').strip().lower()
+
+
+class RoomIndex:
+    """Attribute indexes over one school's rooms"""
+
+    def __init__(self, classrooms):
+        self.rooms = {room.id: room for room in classrooms}
+        self.by_capacity = sorted((room.capacity or 0, room.id) for room in classrooms)
+        self.with_computers = {room.id for room in classrooms if room.has_computers}
+        self.by_software = {}
+        self.software_names = {}  # normalized token -> name as first typed
+        self.by_block = {}
+        for room in classrooms:
+            for software in (room.software or '').split(','):
+                token = _normalize(software)
+                if token:
+                    self.by_software.setdefault(token, set()).add(room.id)
+                    self.software_names.setdefault(token, software.strip())
+            block = _normalize(room.block)
+            if block:
+                self.by_block.setdefault(block, set()).add(room.id)
+
+    def with_min_capacity(self, min_capacity):
+        start = bisect.bisect_left(self.by_capacity, (min_capacity, -1))
+        return {room_id for _, room_id in self.by_capacity[start:]}
+
+    def with_software(self, term):
+        """Rooms listing a software whose name contains `term` (case-insensitive)"""
+        term = _normalize(term)
+        rooms = set()
+        for token, room_ids in self.by_software.items():
+            if term in token:
+                rooms |= room_ids
+        return rooms
+
+    def in_block(self, term):
+        term = _normalize(term)
+        rooms = set()
+        for block, room_ids in self.by_block.items():
+            if term in block:
+                rooms |= room_ids
+        return rooms
+
+    def match(self, min_capacity=None, has_computers=None, software=(), block=None):
+        """Ids of rooms matching every given attribute filter"""
+        candidates = set(self.rooms)
+        if min_capacity:
+            candidates &= self.with_min_capacity(min_capacity)
+        if has_computers is True:
+            candidates &= self.with_computers
+        elif has_computers is False:
+            candidates -= self.with_computers
+        for term in software:
+            candidates &= self.with_software(term)
+        if block:
+            candidates &= self.in_block(block)
+        return candidates
+
+
+def get_room_index(school_id):
+    def compute():
+        classrooms, _, _ = availability_engine.load_school_snapshot(school_id)
+        return RoomIndex(classrooms)
+    return room_index_cache.get_or_compute(school_id, get_data_version(school_id), compute)
+
+
+def find_rooms(school_id, target_date, shift=None, min_capacity=None, has_computers=None,
+               software=(), block=None, now=None):
+    """Free rooms matching the filters, best-fit capacity first.
+
+    Shift semantics are the same as /available_now (see availability.get_availability).
+    On Sundays and outside school hours the school is closed: `closed` is set and no room
+    is offered, even though availability lists every room as free.
+    """
+    index = get_room_index(school_id)
+    candidates = index.match(min_capacity, has_computers, software, block)
+    availability = availability_engine.get_availability(school_id, target_date, shift, now=now)
+    closed = availability['closed']
+    free_ids = set() if closed else {room.id for room in availability['available_rooms']}
+
+    def fit(room):
+        # Smallest room that still fits the group first, so big labs stay free
+        return ((room.capacity or 0) - (min_capacity or 0), _normalize(room.name))
+
+    rooms = sorted((index.rooms[room_id] for room_id in candidates & free_ids), key=fit)
+    return {
+        'rooms': rooms,
+        'matching_rooms': len(candidates),
+        'total_rooms': len(index.rooms),
+        'period_description': availability['period_description'],
+        'closed': closed,
+    }
@@ -1,9 +1,25 @@
 import os
 import sys
 import json
+import logging
 from flask import render_template, request, redirect, url_for, flash, session, jsonify, send_file, make_response, abort
 from app import app, db
-from models import School, Classroom, Schedule, Incident, ScheduleRequest
+from models import School, Classroom, Schedule, Incident, ScheduleRequest, ExportJob
+from assets import UPLOAD_LIMITS, store_upload, store_spooled, spool_upload, release_asset, open_asset, asset_version, prime_asset_versions, logo_bytes_cache
+from schools import get_school_info, forget_school, school_logo_asset_id
+import availability as availability_engine
+from cache import bump_data_version, all_cache_stats
+import room_finder
+import dashboard_service
+from facets import get_facets, get_room_search_text
+from conditional import conditional_page
+from storage import accel_redirect_path, move_assets
+from images import store_image, image_variants, prime_image_variants, variant_sources
+from conflicts import ConflictIndex, Slot, describe_conflicts, precheck_requests
+from jobs import JOB_KINDS, EXPORT_INLINE_WAIT_SECONDS, start_job, wait_for_job, artifact_path, is_stale
+from reports import FILTERED_EXCEL_PARAMS, INCIDENTS_REPORT_PARAMS, classroom_pdf
+import classroom_pdfs  # noqa: F401 (registers the classroom_pdfs job kind)
+from schedule_import import import_schedules
 from datetime import datetime, timedelta
 
 # OpenAI integration
@@ -57,13 +73,10 @@ except ImportError as e:
 ADMIN_PASSWORD = "senai103103"
 # Helper to get the active school from session
 def get_active_school():
-    """Returns the current active school or None if not selected"""
-    school_id = session.get('active_school_id')
-    if not school_id:
-        return None
-    return School.query.get(school_id)
+    """Returns the current active school (cached SchoolInfo) or None if not selected"""
+    return get_school_info(session.get('active_school_id'))
 
-# All files are now stored in PostgreSQL database, no local file storage
+# All files are stored in the asset table (see assets.py), no local file storage
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_EXCEL_EXTENSIONS = {'xlsx', 'xls'}
 
@@ -85,14 +98,29 @@ def require_admin_auth(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+# Time keys for conditional_page: what makes a page change besides the school data
+def current_day_key():
+    return get_brazil_time().date().isoformat()
+
+def current_period_key():
+    now = get_brazil_time()
+    return now.date().isoformat(), tuple(availability_engine.current_shifts(now))
+
 @app.route('/')
+@conditional_page()
 def index():
     active_school = get_active_school()
     if not active_school:
         return redirect(url_for('select_school'))
     
+    # Rooms plus precomputed search text: a fixed number of queries, no classroom.schedules per card
     classrooms = Classroom.query.filter_by(school_id=active_school.id).all()
-    return render_template('index.html', classrooms=classrooms)
+    image_ids = [classroom.image_asset_id for classroom in classrooms]
+    prime_asset_versions(image_ids)
+    prime_image_variants(image_ids)
+    return render_template('index.html', classrooms=classrooms,
+                           search_text=get_room_search_text(active_school.id),
+                           facets=get_facets(active_school.id))
 
 @app.route('/select_school')
 def select_school():
@@ -118,7 +146,9 @@ def select_school():
 
 @app.route('/set_active_school/<int:school_id>')
 def set_active_school(school_id):
-    school = School.query.get_or_404(school_id)
+    school = get_school_info(school_id)
+    if not school:
+        abort(404)
     session['active_school_id'] = school.id
     session['active_school_name'] = school.name
     # Logout admin when switching schools to maintain isolation
@@ -127,6 +157,7 @@ def set_active_school(school_id):
     return redirect(url_for('index'))
 
 @app.route('/classroom/<int:classroom_id>')
+@conditional_page(current_day_key)
 def classroom_detail(classroom_id):
     from datetime import datetime
     current_date = get_brazil_time().date()
@@ -179,53 +210,12 @@ def classroom_detail(classroom_id):
 
     schedules = query.order_by(Schedule.day_of_week, Schedule.shift).all()
     
-    # Get incidents for this classroom using raw SQL to avoid SQLAlchemy column issues
-    incidents = []
-    try:
-        from sqlalchemy import text
-        with db.engine.connect() as conn:
-            # First ensure the column exists
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-            
-            # Use safe SQL query
-            result = conn.execute(text("""
-                SELECT id, classroom_id, reporter_name, reporter_email, description, 
-                       created_at, is_active, is_resolved, admin_response, response_date,
-                       COALESCE(hidden_from_classroom, FALSE) as hidden_from_classroom
-                FROM incident 
-                WHERE classroom_id = :classroom_id 
-                  AND is_active = TRUE 
-                  AND COALESCE(hidden_from_classroom, FALSE) = FALSE
-                ORDER BY created_at DESC
-            """), {'classroom_id': classroom_id})
-            
-            incident_data = result.fetchall()
-            
-            # Convert to Incident-like objects for template compatibility
-            class IncidentProxy:
-                def __init__(self, row):
-                    self.id = row[0]
-                    self.classroom_id = row[1]
-                    self.reporter_name = row[2]
-                    self.reporter_email = row[3]
-                    self.description = row[4]
-                    self.created_at = row[5]
-                    self.is_active = row[6]
-                    self.is_resolved = row[7]
-                    self.admin_response = row[8]
-                    self.response_date = row[9]
-                    self.hidden_from_classroom = row[10]
-            
-            incidents = [IncidentProxy(row) for row in incident_data]
-            
-    except Exception as e:
-        import logging
-        logging.error(f"Incident query error: {e}")
-        incidents = []
+    # Visible incidents for this classroom (columns are guaranteed by migrations.py)
+    incidents = Incident.query.filter(
+        Incident.classroom_id == classroom_id,
+        Incident.is_active == True,
+        db.func.coalesce(Incident.hidden_from_classroom, False) == False
+    ).order_by(Incident.created_at.desc()).all()
     
     return render_template('classroom.html', 
                          classroom=classroom, 
@@ -281,6 +271,20 @@ def not_found_error(error):
     """Página personalizada para erro 404"""
     return render_template('errors/404.html'), 404
 
+@app.before_request
+def reject_oversized_uploads():
+    # Refuse by Content-Length before any view touches request.files
+    limit = app.config.get('MAX_CONTENT_LENGTH')
+    if limit and request.content_length and request.content_length > limit:
+        abort(413)
+
+@app.errorhandler(413)
+def request_entity_too_large(error):
+    """Upload above MAX_CONTENT_LENGTH, refused before the body is read"""
+    max_mb = (app.config.get('MAX_CONTENT_LENGTH') or 0) / (1024 * 1024)
+    flash(f'Arquivo muito grande. O envio total é limitado a {max_mb:.0f} MB.', 'error')
+    return redirect(request.referrer or url_for('index'))
+
 @app.errorhandler(500)
 def internal_error(error):
     """Página personalizada para erro 500"""
@@ -335,22 +339,25 @@ def edit_classroom(classroom_id):
                 file = request.files['image']
                 if file and file.filename and file.filename != '' and allowed_file(file.filename):
                     filename = secure_filename(file.filename)
-                    # Store file data in database
-                    classroom.image_data = file.read()
-                    classroom.image_mimetype = file.mimetype
+                    # Store file data in the asset table
+                    old_image_id = classroom.image_asset_id
+                    classroom.image_asset_id = store_image(file.stream, file.mimetype).id
                     classroom.image_filename = filename
+                    release_asset(old_image_id)
             
             # Handle Excel file upload with PostgreSQL storage
             if 'excel_file' in request.files:
                 excel_file = request.files['excel_file']
                 if excel_file and excel_file.filename and excel_file.filename != '' and allowed_excel_file(excel_file.filename):
                     filename = secure_filename(excel_file.filename)
-                    # Store file data in database
-                    classroom.excel_data = excel_file.read()
-                    classroom.excel_mimetype = excel_file.mimetype
+                    # Store file data in the asset table
+                    old_excel_id = classroom.excel_asset_id
+                    classroom.excel_asset_id = store_upload(excel_file, 'excel').id
                     classroom.excel_filename = filename
+                    release_asset(old_excel_id)
                     
             classroom.updated_at = datetime.utcnow()
+            bump_data_version(classroom.school_id)
             
             db.session.commit()
             flash('Sala atualizada com sucesso!', 'success')
@@ -374,14 +381,15 @@ def download_excel(classroom_id):
             flash('Acesso negado.', 'error')
             return redirect(url_for('index'))
         
-        if not classroom.excel_data:
+        excel_asset = open_asset(classroom.excel_asset_id)
+        if not excel_asset:
             flash('Nenhum arquivo Excel disponível para esta sala.', 'error')
             return redirect(url_for('classroom_detail', classroom_id=classroom_id))
         
         safe_filename = f"{classroom.name.replace(' ', '_')}_patrimonio.xlsx"
-        return send_file(
-            io.BytesIO(classroom.excel_data),
-            mimetype=classroom.excel_mimetype or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        return send_stored_asset(
+            excel_asset,
+            mimetype=excel_asset.mimetype or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
             download_name=safe_filename
         )
@@ -389,9 +397,74 @@ def download_excel(classroom_id):
         flash(f'Erro ao baixar arquivo: {str(e)}', 'error')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
 
+# Images and logos are addressed by content: the URL carries ?v=<sha256 prefix>
+# of the asset, so a versioned URL never changes content and can be cached forever.
+IMMUTABLE_CACHE_CONTROL = 'max-age=31536000, immutable'
+
+@app.template_global()
+def asset_url(endpoint, asset_id, **values):
+    """URL of an image/logo route versioned by the asset content"""
+    return url_for(endpoint, v=asset_version(asset_id), **values)
+
+@app.template_global()
+def classroom_image(classroom):
+    """src/srcset of a classroom photo and its reduced variants"""
+    return variant_sources(
+        lambda variant, version: url_for('serve_image', classroom_id=classroom.id, variant=variant, v=version),
+        classroom.image_asset_id
+    )
+
+@app.template_global()
+def school_logo_url(school_id):
+    return asset_url('serve_school_logo', school_logo_asset_id(school_id), school_id=school_id)
+
+def set_asset_cache_headers(response, version, public):
+    response.set_etag(version)
+    scope = 'public' if public else 'private'
+    if request.args.get('v') == version:
+        response.headers['Cache-Control'] = f'{scope}, {IMMUTABLE_CACHE_CONTROL}'
+    else:
+        # Unversioned (or outdated) URL: the content may change, always revalidate
+        response.headers['Cache-Control'] = f'{scope}, no-cache'
+    return response
+
+def not_modified_asset():
+    """304 without touching the database when the client has the versioned asset"""
+    version = request.args.get('v')
+    if version and request.if_none_match.contains_weak(version):
+        response = make_response('', 304)
+        response.set_etag(version)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+    return None
+
+def send_stored_asset(asset, **kwargs):
+    """send_file for an asset: real file (sendfile / nginx) when on disk, BytesIO when in the database"""
+    if not asset.path:
+        return send_file(io.BytesIO(asset.data), etag=asset.version, **kwargs)
+    accel_path = accel_redirect_path(asset.sha256)
+    if accel_path:
+        # nginx sends the file; Flask only provides the headers
+        response = send_file(io.BytesIO(b''), etag=asset.version, **kwargs)
+        response.headers['X-Accel-Redirect'] = accel_path
+        del response.headers['Content-Length']
+        return response
+    return send_file(asset.path, etag=asset.version, **kwargs)
+
+def send_asset(asset_id, default_mimetype, public, cache=None):
+    # Revalidation only needs the (cached) version, not the bytes
+    version = asset_version(asset_id)
+    if version and request.if_none_match.contains_weak(version):
+        return set_asset_cache_headers(make_response('', 304), version, public)
+    asset = open_asset(asset_id, cache=cache)
+    if not asset:
+        abort(404)
+    response = send_stored_asset(asset, mimetype=asset.mimetype or default_mimetype)
+    return set_asset_cache_headers(response, asset.version, public)
+
 @app.route('/image/<int:classroom_id>')
 def serve_image(classroom_id):
-    """Serve images from PostgreSQL database"""
+    """Serve images from the asset table"""
     active_school = get_active_school()
     try:
         classroom = Classroom.query.get_or_404(classroom_id)
@@ -399,15 +472,18 @@ def serve_image(classroom_id):
             from flask import abort
             abort(404)
         
-        if not classroom.image_data:
-            # Return default image or 404
-            from flask import abort
-            abort(404)
-        
-        return send_file(
-            io.BytesIO(classroom.image_data),
-            mimetype=classroom.image_mimetype or 'image/jpeg'
-        )
+        # Private image: the school check comes first, so a versioned URL from another
+        # school gets the same 404 with or without If-None-Match
+        cached = not_modified_asset()
+        if cached:
+            return cached
+        
+        asset_id = classroom.image_asset_id
+        variant = request.args.get('variant')
+        if variant:
+            # Thumbnail/WebP generated on upload (images.py); the original if missing
+            asset_id = image_variants(asset_id).get(variant, asset_id)
+        return send_asset(asset_id, 'image/jpeg', public=False)
     except Exception as e:
         from flask import abort
         abort(404)
@@ -437,11 +513,13 @@ def upload_excel(classroom_id):
         try:
             filename = secure_filename(excel_file.filename or '')
             
-            # Store file data in database
-            classroom.excel_data = excel_file.read()
-            classroom.excel_mimetype = excel_file.mimetype
+            # Store file data in the asset table
+            old_excel_id = classroom.excel_asset_id
+            classroom.excel_asset_id = store_upload(excel_file, 'excel').id
             classroom.excel_filename = filename
+            release_asset(old_excel_id)
             classroom.updated_at = datetime.utcnow()
+            bump_data_version(classroom.school_id)
             db.session.commit()
             
             flash('Arquivo Excel carregado com sucesso!', 'success')
@@ -469,6 +547,7 @@ def delete_schedule(schedule_id):
     
     try:
         db.session.delete(schedule)
+        bump_data_version(classroom.school_id)
         db.session.commit()
         flash('Horário removido com sucesso!', 'success')
     except Exception as e:
@@ -502,6 +581,7 @@ def add_incident(classroom_id):
         )
         incident.created_at = brazil_time
         db.session.add(incident)
+        bump_data_version(classroom.school_id)
         db.session.commit()
         flash('Ocorrência registrada com sucesso! A administração será notificada.', 'success')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
@@ -527,42 +607,9 @@ def hide_incident_from_classroom(incident_id):
     classroom_id = incident.classroom_id
     
     try:
-        # Check if hidden_from_classroom column exists
-        from sqlalchemy import text
-        column_exists = False
-        try:
-            with db.engine.connect() as conn:
-                if 'postgresql' in str(db.engine.url) or 'postgres' in str(db.engine.url):
-                    result = conn.execute(text("""
-                        SELECT column_name FROM information_schema.columns 
-                        WHERE table_name='incident' AND column_name='hidden_from_classroom'
-                    """))
-                    column_exists = result.fetchone() is not None
-                else:
-                    try:
-                        conn.execute(text("SELECT hidden_from_classroom FROM incident LIMIT 1"))
-                        column_exists = True
-                    except:
-                        column_exists = False
-        except:
-            column_exists = False
-        
-        # Hide incident using raw SQL with column creation if needed
-        with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
-            # Use raw SQL to avoid SQLAlchemy issues
-            conn.execute(text("""
-                UPDATE incident 
-                SET hidden_from_classroom = true 
-                WHERE id = :incident_id
-            """), {'incident_id': incident_id})
-            conn.commit()
+        incident.hidden_from_classroom = True
+        bump_data_version(classroom.school_id)
+        db.session.commit()
             
         flash('Ocorrência removida da visualização da sala!', 'success')
     except Exception as e:
@@ -588,6 +635,7 @@ def delete_incident(incident_id):
     
     try:
         db.session.delete(incident)
+        bump_data_version(classroom.school_id)
         db.session.commit()
         flash('Ocorrência excluída permanentemente!', 'success')
     except Exception as e:
@@ -602,21 +650,14 @@ def delete_incident(incident_id):
 @app.route('/admin/migrate_db')
 @require_admin_auth  
 def migrate_database():
-    """Rota para migrar banco de dados - adicionar colunas faltantes"""
+    """Rota para aplicar manualmente migrações de schema pendentes"""
     try:
-        from sqlalchemy import text
-        with db.engine.connect() as conn:
-            # Adicionar hidden_from_classroom
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-                flash('✅ Migração concluída com sucesso! Coluna hidden_from_classroom adicionada.', 'success')
-            except Exception as e:
-                if 'already exists' in str(e) or 'duplicate' in str(e):
-                    flash('✅ Coluna hidden_from_classroom já existe.', 'info')  
-                else:
-                    flash(f'❌ Erro na migração: {str(e)}', 'error')
-                    
+        from migrations import run_migrations
+        applied = run_migrations()
+        if applied:
+            flash(f'✅ Migrações aplicadas: {", ".join(str(v) for v in applied)}', 'success')
+        else:
+            flash('✅ Banco de dados já está atualizado.', 'info')
     except Exception as e:
         flash(f'❌ Erro na migração: {str(e)}', 'error')
         
@@ -670,13 +711,6 @@ def incidents_management():
         
         # Execute query and convert to incident objects
         with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
             result = conn.execute(text(incident_query), params)
             incident_rows = result.fetchall()
         
@@ -715,13 +749,6 @@ def incidents_management():
         
         # Get counts using safe SQL with COALESCE
         with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
             pending_result = conn.execute(text("""
                 SELECT COUNT(*) FROM incident 
                 JOIN classroom ON incident.classroom_id = classroom.id
@@ -797,6 +824,7 @@ def respond_incident(incident_id):
         if mark_resolved:
             incident.is_resolved = True
         
+        bump_data_version(classroom.school_id)
         db.session.commit()
         
         status_msg = "e marcada como resolvida" if mark_resolved else ""
@@ -824,6 +852,7 @@ def resolve_incident(incident_id):
     try:
         incident.is_resolved = True
         incident.response_date = get_brazil_time().replace(tzinfo=None)
+        bump_data_version(classroom.school_id)
         db.session.commit()
         flash('Ocorrência marcada como resolvida!', 'success')
     except Exception as e:
@@ -835,238 +864,17 @@ def resolve_incident(incident_id):
 @app.route('/incidents_pdf_report')
 @require_admin_auth
 def incidents_pdf_report():
+    """Generate PDF report of incidents with filters (background job, see reports.py)"""
     active_school = get_active_school()
     if not active_school:
         return redirect(url_for('select_school'))
-        
-    """Generate PDF report of incidents with filters"""
-    try:
-        # Get the same filters as incidents_management
-        status_filter = request.args.get('status', '')
-        reporter_filter = request.args.get('reporter', '')
-        classroom_filter = request.args.get('classroom', '')
-        
-        # Use raw SQL for PDF report to avoid column issues
-        from sqlalchemy import text
-        
-        # Use simplified SQL with COALESCE for PDF report
-        where_clause = "WHERE incident.is_active = true AND COALESCE(incident.hidden_from_classroom, FALSE) = FALSE AND classroom.school_id = :school_id"
-        
-        # Add filters
-        filter_conditions = []
-        params = {'school_id': active_school.id}
-        
-        if status_filter == 'pending':
-            filter_conditions.append("is_resolved = false")
-        elif status_filter == 'resolved':
-            filter_conditions.append("is_resolved = true")
-        
-        if reporter_filter:
-            filter_conditions.append("LOWER(reporter_name) LIKE LOWER(:reporter_filter)")
-            params['reporter_filter'] = f'%{reporter_filter}%'
-        
-        if classroom_filter:
-            try:
-                classroom_id = int(classroom_filter)
-                filter_conditions.append("classroom_id = :classroom_id")
-                params['classroom_id'] = classroom_id
-            except ValueError:
-                pass
-        
-        # Complete SQL
-        if filter_conditions:
-            full_sql = f"SELECT incident.id FROM incident JOIN classroom ON incident.classroom_id = classroom.id {where_clause} AND {' AND '.join(filter_conditions)} ORDER BY created_at DESC"
-        else:
-            full_sql = f"SELECT incident.id FROM incident JOIN classroom ON incident.classroom_id = classroom.id {where_clause} ORDER BY created_at DESC"
-        
-        # Get incident data directly to avoid SQLAlchemy issues
-        with db.engine.connect() as conn:
-            # Ensure column exists first
-            try:
-                conn.execute(text("ALTER TABLE incident ADD COLUMN IF NOT EXISTS hidden_from_classroom BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-            except:
-                pass
-                
-            # Get full incident data
-            full_data_sql = f"""
-                SELECT incident.id, incident.classroom_id, incident.reporter_name, incident.reporter_email, incident.description, 
-                       incident.created_at, incident.is_active, incident.is_resolved, incident.admin_response, incident.response_date
-                FROM incident 
-                JOIN classroom ON incident.classroom_id = classroom.id
-                {where_clause}
-            """
-            if filter_conditions:
-                full_data_sql += f" AND {' AND '.join(filter_conditions)}"
-            full_data_sql += " ORDER BY incident.created_at DESC"
-            
-            result = conn.execute(text(full_data_sql), params)
-            incident_data = result.fetchall()
-        
-        # Convert to incident-like objects
-        class IncidentProxy:
-            def __init__(self, row):
-                self.id = row[0]
-                self.classroom_id = row[1]
-                self.reporter_name = row[2]
-                self.reporter_email = row[3]
-                self.description = row[4]
-                self.created_at = row[5]
-                self.is_active = row[6]
-                self.is_resolved = row[7]
-                self.admin_response = row[8]
-                self.response_date = row[9]
-                self.classroom = Classroom.query.get(self.classroom_id)
-        
-        incidents = [IncidentProxy(row) for row in incident_data]
-        
-        # Generate PDF using ReportLab
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        
-        # Create BytesIO buffer
-        buffer = io.BytesIO()
-        
-        # Create the PDF object
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-        
-        # Container for the 'Flowable' objects
-        elements = []
-        
-        # Define styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=16, spaceAfter=30, textColor=colors.HexColor('#1f2937'))
-        subtitle_style = ParagraphStyle('CustomSubtitle', parent=styles['Heading2'], fontSize=12, spaceAfter=20, textColor=colors.HexColor('#374151'))
-        normal_style = styles['Normal']
-        
-        # Add title
-        title = Paragraph(f"Relatório de Ocorrências - {active_school.name}", title_style)
-        elements.append(title)
-        
-        # Add generation date
-        generation_date = f"Gerado em: {get_brazil_time().strftime('%d/%m/%Y às %H:%M')}"
-        date_para = Paragraph(generation_date, normal_style)
-        elements.append(date_para)
-        elements.append(Spacer(1, 12))
-        
-        # Add filter info if any
-        filter_info = []
-        if status_filter:
-            filter_info.append(f"Status: {'Pendentes' if status_filter == 'pending' else 'Resolvidas'}")
-        if reporter_filter:
-            filter_info.append(f"Reportado por: {reporter_filter}")
-        if classroom_filter:
-            classroom = Classroom.query.get(int(classroom_filter))
-            if classroom:
-                filter_info.append(f"Sala: {classroom.name}")
-        
-        if filter_info:
-            filter_text = "Filtros aplicados: " + ", ".join(filter_info)
-            filter_para = Paragraph(filter_text, subtitle_style)
-            elements.append(filter_para)
-            elements.append(Spacer(1, 12))
-        
-        if incidents:
-            # Create table data
-            data = [['ID', 'Sala', 'Reportado por', 'Data', 'Status', 'Descrição']]
-            
-            for incident in incidents:
-                status = 'Resolvida' if incident.is_resolved else 'Pendente'
-                # Truncate description for table
-                description = incident.description[:50] + '...' if len(incident.description) > 50 else incident.description
-                data.append([
-                    f"#{incident.id}",
-                    incident.classroom.name,
-                    incident.reporter_name,
-                    incident.created_at.strftime('%d/%m/%Y') if incident.created_at else '',
-                    status,
-                    description
-                ])
-            
-            # Create table
-            table = Table(data, colWidths=[0.8*inch, 1.5*inch, 1.5*inch, 1*inch, 1*inch, 2.2*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-            
-            elements.append(table)
-            elements.append(Spacer(1, 20))
-            
-            # Add detailed incidents
-            detailed_title = Paragraph("Detalhes das Ocorrências", subtitle_style)
-            elements.append(detailed_title)
-            
-            for incident in incidents:
-                # Incident header
-                incident_header = f"Ocorrência #{incident.id} - {incident.classroom.name}"
-                header_para = Paragraph(incident_header, ParagraphStyle('IncidentHeader', parent=styles['Heading3'], fontSize=11, textColor=colors.HexColor('#1f2937')))
-                elements.append(header_para)
-                
-                # Incident details
-                details = f"""<b>Reportado por:</b> {incident.reporter_name} ({incident.reporter_email})<br/>
-                <b>Data:</b> {incident.created_at.strftime('%d/%m/%Y às %H:%M') if incident.created_at else 'Não informada'}<br/>
-                <b>Status:</b> {'Resolvida' if incident.is_resolved else 'Pendente'}<br/>
-                <b>Descrição:</b> {incident.description}<br/>"""
-                
-                if incident.admin_response:
-                    details += f"<b>Resposta do Admin:</b> {incident.admin_response}<br/>"
-                    if incident.response_date:
-                        details += f"<b>Data da Resposta:</b> {incident.response_date.strftime('%d/%m/%Y às %H:%M')}<br/>"
-                
-                details_para = Paragraph(details, normal_style)
-                elements.append(details_para)
-                elements.append(Spacer(1, 12))
-        else:
-            no_incidents = Paragraph("Nenhuma ocorrência encontrada com os filtros aplicados.", normal_style)
-            elements.append(no_incidents)
-        
-        # Add summary
-        total_incidents = len(incidents)
-        pending_incidents = len([i for i in incidents if not i.is_resolved])
-        resolved_incidents = len([i for i in incidents if i.is_resolved])
-        
-        summary = f"""<b>Resumo:</b><br/>
-        Total de ocorrências: {total_incidents}<br/>
-        Pendentes: {pending_incidents}<br/>
-        Resolvidas: {resolved_incidents}"""
-        
-        summary_para = Paragraph(summary, subtitle_style)
-        elements.append(Spacer(1, 20))
-        elements.append(summary_para)
-        
-        # Build PDF
-        doc.build(elements)
-        
-        # Get the value of the BytesIO buffer and create response
-        pdf_data = buffer.getvalue()
-        buffer.close()
-        
-        timestamp = get_brazil_time().strftime("%Y%m%d_%H%M%S")
-        filename = f'relatorio_ocorrencias_{timestamp}.pdf'
-        
-        response = make_response(pdf_data)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        
-        return response
-        
-    except Exception as e:
-        flash(f'Erro ao gerar relatório PDF: {str(e)}', 'error')
+    if not generate_general_report:
+        flash('Geração de relatórios não está disponível no momento.', 'error')
         return redirect(url_for('incidents_management'))
 
+    # Same filters as incidents_management
+    return start_export_job('incidents_report', {key: request.args.get(key, '') for key in INCIDENTS_REPORT_PARAMS},
+                            'incidents_management')
 
 @app.route('/migrate_uploads_to_db')
 @require_admin_auth
@@ -1083,41 +891,46 @@ def migrate_uploads_to_db():
         
         # Get all classrooms that might have old file references
         classrooms = Classroom.query.all()
+        changed_schools = set()
         
         for classroom in classrooms:
-            # Check if classroom has image_filename but no image_data
-            if classroom.image_filename and not classroom.image_data:
+            # Check if classroom has image_filename but no stored image
+            if classroom.image_filename and not classroom.image_asset_id:
                 old_image_path = os.path.join(uploads_folder, classroom.image_filename)
                 if os.path.exists(old_image_path):
                     try:
                         with open(old_image_path, 'rb') as f:
-                            classroom.image_data = f.read()
                             # Determine mimetype from extension
                             ext = classroom.image_filename.lower().split('.')[-1]
                             mime_map = {
                                 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg',
                                 'png': 'image/png', 'gif': 'image/gif'
                             }
-                            classroom.image_mimetype = mime_map.get(ext, 'image/jpeg')
+                            classroom.image_asset_id = store_image(f, mime_map.get(ext, 'image/jpeg'), max_bytes=None).id
                             migrated_count += 1
+                            changed_schools.add(classroom.school_id)
                     except Exception as e:
                         import logging
                         logging.error(f"Erro ao migrar imagem {classroom.image_filename}: {e}")
             
-            # Check if classroom has excel_filename but no excel_data
+            # Check if classroom has excel_filename but no stored workbook
             # Also check Excel files with any uploads pattern
-            if classroom.excel_filename and not classroom.excel_data:
+            if classroom.excel_filename and not classroom.excel_asset_id:
                 old_excel_path = os.path.join(uploads_folder, classroom.excel_filename)
                 if os.path.exists(old_excel_path):
                     try:
                         with open(old_excel_path, 'rb') as f:
-                            classroom.excel_data = f.read()
-                            classroom.excel_mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                            classroom.excel_asset_id = store_spooled(
+                                spool_upload(f), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                            ).id
                             migrated_count += 1
+                            changed_schools.add(classroom.school_id)
                     except Exception as e:
                         import logging
                         logging.error(f"Erro ao migrar Excel {classroom.excel_filename}: {e}")
         
+        for school_id in changed_schools:
+            bump_data_version(school_id)
         db.session.commit()
         flash(f'Migração concluída! {migrated_count} arquivos movidos para o banco PostgreSQL.', 'success')
         
@@ -1127,6 +940,18 @@ def migrate_uploads_to_db():
     
     return redirect(url_for('dashboard'))
 
+@app.route('/admin/migrate_assets_to_files')
+@require_admin_auth
+def migrate_assets_to_files():
+    """Move every stored file out of the database into the file storage (reverse of migrate_uploads_to_db)"""
+    try:
+        moved_count = move_assets('filesystem')
+        flash(f'Migração concluída! {moved_count} arquivos movidos do banco para o armazenamento em disco.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Erro durante migração: {str(e)}', 'error')
+    return redirect(url_for('dashboard'))
+
 @app.route('/add_classroom', methods=['GET', 'POST'])
 @require_admin_auth
 def add_classroom():
@@ -1136,16 +961,14 @@ def add_classroom():
         
     if request.method == 'POST':
         try:
-            # Handle image upload with PostgreSQL storage
-            image_data = None
-            image_mimetype = None
+            # Handle image upload with asset table storage
+            image_asset_id = None
             image_filename = ''
             if 'image' in request.files:
                 file = request.files['image']
                 if file and file.filename and file.filename != '' and allowed_file(file.filename):
                     filename = secure_filename(file.filename)
-                    image_data = file.read()
-                    image_mimetype = file.mimetype
+                    image_asset_id = store_image(file.stream, file.mimetype).id
                     image_filename = filename
             
             classroom = Classroom(
@@ -1160,12 +983,12 @@ def add_classroom():
                 school_id=active_school.id
             )
             
-            # Set image data after creation
-            if image_data:
-                classroom.image_data = image_data
-                classroom.image_mimetype = image_mimetype
+            # Link image asset after creation
+            if image_asset_id:
+                classroom.image_asset_id = image_asset_id
             
             db.session.add(classroom)
+            bump_data_version(active_school.id)
             db.session.commit()
             
             # Create initial schedules if provided
@@ -1193,19 +1016,27 @@ def add_classroom():
                         except ValueError:
                             pass
                     
-                    for day in initial_days:
+                    initial_start_time = request.form.get('initial_start_time', '')
+                    initial_end_time = request.form.get('initial_end_time', '')
+                    slots = [Slot(classroom.id, int(day), initial_shift, initial_start_time, initial_end_time,
+                                  initial_start_date, initial_end_date) for day in initial_days]
+                    # A new room has no schedules yet; the index still drops repeated days
+                    accepted = [slot for slot, found in ConflictIndex().check(slots, accept=True) if not found]
+                    for slot in accepted:
                         schedule = Schedule(
                             classroom_id=classroom.id,
-                            day_of_week=int(day),
+                            day_of_week=slot.day_of_week,
                             shift=initial_shift,
                             course_name=request.form.get('initial_course', ''),
                             instructor=request.form.get('initial_instructor', ''),
-                            start_time=request.form.get('initial_start_time', ''),
-                            end_time=request.form.get('initial_end_time', ''),
+                            start_time=initial_start_time,
+                            end_time=initial_end_time,
                             start_date=initial_start_date,
                             end_date=initial_end_date
                         )
                         db.session.add(schedule)
+                    initial_days = accepted
+                    bump_data_version(active_school.id)
                     db.session.commit()
                     
                     # Enhanced success message with date info
@@ -1338,7 +1169,7 @@ def add_schedule():
                 flash('Data de fim inválida.', 'error')
                 return redirect(url_for('schedule_management'))
         
-        print(f"DEBUG: Adding schedule - classroom_id: {classroom_id}, days: {days}, shift: {shift}")
+        logging.debug(f"Adding schedule - classroom_id: {classroom_id}, days: {days}, shift: {shift}")
         
         created_count = 0
         existing_count = 0
@@ -1347,37 +1178,20 @@ def add_schedule():
             flash('Nenhum dia foi selecionado!', 'error')
             return redirect(url_for('schedule_management'))
         
-        for day in days:
-            day_int = int(day)
-            
-            # Check for overlaps taking dates into account
-            existing_schedules = Schedule.query.filter_by(
-                classroom_id=classroom_id,
-                day_of_week=day_int,
-                shift=shift,
-                is_active=True
-            ).all()
-            
-            has_overlap = False
-            for existing in existing_schedules:
-                # If both have dates, check for date range overlap
-                if start_date and end_date and existing.start_date and existing.end_date:
-                    # Overlap if: (StartA <= EndB) and (EndA >= StartB)
-                    if start_date <= existing.end_date and end_date >= existing.start_date:
-                        has_overlap = True
-                        break
-                # If one has no dates (permanent) and the other does, it's an overlap
-                elif (not start_date or not end_date) or (not existing.start_date or not existing.end_date):
-                    has_overlap = True
-                    break
-            
-            print(f"DEBUG: Day {day_int}, has_overlap: {has_overlap}")
-            
-            if not has_overlap:
+        # Check every selected day against the room's schedules in one pass
+        # (date range x weekday x time window; fullday overlaps morning/afternoon)
+        slots = [Slot(classroom_id, int(day), shift or '', start_time, end_time, start_date, end_date)
+                 for day in days]
+        conflict_index = ConflictIndex.for_slots(slots)
+        conflict_messages = []
+        
+        for slot, found in conflict_index.check(slots, accept=True):
+            logging.debug(f"Day {slot.day_of_week}, conflicts: {len(found)}")
+            if not found:
                 schedule = Schedule(
                     classroom_id=classroom_id,
-                    day_of_week=day_int,
-                    shift=shift or '',
+                    day_of_week=slot.day_of_week,
+                    shift=slot.shift,
                     course_name=course_name,
                     instructor=instructor,
                     start_time=start_time,
@@ -1387,24 +1201,24 @@ def add_schedule():
                 )
                 db.session.add(schedule)
                 created_count += 1
-                print(f"DEBUG: Created schedule for day {day_int}")
             else:
                 existing_count += 1
-                print(f"DEBUG: Schedule already exists or overlaps for day {day_int}")
+                conflict_messages.append(f"{availability_engine.DAY_NAMES[slot.day_of_week]}: {describe_conflicts(found)}")
         
         if created_count > 0:
+            bump_data_version(classroom.school_id)
             db.session.commit()
             if existing_count > 0:
-                flash(f'{created_count} horários adicionados, {existing_count} já existiam!', 'success')
+                flash(f'{created_count} horários adicionados, {existing_count} em conflito com horários existentes ({"; ".join(conflict_messages)})!', 'success')
             else:
                 flash(f'{created_count} horários adicionados com sucesso!', 'success')
         elif existing_count > 0:
-            flash(f'Todos os {existing_count} horários selecionados já existem!', 'warning')
+            flash(f'Todos os {existing_count} horários selecionados conflitam com horários existentes ({"; ".join(conflict_messages)})!', 'warning')
         else:
             flash('Nenhum horário foi selecionado!', 'error')
         
     except Exception as e:
-        print(f"DEBUG: Error in add_schedule: {str(e)}")
+        logging.error(f"Error in add_schedule: {e}")
         db.session.rollback()
         flash(f'Erro ao adicionar horários: {str(e)}', 'error')
     
@@ -1412,6 +1226,34 @@ def add_schedule():
 
 
 
+@app.route('/import_schedules', methods=['GET', 'POST'])
+@require_admin_auth
+def import_schedules_route():
+    """Bulk schedule import from the export_excel layout (see schedule_import.py)"""
+    active_school = get_active_school()
+    if not active_school:
+        return redirect(url_for('select_school'))
+
+    report = None
+    if request.method == 'POST':
+        schedule_file = request.files.get('schedule_file')
+        if not schedule_file or not schedule_file.filename:
+            flash('Nenhum arquivo selecionado.', 'error')
+            return redirect(url_for('import_schedules_route'))
+        try:
+            upload = spool_upload(schedule_file.stream, UPLOAD_LIMITS['excel'])
+            report = import_schedules(active_school.id, upload.file, schedule_file.filename,
+                                      dry_run=request.form.get('dry_run') == 'on')
+            flash(report.summary(), 'success' if report.ok and not report.conflicts else 'warning')
+        except ValueError as e:
+            # Unreadable file, missing columns or upload too large
+            flash(str(e), 'error')
+        except Exception as e:
+            import logging
+            logging.error(f"Erro ao importar horários: {e}")
+            flash(f'Erro ao importar horários: {str(e)}', 'error')
+    return render_template('import_schedules.html', report=report)
+
 @app.route('/delete_classroom/<int:classroom_id>', methods=['POST'])
 @require_admin_auth
 def delete_classroom(classroom_id):
@@ -1429,8 +1271,12 @@ def delete_classroom(classroom_id):
         Schedule.query.filter_by(classroom_id=classroom_id).delete()
         Incident.query.filter_by(classroom_id=classroom_id).delete()
         
-        # Delete the classroom
+        # Delete the classroom, then drop its references to shared files
+        asset_ids = [classroom.image_asset_id, classroom.excel_asset_id]
         db.session.delete(classroom)
+        for asset_id in asset_ids:
+            release_asset(asset_id)
+        bump_data_version(active_school.id)
         db.session.commit()
         
         flash(f'Sala "{classroom_name}" excluída com sucesso!', 'success')
@@ -1442,173 +1288,39 @@ def delete_classroom(classroom_id):
         return redirect(url_for('edit_classroom', classroom_id=classroom_id))
 
 @app.route('/dashboard')
+@conditional_page(current_day_key)
 def dashboard():
     active_school = get_active_school()
     if not active_school:
         return redirect(url_for('select_school'))
         
     # Get filters
-    block_filter = request.args.get('block', '')
-    instructor_filter = request.args.get('instructor', '')
-    software_filter = request.args.get('software', '')
-    has_computers_filter = request.args.get('has_computers', '')
-    capacity_filter = request.args.get('capacity', '')
-    day_filter = request.args.get('day', '')
-    shift_filter = request.args.get('shift', '')
-    week_filter = request.args.get('week', '')  # New week filter parameter
-    
-    # Build classroom query with filters
-    course_name_filter = request.args.get('course_name', '')
-    
-    classroom_query = Classroom.query.filter_by(school_id=active_school.id)
-    if block_filter:
-        classroom_query = classroom_query.filter(Classroom.block.contains(block_filter))
-    if software_filter:
-        classroom_query = classroom_query.filter(Classroom.software.contains(software_filter))
-    
-    # Filter classrooms by course name if specified
-    if course_name_filter:
-        classroom_ids_with_course = [s.classroom_id for s in Schedule.query.filter(
-            Schedule.course_name.ilike(f'%{course_name_filter}%'),
-            Schedule.is_active == True
-        ).all()]
-        classroom_query = classroom_query.filter(Classroom.id.in_(classroom_ids_with_course))
-
-    if has_computers_filter:
-        has_computers_bool = has_computers_filter.lower() == 'true'
-        classroom_query = classroom_query.filter(Classroom.has_computers == has_computers_bool)
-    if capacity_filter:
-        capacity_ranges = {
-            'small': (0, 20),
-            'medium': (21, 35),
-            'large': (36, 100)
-        }
-        if capacity_filter in capacity_ranges:
-            min_cap, max_cap = capacity_ranges[capacity_filter]
-            classroom_query = classroom_query.filter(
-                Classroom.capacity >= min_cap,
-                Classroom.capacity <= max_cap
-            )
-    
-    classrooms = classroom_query.all()
-    
-    # Build schedule query with filters - ONLY SHOW ACTIVE/CURRENT COURSES
-    current_date = get_brazil_time().date()
-    
-    # Calculate week dates for filtering
-    if week_filter:
-        try:
-            # Parse the week filter date (format: YYYY-MM-DD)
-            week_start_date = datetime.strptime(week_filter, '%Y-%m-%d').date()
-            # Get Monday of that week
-            days_since_monday = week_start_date.weekday()
-            week_monday = week_start_date - timedelta(days=days_since_monday)
-            week_sunday = week_monday + timedelta(days=6)
-        except (ValueError, TypeError):
-            # If invalid date, use current week
-            days_since_monday = current_date.weekday()
-            week_monday = current_date - timedelta(days=days_since_monday)
-            week_sunday = week_monday + timedelta(days=6)
-    else:
-        # Default to current week
-        days_since_monday = current_date.weekday()
-        week_monday = current_date - timedelta(days=days_since_monday)
-        week_sunday = week_monday + timedelta(days=6)
-    
-    schedule_query = Schedule.query.join(Classroom).filter(
-        Classroom.school_id == active_school.id,
-        Schedule.is_active == True
-    )
-    
-    # Filter out expired courses - only show courses that haven't ended yet OR courses running in the selected week
-    if week_filter:
-        # For week filter, show courses that are active during the selected week
-        schedule_query = schedule_query.filter(
-            db.and_(
-                db.or_(
-                    Schedule.start_date.is_(None),  # No start date specified
-                    Schedule.start_date <= week_sunday  # Course started before or during the week
-                ),
-                db.or_(
-                    Schedule.end_date == None,  # No end date specified
-                    Schedule.end_date >= week_monday  # Course ends after or during the week
-                )
-            )
-        )
-    else:
-        # For normal view, only show courses that haven't ended yet
-        schedule_query = schedule_query.filter(
-            db.or_(
-                Schedule.end_date == None,  # No end date specified
-                Schedule.end_date >= current_date  # Course hasn't ended yet
-            )
-        )
-    
-    if day_filter:
-        schedule_query = schedule_query.filter(Schedule.day_of_week == int(day_filter))
-    if shift_filter:
-        schedule_query = schedule_query.filter(Schedule.shift == shift_filter)
-    if instructor_filter:
-        schedule_query = schedule_query.filter(Schedule.instructor.ilike(f'%{instructor_filter}%'))
-    
-    schedules = schedule_query.all()
-    print(f"DEBUG: Dashboard showing {len(schedules)} active/current schedules (expired courses hidden)")
-    
-    # Filter classrooms by instructor if specified
-    if instructor_filter:
-        classroom_ids_with_instructor = set(s.classroom_id for s in schedules)
-        classroom_query = classroom_query.filter(Classroom.id.in_(classroom_ids_with_instructor))
-    
-    # Organize schedules by classroom and day
-    schedule_map = {}
-    for schedule in schedules:
-        if schedule.classroom_id not in schedule_map:
-            schedule_map[schedule.classroom_id] = {}
-        if schedule.day_of_week not in schedule_map[schedule.classroom_id]:
-            schedule_map[schedule.classroom_id][schedule.day_of_week] = {}
-        schedule_map[schedule.classroom_id][schedule.day_of_week][schedule.shift] = schedule
+    current_filters = {
+        'block': request.args.get('block', ''),
+        'instructor': request.args.get('instructor', ''),
+        'software': request.args.get('software', ''),
+        'has_computers': request.args.get('has_computers', ''),
+        'capacity': request.args.get('capacity', ''),
+        'day': request.args.get('day', ''),
+        'shift': request.args.get('shift', ''),
+        'week': request.args.get('week', ''),  # New week filter parameter
+        'course_name': request.args.get('course_name', '')
+    }
     
-    # Calculate statistics
-    total_slots = len(classrooms) * 23  # 6 days * 4 shifts - 1 (no Saturday night)
-    occupied_slots = len([s for s in schedules if s.classroom_id in [c.id for c in classrooms]])
-    free_slots = total_slots - occupied_slots
-    occupancy_rate = (occupied_slots / total_slots * 100) if total_slots > 0 else 0
-    
-    # Get unique filter options
-    all_classrooms = Classroom.query.filter_by(school_id=active_school.id).all()
-    blocks = sorted(list(set(c.block for c in all_classrooms if c.block)))
-    all_schedules = Schedule.query.join(Classroom).filter(
-        Classroom.school_id == active_school.id,
-        Schedule.is_active == True
-    ).all()
-    instructors = sorted(list(set(s.instructor for s in all_schedules if s.instructor and s.instructor.strip())))
-    software_list = sorted(list(set(software.strip() for c in all_classrooms if c.software for software in c.software.split(',') if software.strip())))
+    # Rooms, schedule grid, occupancy counts and filter options - ONLY ACTIVE/CURRENT COURSES
+    data = dashboard_service.get_dashboard_data(active_school.id, get_brazil_time().date(), **current_filters)
     
     return render_template('dashboard.html', 
-                         classrooms=classrooms, 
-                         schedule_map=schedule_map,
-                         free_slots=free_slots,
-                         occupied_slots=occupied_slots,
-                         occupancy_rate=occupancy_rate,
-                         blocks=blocks,
-                         instructors=instructors,
-                         software_list=software_list,
-                         current_filters={
-                             'block': block_filter,
-                             'instructor': instructor_filter,
-                             'software': software_filter,
-                             'has_computers': has_computers_filter,
-                             'capacity': capacity_filter,
-                             'day': day_filter,
-                             'shift': shift_filter,
-                             'week': week_filter,
-                             'course_name': course_name_filter
-                         },
-                         week_dates={
-                             'monday': week_monday,
-                             'sunday': week_sunday,
-                             'formatted': f"{week_monday.strftime('%d/%m')} - {week_sunday.strftime('%d/%m/%Y')}"
-                         })
+                         classrooms=data['classrooms'], 
+                         schedule_map=data['schedule_map'],
+                         free_slots=data['free_slots'],
+                         occupied_slots=data['occupied_slots'],
+                         occupancy_rate=data['occupancy_rate'],
+                         blocks=data['blocks'],
+                         instructors=data['instructors'],
+                         software_list=data['software_list'],
+                         current_filters=current_filters,
+                         week_dates=data['week_dates'])
 
 @app.route('/availability')
 def availability():
@@ -1630,279 +1342,19 @@ def get_brazil_time():
 
 def get_current_shift():
     """Get the current shift based on Brazil time"""
-    now = get_brazil_time()
-    current_hour = now.hour
-    current_minute = now.minute
-    current_time_minutes = current_hour * 60 + current_minute
-    
-    # Use real current time
-    # current_hour = 14  # FOR TESTING only
-    # current_minute = 30
-    # current_time_minutes = current_hour * 60 + current_minute
-    
-    print(f"DEBUG: Current time: {current_hour}:{current_minute:02d} ({current_time_minutes} minutes)")
-    
-    # Define shift time ranges in minutes
-    # Morning: 7:30-12:00 (450-720 minutes)
-    # Afternoon: 13:00-18:00 (780-1080 minutes)  
-    # Night: 18:30-22:30 (1110-1350 minutes)
-    # Fullday: 8:00-17:00 (480-1020 minutes) - as per schedule data
-    
-    current_shifts = []
-    
-    if 450 <= current_time_minutes <= 720:  # Morning
-        current_shifts.append('morning')
-        print(f"DEBUG: Added morning shift")
-    if 780 <= current_time_minutes <= 1080:  # Afternoon
-        current_shifts.append('afternoon')
-        print(f"DEBUG: Added afternoon shift")
-    if 1110 <= current_time_minutes <= 1350:  # Night
-        current_shifts.append('night')
-        print(f"DEBUG: Added night shift")
-    # Fullday: check if within fullday hours (8:00-17:00)
-    if 480 <= current_time_minutes <= 1020:  # Fullday
-        current_shifts.append('fullday')
-        print(f"DEBUG: Added fullday shift")
-        
-    print(f"DEBUG: Current active shifts: {current_shifts}")
-    return current_shifts
+    return availability_engine.current_shifts(get_brazil_time())
 
 def get_availability_for_date(target_date=None, shift_filter=None, school_id=None):
     """Helper function to get room availability for a specific date and optional shift"""
+    now = get_brazil_time()
     if target_date is None:
-        target_date = get_brazil_time()
-    
-    # Get day of week (0=Monday, 6=Sunday)
-    target_day = target_date.weekday()
-    target_date_only = target_date.date()
-    
-    if school_id:
-        classrooms = Classroom.query.filter_by(school_id=school_id).all()
-    else:
-        # Fallback to all if no school_id provided (though we should avoid this)
-        classrooms = Classroom.query.all()
-    
-    print(f"DEBUG: Checking availability for date: {target_date_only}, day of week: {target_day}")
-    
-    # Check if it's Sunday
-    if target_day == 6:  # Sunday
-        return {
-            'available_rooms': classrooms,
-            'occupied_rooms': [],
-            'period_description': "Domingo - Escola fechada",
-            'total_rooms': len(classrooms)
-        }
-    
-    # If no shift filter is provided and we're checking current time, get current shifts
-    if shift_filter is None or shift_filter == 'all':
-        # If checking current date, determine the primary current shift
-        if target_date.date() == get_brazil_time().date():
-            current_shifts = get_current_shift()
-            print(f"DEBUG: Checking current date, active shifts: {current_shifts}")
-            
-            if not current_shifts:  # Outside operating hours
-                return {
-                    'available_rooms': classrooms,
-                    'occupied_rooms': [],
-                    'period_description': "Fora do horário de funcionamento",
-                    'total_rooms': len(classrooms)
-                }
-            
-            # Determine which shift to check based on current time
-            # Priority: specific shifts (morning, afternoon, night) over fullday
-            primary_shift = None
-            
-            # Check for specific time-based shifts first
-            if 'morning' in current_shifts:
-                primary_shift = 'morning'
-            elif 'afternoon' in current_shifts:
-                primary_shift = 'afternoon'
-            elif 'night' in current_shifts:
-                primary_shift = 'night'
-            elif 'fullday' in current_shifts:
-                primary_shift = 'fullday'
-            
-            occupied_schedules = []
-            
-            if primary_shift:
-                # Get schedules for the primary shift only - PRECISE DATE CHECKING
-                all_schedules = Schedule.query.join(Classroom).filter(
-                    Classroom.school_id == school_id,
-                    Schedule.day_of_week == target_day,
-                    Schedule.shift == primary_shift,
-                    Schedule.is_active == True
-                ).all() if school_id else Schedule.query.filter_by(
-                    day_of_week=target_day,
-                    shift=primary_shift,
-                    is_active=True
-                ).all()
-                
-                # Filter by actual course dates
-                active_schedules = []
-                for schedule in all_schedules:
-                    if schedule.start_date and schedule.end_date:
-                        if schedule.start_date <= target_date_only <= schedule.end_date:
-                            active_schedules.append(schedule)
-                            print(f"DEBUG: Schedule {schedule.id} ({schedule.shift}) is ACTIVE (course runs {schedule.start_date} to {schedule.end_date})")
-                        else:
-                            print(f"DEBUG: Schedule {schedule.id} ({schedule.shift}) is EXPIRED/FUTURE (course runs {schedule.start_date} to {schedule.end_date}, today is {target_date_only})")
-                    else:
-                        # If no dates specified, consider it active (backward compatibility)
-                        active_schedules.append(schedule)
-                        print(f"DEBUG: Schedule {schedule.id} ({schedule.shift}) has no date restrictions, treating as active")
-                
-                occupied_schedules.extend(active_schedules)
-                print(f"DEBUG: Using primary shift '{primary_shift}', found {len(active_schedules)} ACTIVE schedules out of {len(all_schedules)} total")
-                
-                # CRITICAL LOGIC: Only add fullday schedules if we're checking for CURRENT time
-                # This prevents fullday classes from appearing when user filters by specific shift
-                if primary_shift in ['morning', 'afternoon'] and target_date.date() == get_brazil_time().date():
-                    all_fullday_schedules = Schedule.query.join(Classroom).filter(
-                        Classroom.school_id == school_id,
-                        Schedule.day_of_week == target_day,
-                        Schedule.shift == 'fullday',
-                        Schedule.is_active == True
-                    ).all() if school_id else Schedule.query.filter_by(
-                        day_of_week=target_day,
-                        shift='fullday',
-                        is_active=True
-                    ).all()
-                    
-                    active_fullday_schedules = []
-                    for schedule in all_fullday_schedules:
-                        if schedule.start_date and schedule.end_date:
-                            if schedule.start_date <= target_date_only <= schedule.end_date:
-                                active_fullday_schedules.append(schedule)
-                                print(f"DEBUG: Fullday schedule {schedule.id} is ACTIVE (overlaps with current {primary_shift} shift)")
-                            else:
-                                print(f"DEBUG: Fullday schedule {schedule.id} is EXPIRED/FUTURE")
-                        else:
-                            active_fullday_schedules.append(schedule)
-                    
-                    occupied_schedules.extend(active_fullday_schedules)
-                    print(f"DEBUG: Added {len(active_fullday_schedules)} ACTIVE fullday schedules for CURRENT TIME overlap")
-                else:
-                    print(f"DEBUG: Skipping fullday overlap - not checking current time or not morning/afternoon shift")
-        else:
-            # For other dates (future/past), check ALL shifts to get complete availability picture
-            print(f"DEBUG: Checking NON-CURRENT date {target_date_only} - checking ALL shifts for complete availability")
-            all_schedules = Schedule.query.join(Classroom).filter(
-                Classroom.school_id == school_id,
-                Schedule.day_of_week == target_day,
-                Schedule.is_active == True
-            ).all() if school_id else Schedule.query.filter_by(day_of_week=target_day, is_active=True).all()
-            
-            active_schedules = []
-            for schedule in all_schedules:
-                if schedule.start_date and schedule.end_date:
-                    if schedule.start_date <= target_date_only <= schedule.end_date:
-                        active_schedules.append(schedule)
-                        print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is ACTIVE on {target_date_only}")
-                    else:
-                        print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is EXPIRED/FUTURE on {target_date_only}")
-                else:
-                    active_schedules.append(schedule)
-                    print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) has no date restrictions, treating as active")
-            
-            occupied_schedules = active_schedules
-            print(f"DEBUG: Future/past date check - found {len(active_schedules)} ACTIVE schedules out of {len(all_schedules)} total")
-    else:
-        # Apply specific shift filter - ULTRA PRECISE: ONLY show rooms occupied by EXACTLY that shift
-        print(f"DEBUG: PRECISE FILTER MODE - Looking for shift '{shift_filter}' on {target_date_only}")
-        
-        # Get schedules that EXACTLY match the requested shift
-        all_schedules = Schedule.query.join(Classroom).filter(
-            Classroom.school_id == school_id,
-            Schedule.day_of_week == target_day,
-            Schedule.shift == shift_filter,
-            Schedule.is_active == True
-        ).all() if school_id else Schedule.query.filter_by(
-            day_of_week=target_day,
-            shift=shift_filter,
-            is_active=True
-        ).all()
-        
-        active_schedules = []
-        for schedule in all_schedules:
-            if schedule.start_date and schedule.end_date:
-                if schedule.start_date <= target_date_only <= schedule.end_date:
-                    active_schedules.append(schedule)
-                    print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is ACTIVE with exact shift filter '{shift_filter}'")
-                else:
-                    print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) is EXPIRED/FUTURE with shift filter")
-            else:
-                active_schedules.append(schedule)
-                print(f"DEBUG: Schedule {schedule.id} ({schedule.shift} - {schedule.course_name}) has no date restrictions, treating as active for shift filter")
-        
-        occupied_schedules = active_schedules
-        
-        # CRITICAL: For specific shift filters, we need to consider fullday classes as conflicts too
-        # BUT only when the user is NOT specifically looking for fullday
-        if shift_filter != 'fullday':
-            print(f"DEBUG: Checking if any fullday classes conflict with '{shift_filter}' filter")
-            
-            # Get fullday schedules for this day
-            all_fullday_schedules = Schedule.query.join(Classroom).filter(
-                Classroom.school_id == school_id,
-                Schedule.day_of_week == target_day,
-                Schedule.shift == 'fullday',
-                Schedule.is_active == True
-            ).all() if school_id else Schedule.query.filter_by(
-                day_of_week=target_day,
-                shift='fullday',
-                is_active=True
-            ).all()
-            
-            active_fullday_schedules = []
-            for schedule in all_fullday_schedules:
-                if schedule.start_date and schedule.end_date:
-                    if schedule.start_date <= target_date_only <= schedule.end_date:
-                        active_fullday_schedules.append(schedule)
-                        print(f"DEBUG: Fullday schedule {schedule.id} ({schedule.course_name}) CONFLICTS with '{shift_filter}' filter")
-                    else:
-                        print(f"DEBUG: Fullday schedule {schedule.id} ({schedule.course_name}) is EXPIRED/FUTURE, no conflict")
-                else:
-                    active_fullday_schedules.append(schedule)
-                    print(f"DEBUG: Fullday schedule {schedule.id} ({schedule.course_name}) has no date restrictions, treating as conflict")
-            
-            occupied_schedules.extend(active_fullday_schedules)
-            print(f"DEBUG: Added {len(active_fullday_schedules)} conflicting fullday schedules to '{shift_filter}' filter")
-        
-        print(f"DEBUG: EXACT SHIFT FILTER '{shift_filter}' - found {len(active_schedules)} exact matches + {len(occupied_schedules) - len(active_schedules)} conflicting schedules")
-    
-    occupied_classroom_ids = set(schedule.classroom_id for schedule in occupied_schedules)
-    
-    available_rooms = [room for room in classrooms if room.id not in occupied_classroom_ids]
-    occupied_rooms = [room for room in classrooms if room.id in occupied_classroom_ids]
-    
-    # Build period description
-    days = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-    day_name = days[target_day]
-    
-    if shift_filter and shift_filter != 'all':
-        shift_names = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
-        period_description = f"{day_name} - {shift_names.get(shift_filter, shift_filter)} (Filtro Específico)"
-    elif target_date.date() == get_brazil_time().date() and (shift_filter is None or shift_filter == 'all'):
-        # Show current period
-        current_shifts = get_current_shift()
-        if current_shifts:
-            shift_names = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
-            active_shift_names = [shift_names.get(shift, shift) for shift in current_shifts]
-            period_description = f"{day_name} - {', '.join(set(active_shift_names))} (Agora)"
-        else:
-            period_description = f"{day_name} - Fora do horário"
-    else:
-        period_description = f"{day_name} - Todos os turnos"
-    
-    return {
-        'available_rooms': available_rooms,
-        'occupied_rooms': occupied_rooms,
-        'occupied_schedules': occupied_schedules,
-        'period_description': period_description,
-        'total_rooms': len(classrooms)
-    }
+        target_date = now
+    if shift_filter == 'all':
+        shift_filter = None
+    return availability_engine.get_availability(school_id, target_date.date(), shift_filter, now=now)
 
 @app.route('/available_now')
+@conditional_page(current_period_key)
 def available_now():
     active_school = get_active_school()
     if not active_school:
@@ -1923,6 +1375,10 @@ def available_now():
     
     # Get availability data
     availability_data = get_availability_for_date(target_date, shift_param, school_id=active_school.id)
+    image_ids = ([room.image_asset_id for room in availability_data['available_rooms']] +
+                 [room.image_asset_id for room in availability_data.get('occupied_rooms', [])])
+    prime_asset_versions(image_ids)
+    prime_image_variants(image_ids)
     
     # Format date for display
     formatted_date = target_date.strftime('%d/%m/%Y')
@@ -1931,12 +1387,145 @@ def available_now():
                          available_rooms=availability_data['available_rooms'],
                          occupied_rooms=availability_data.get('occupied_rooms', []),
                          occupied_schedules=availability_data.get('occupied_schedules', []),
+                         occupied_schedule_map=availability_data.get('occupied_schedule_map', {}),
                          current_period=availability_data['period_description'],
                          total_rooms=availability_data['total_rooms'],
                          selected_date=formatted_date,
                          selected_date_iso=target_date.strftime('%Y-%m-%d'),
                          selected_shift=shift_param)
 
+@app.route('/api/availability')
+def availability_range_api():
+    """Rooms x dates x shifts occupancy for a date range (default: current week).
+
+    Query params: start, end (YYYY-MM-DD), shift (optional), classroom_id (optional).
+    """
+    classroom_id = request.args.get('classroom_id', type=int)
+    if classroom_id:
+        classroom = Classroom.query.get_or_404(classroom_id)
+        school_id = classroom.school_id
+    else:
+        active_school = get_active_school()
+        if not active_school:
+            return jsonify({'error': 'Nenhuma escola selecionada'}), 400
+        school_id = active_school.id
+
+    today = get_brazil_time().date()
+    try:
+        start_param = request.args.get('start')
+        end_param = request.args.get('end')
+        start_date = datetime.strptime(start_param, '%Y-%m-%d').date() if start_param else today - timedelta(days=today.weekday())
+        end_date = datetime.strptime(end_param, '%Y-%m-%d').date() if end_param else start_date + timedelta(days=6)
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+
+    shift = request.args.get('shift', '')
+    if shift and shift not in availability_engine.SHIFTS:
+        return jsonify({'error': 'Turno inválido'}), 400
+
+    try:
+        range_data = availability_engine.load_range_availability(school_id, start_date, end_date, classroom_id=classroom_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(range_data.to_dict([shift] if shift else None))
+
+def parse_room_search_args(args):
+    """Room finder filters from the query string. Raises ValueError on bad input."""
+    date_param = args.get('date', '').strip()
+    target_date = datetime.strptime(date_param, '%Y-%m-%d').date() if date_param else get_brazil_time().date()
+
+    shift = args.get('shift', '').strip()
+    if shift == 'all':
+        shift = ''
+    if shift and shift not in availability_engine.SHIFTS:
+        raise ValueError('Turno inválido')
+
+    capacity_param = args.get('min_capacity', '').strip()
+    min_capacity = int(capacity_param) if capacity_param else None
+
+    computers_param = args.get('has_computers', '').strip().lower()
+    has_computers = {'true': True, 'false': False}.get(computers_param)
+
+    software = [term.strip() for term in args.get('software', '').split(',') if term.strip()]
+
+    return {
+        'target_date': target_date,
+        'shift': shift or None,
+        'min_capacity': min_capacity,
+        'has_computers': has_computers,
+        'software': software,
+        'block': args.get('block', '').strip() or None,
+    }
+
+@app.route('/api/facets')
+def facets_api():
+    """Filter options (blocks, instructors, courses, software) of the active school"""
+    active_school = get_active_school()
+    if not active_school:
+        return jsonify({'error': 'Nenhuma escola selecionada'}), 400
+    return jsonify(get_facets(active_school.id))
+
+@app.route('/api/rooms/find')
+def find_rooms_api():
+    """Free rooms matching capacity/computers/software/block on a date and shift"""
+    active_school = get_active_school()
+    if not active_school:
+        return jsonify({'error': 'Nenhuma escola selecionada'}), 400
+    try:
+        filters = parse_room_search_args(request.args)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos: use date=AAAA-MM-DD, min_capacity numérico e um turno válido'}), 400
+
+    result = room_finder.find_rooms(active_school.id, now=get_brazil_time(), **filters)
+    min_capacity = filters['min_capacity'] or 0
+    return jsonify({
+        'date': filters['target_date'].isoformat(),
+        'shift': filters['shift'] or 'all',
+        'period_description': result['period_description'],
+        'closed': result['closed'],
+        'matching_rooms': result['matching_rooms'],
+        'total_rooms': result['total_rooms'],
+        'rooms': [{
+            'id': room.id,
+            'name': room.name,
+            'block': room.block,
+            'capacity': room.capacity,
+            'spare_seats': (room.capacity or 0) - min_capacity,
+            'has_computers': room.has_computers,
+            'software': room.software,
+            'url': url_for('classroom_detail', classroom_id=room.id),
+        } for room in result['rooms']]
+    })
+
+@app.route('/find_room')
+def find_room():
+    active_school = get_active_school()
+    if not active_school:
+        return redirect(url_for('select_school'))
+    try:
+        filters = parse_room_search_args(request.args)
+    except ValueError:
+        flash('Filtros inválidos. Verifique a data, o turno e a capacidade.', 'error')
+        return redirect(url_for('find_room'))
+
+    searched = any(request.args.get(key) for key in ('shift', 'min_capacity', 'has_computers', 'software', 'block', 'date'))
+    result = room_finder.find_rooms(active_school.id, now=get_brazil_time(), **filters) if searched else None
+    software_list = sorted(room_finder.get_room_index(active_school.id).software_names.values(), key=str.lower)
+
+    return render_template('find_room.html',
+                         result=result,
+                         filters=filters,
+                         software_list=software_list,
+                         current_filters={
+                             'date': filters['target_date'].strftime('%Y-%m-%d'),
+                             'shift': filters['shift'] or 'all',
+                             'min_capacity': request.args.get('min_capacity', ''),
+                             'has_computers': request.args.get('has_computers', ''),
+                             'software': request.args.get('software', ''),
+                             'block': request.args.get('block', ''),
+                         })
+
 @app.route('/generate_pdf/<int:classroom_id>')
 def generate_pdf(classroom_id):
     if not generate_classroom_pdf:
@@ -1949,13 +1538,12 @@ def generate_pdf(classroom_id):
         flash('Acesso negado: esta sala não pertence à escola ativa.', 'error')
         return redirect(url_for('index'))
         
-    schedules = Schedule.query.filter_by(classroom_id=classroom_id, is_active=True).all()
-    
     try:
-        pdf_buffer = generate_classroom_pdf(classroom, schedules, school_name=active_school.name)
+        # Built once per school data version (see reports.pdf_cache)
+        pdf_data = classroom_pdf(classroom, active_school.name)
         
         return send_file(
-            io.BytesIO(pdf_buffer.getvalue()),
+            io.BytesIO(pdf_data),
             mimetype='application/pdf',
             as_attachment=True,
             download_name=f'sala_{classroom.name.replace(" ", "_")}.pdf'
@@ -1964,6 +1552,18 @@ def generate_pdf(classroom_id):
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
 
+@app.route('/classroom_pdfs')
+@require_admin_auth
+def export_classroom_pdfs():
+    """Room sheets of every classroom in one ZIP (background job, see classroom_pdfs.py)"""
+    active_school = get_active_school()
+    if not active_school:
+        return redirect(url_for('select_school'))
+    if not generate_classroom_pdf:
+        flash('Geração de PDF não está disponível no momento.', 'error')
+        return redirect(url_for('dashboard'))
+    return start_export_job('classroom_pdfs', {}, 'dashboard')
+
 @app.route('/generate_general_report')
 def generate_general_report_route():
     if not generate_general_report:
@@ -1973,25 +1573,7 @@ def generate_general_report_route():
     active_school = get_active_school()
     if not active_school:
         return redirect(url_for('select_school'))
-        
-    try:
-        classrooms = Classroom.query.filter_by(school_id=active_school.id).all()
-        schedules = Schedule.query.join(Classroom).filter(
-            Classroom.school_id == active_school.id,
-            Schedule.is_active == True
-        ).all()
-        
-        pdf_buffer = generate_general_report(classrooms, schedules, school_name=active_school.name)
-        
-        return send_file(
-            io.BytesIO(pdf_buffer.getvalue()),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name='relatorio_geral.pdf'
-        )
-    except Exception as e:
-        flash(f'Erro ao gerar relatório: {str(e)}', 'error')
-        return redirect(url_for('dashboard'))
+    return start_export_job('general_report', {}, 'dashboard')
 
 @app.route('/generate_availability_report')
 def generate_availability_report_route():
@@ -2002,25 +1584,7 @@ def generate_availability_report_route():
     active_school = get_active_school()
     if not active_school:
         return redirect(url_for('select_school'))
-        
-    try:
-        classrooms = Classroom.query.filter_by(school_id=active_school.id).all()
-        schedules = Schedule.query.join(Classroom).filter(
-            Classroom.school_id == active_school.id,
-            Schedule.is_active == True
-        ).all()
-        
-        pdf_buffer = generate_availability_report(classrooms, schedules, school_name=active_school.name)
-        
-        return send_file(
-            io.BytesIO(pdf_buffer.getvalue()),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name='relatorio_disponibilidade.pdf'
-        )
-    except Exception as e:
-        flash(f'Erro ao gerar relatório: {str(e)}', 'error')
-        return redirect(url_for('dashboard'))
+    return start_export_job('availability_report', {}, 'dashboard')
 
 @app.route('/generate_qr/<int:classroom_id>')
 def generate_qr(classroom_id):
@@ -2050,180 +1614,17 @@ def generate_qr(classroom_id):
         flash(f'Erro ao gerar QR code: {str(e)}', 'error')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
 
-# Exportação para Excel - versão corrigida
+# Exportação para Excel (ver exports.py)
 @app.route('/export_excel')
 @require_admin_auth
 def export_excel():
     active_school = get_active_school()
     if not active_school:
         return redirect(url_for('select_school'))
-    try:
-        # Check if openpyxl is available
-        if not openpyxl:
-            flash('Funcionalidade de Excel não está disponível no momento.', 'error')
-            return redirect(url_for('dashboard'))
-            
-        # Create workbook and worksheet
-        wb = openpyxl.Workbook()
-        
-        # Sheet 1: Classrooms
-        ws1 = wb.active
-        ws1.title = "Salas de Aula"
-        
-        # Import openpyxl styles if available
-        try:
-            from openpyxl.styles import Font, PatternFill, Alignment
-        except ImportError:
-            Font = PatternFill = Alignment = None
-        
-        # Headers for classrooms
-        headers1 = ['ID', 'Nome', 'Capacidade', 'Bloco', 'Tem Computadores', 'Softwares', 'Descrição']
-        for col, header in enumerate(headers1, 1):
-            cell = ws1.cell(row=1, column=col)
-            if cell:
-                cell.value = header
-                if Font:
-                    cell.font = Font(bold=True, color='FFFFFF')
-                if PatternFill:
-                    cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-                if Alignment:
-                    cell.alignment = Alignment(horizontal='center')
-        
-        # Data for classrooms
-        classrooms = Classroom.query.filter_by(school_id=active_school.id).all()
-        for row, classroom in enumerate(classrooms, 2):
-            ws1.cell(row=row, column=1).value = classroom.id
-            ws1.cell(row=row, column=2).value = classroom.name
-            ws1.cell(row=row, column=3).value = classroom.capacity
-            ws1.cell(row=row, column=4).value = classroom.block
-            ws1.cell(row=row, column=5).value = 'Sim' if classroom.has_computers else 'Não'
-            ws1.cell(row=row, column=6).value = classroom.software
-            ws1.cell(row=row, column=7).value = classroom.description
-        
-        # Auto-fit columns with safer approach
-        try:
-            for column_cells in ws1.columns:
-                if column_cells and len(column_cells) > 0:
-                    max_length = 0
-                    column_letter = column_cells[0].column_letter
-                    for cell in column_cells:
-                        try:
-                            if cell and cell.value and len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    if ws1.column_dimensions and column_letter:
-                        ws1.column_dimensions[column_letter].width = adjusted_width
-        except Exception:
-            pass  # Skip column sizing if there are issues
-        
-        # Sheet 2: Schedules
-        ws2 = wb.create_sheet(title="Horários")
-        
-        # Headers for schedules
-        headers2 = ['ID', 'Sala', 'Dia da Semana', 'Turno', 'Curso', 'Professor', 'Início', 'Fim', 'Ativo']
-        for col, header in enumerate(headers2, 1):
-            cell = ws2.cell(row=1, column=col)
-            if cell:
-                cell.value = header
-                if Font:
-                    cell.font = Font(bold=True, color='FFFFFF')
-                if PatternFill:
-                    cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-                if Alignment:
-                    cell.alignment = Alignment(horizontal='center')
-        
-        # Data for schedules
-        schedules = Schedule.query.join(Classroom).filter(Classroom.school_id == active_school.id).all()
-        days = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-        shifts = {'morning': 'Manhã', 'afternoon': 'Tarde', 'fullday': 'Integral', 'night': 'Noite'}
-        
-        for row, schedule in enumerate(schedules, 2):
-            classroom = Classroom.query.get(schedule.classroom_id)
-            ws2.cell(row=row, column=1).value = schedule.id
-            ws2.cell(row=row, column=2).value = classroom.name if classroom else 'N/A'
-            ws2.cell(row=row, column=3).value = days[schedule.day_of_week]
-            ws2.cell(row=row, column=4).value = shifts.get(schedule.shift, schedule.shift)
-            ws2.cell(row=row, column=5).value = schedule.course_name
-            ws2.cell(row=row, column=6).value = schedule.instructor
-            ws2.cell(row=row, column=7).value = schedule.start_time
-            ws2.cell(row=row, column=8).value = schedule.end_time
-            ws2.cell(row=row, column=9).value = 'Sim' if schedule.is_active else 'Não'
-        
-        # Auto-fit columns for sheet 2
-        for column_cells in ws2.columns:
-            max_length = 0
-            column_letter = column_cells[0].column_letter
-            for cell in column_cells:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws2.column_dimensions[column_letter].width = adjusted_width
-        
-        # Sheet 3: Statistics
-        ws3 = wb.create_sheet(title="Estatísticas")
-        ws3.cell(row=1, column=1).value = "Estatística"
-        ws3.cell(row=1, column=2).value = "Valor"
-        
-        # Style headers
-        for col in [1, 2]:
-            cell = ws3.cell(row=1, column=col)
-            cell.font = Font(bold=True, color='FFFFFF')
-            cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-            cell.alignment = Alignment(horizontal='center')
-        
-        # Statistics data
-        total_classrooms = len(classrooms)
-        total_schedules = len([s for s in schedules if s.is_active])
-        total_slots = total_classrooms * 23  # 6 days * 4 shifts - 1 (no Saturday night)
-        occupancy_rate = (total_schedules / total_slots * 100) if total_slots > 0 else 0
-        
-        stats_data = [
-            ['Total de Salas', total_classrooms],
-            ['Total de Horários Ativos', total_schedules],
-            ['Taxa de Ocupação (%)', f"{occupancy_rate:.1f}%"],
-            ['Salas com Computadores', len([c for c in classrooms if c.has_computers])],
-            ['Salas sem Computadores', len([c for c in classrooms if not c.has_computers])]
-        ]
-        
-        for row, (stat, value) in enumerate(stats_data, 2):
-            ws3.cell(row=row, column=1).value = stat
-            ws3.cell(row=row, column=2).value = value
-        
-        # Auto-fit columns for sheet 3
-        for column_cells in ws3.columns:
-            max_length = 0
-            column_letter = column_cells[0].column_letter
-            for cell in column_cells:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws3.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f'relatorio_senai_{timestamp}.xlsx'
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        
-        return response
-    except Exception as e:
-        flash(f'Erro ao gerar Excel: {str(e)}', 'error')
+    if not openpyxl:
+        flash('Funcionalidade de Excel não está disponível no momento.', 'error')
         return redirect(url_for('dashboard'))
+    return start_export_job('school_excel', {}, 'dashboard')
 
 @app.route('/export_filtered_excel')
 @require_admin_auth
@@ -2231,112 +1632,67 @@ def export_filtered_excel():
     active_school = get_active_school()
     if not active_school:
         return redirect(url_for('select_school'))
-        
+    if not openpyxl:
+        flash('Funcionalidade de Excel não está disponível no momento.', 'error')
+        return redirect(url_for('dashboard'))
+
+    # Same classroom filters as the dashboard
+    return start_export_job('filtered_excel', {key: request.args.get(key, '') for key in FILTERED_EXCEL_PARAMS},
+                            'dashboard')
+
+# Exportações em segundo plano (ver jobs.py)
+def start_export_job(kind, params, error_endpoint):
+    """Start (or reuse) an export job; files ready within a second are sent right away"""
     try:
-        # Get the same filters as dashboard
-        block_filter = request.args.get('block', '')
-        # Remove floor filter as it doesn't exist in the model
-        has_computers_filter = request.args.get('has_computers', '')
-        capacity_filter = request.args.get('capacity', '')
-        day_filter = request.args.get('day', '')
-        shift_filter = request.args.get('shift', '')
-        
-        # Build filtered queries
-        classroom_query = Classroom.query.filter_by(school_id=active_school.id)
-        if block_filter:
-            classroom_query = classroom_query.filter(Classroom.block == block_filter)
-        # Remove floor filter as it doesn't exist in the model
-        if has_computers_filter:
-            has_computers_bool = has_computers_filter.lower() == 'true'
-            classroom_query = classroom_query.filter(Classroom.has_computers == has_computers_bool)
-        if capacity_filter:
-            capacity_ranges = {
-                'small': (0, 20),
-                'medium': (21, 35),
-                'large': (36, 100)
-            }
-            if capacity_filter in capacity_ranges:
-                min_cap, max_cap = capacity_ranges[capacity_filter]
-                classroom_query = classroom_query.filter(
-                    Classroom.capacity >= min_cap,
-                    Classroom.capacity <= max_cap
-                )
-        
-        filtered_classrooms = classroom_query.all()
-        
-        # Build schedule query with filters
-        schedule_query = Schedule.query.join(Classroom).filter(Classroom.school_id == active_school.id, Schedule.is_active == True)
-        if day_filter:
-            schedule_query = schedule_query.filter(Schedule.day_of_week == int(day_filter))
-        if shift_filter:
-            schedule_query = schedule_query.filter(Schedule.shift == shift_filter)
-        
-        filtered_schedules = schedule_query.all()
-        
-        # Create Excel file similar to export_excel but with filtered data
-        wb = openpyxl.Workbook()
-        ws1 = wb.active
-        ws1.title = "Salas Filtradas"
-        
-        # Headers
-        headers = ['ID', 'Nome', 'Capacidade', 'Bloco', 'Tem Computadores', 'Softwares', 'Descrição']
-        for col, header in enumerate(headers, 1):
-            cell = ws1.cell(row=1, column=col)
-            if cell:
-                cell.value = header
-                try:
-                    from openpyxl.styles import Font, PatternFill, Alignment
-                    cell.font = Font(bold=True, color='FFFFFF')
-                    cell.fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-                    cell.alignment = Alignment(horizontal='center')
-                except ImportError:
-                    pass  # Styles not available
-        
-        # Data
-        for row, classroom in enumerate(filtered_classrooms, 2):
-            ws1.cell(row=row, column=1).value = classroom.id
-            ws1.cell(row=row, column=2).value = classroom.name
-            ws1.cell(row=row, column=3).value = classroom.capacity
-            ws1.cell(row=row, column=4).value = classroom.block
-            ws1.cell(row=row, column=5).value = 'Sim' if classroom.has_computers else 'Não'
-            ws1.cell(row=row, column=6).value = classroom.software
-            ws1.cell(row=row, column=7).value = classroom.description
-        
-        # Auto-fit columns with safer approach
-        try:
-            for column_cells in ws1.columns:
-                if column_cells and len(column_cells) > 0:
-                    max_length = 0
-                    column_letter = column_cells[0].column_letter
-                    for cell in column_cells:
-                        try:
-                            if cell and cell.value and len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    if ws1.column_dimensions and column_letter:
-                        ws1.column_dimensions[column_letter].width = adjusted_width
-        except Exception:
-            pass  # Skip column sizing if there are issues
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f'relatorio_filtrado_{timestamp}.xlsx'
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        
-        return response
+        job = wait_for_job(start_job(kind, session['active_school_id'], params), EXPORT_INLINE_WAIT_SECONDS)
+        if job.status == 'done':
+            return send_job_artifact(job)
+        if job.status == 'failed':
+            flash(f'Erro ao gerar {JOB_KINDS[kind].title}: {job.error}', 'error')
+            return redirect(url_for(error_endpoint))
+        return redirect(url_for('export_job_status', job_id=job.id))
     except Exception as e:
-        flash(f'Erro ao gerar Excel filtrado: {str(e)}', 'error')
+        import logging
+        logging.error(f"Erro ao iniciar exportação {kind}: {e}")
+        flash(f'Erro ao gerar {JOB_KINDS[kind].title}: {str(e)}', 'error')
+        return redirect(url_for(error_endpoint))
+
+def get_export_job(job_id):
+    """Job of the active school, 404 otherwise; admin-only kinds need an authenticated admin"""
+    job = ExportJob.query.get_or_404(job_id)
+    kind = JOB_KINDS.get(job.kind)
+    if kind is None or job.school_id != session.get('active_school_id'):
+        abort(404)
+    if kind.admin and not is_admin_authenticated():
+        abort(403)
+    return job
+
+def send_job_artifact(job):
+    return send_file(artifact_path(job), mimetype=JOB_KINDS[job.kind].mimetype, as_attachment=True,
+                     download_name=job.filename)
+
+@app.route('/jobs/<job_id>')
+def export_job_status(job_id):
+    job = get_export_job(job_id)
+    return render_template('job_status.html', job=job, kind=JOB_KINDS[job.kind])
+
+@app.route('/jobs/<job_id>/status')
+def export_job_status_json(job_id):
+    job = get_export_job(job_id)
+    data = job.to_dict()
+    if is_stale(job):
+        data.update(status='failed', error='A exportação foi interrompida. Tente novamente.')
+    if job.status == 'done':
+        data['download_url'] = url_for('download_export_job', job_id=job.id)
+    return jsonify(data)
+
+@app.route('/jobs/<job_id>/download')
+def download_export_job(job_id):
+    job = get_export_job(job_id)
+    if job.status != 'done' or not os.path.exists(artifact_path(job)):
+        flash('O arquivo não está mais disponível. Gere a exportação novamente.', 'warning')
         return redirect(url_for('dashboard'))
+    return send_job_artifact(job)
 
 # Schedule Request Routes (for non-logged-in users)
 @app.route('/request_schedule/<int:classroom_id>')
@@ -2439,10 +1795,16 @@ def submit_schedule_request():
             additional_dates=other_dates
         )
         
+        # Check the generated dates before saving (no autoflush of the new request)
+        check = precheck_requests([schedule_request])[0]
+        
         db.session.add(schedule_request)
         db.session.commit()
         
         flash('Solicitação enviada com sucesso! qualquer duvida procure a gestão', 'success')
+        if check.has_conflicts:
+            flash(f'Atenção: {len(check.conflicting_dates)} de {len(check.dates)} data(s) já estão ocupadas ou '
+                  f'solicitadas por outra pessoa ({check.summary()}). A gestão avaliará a disponibilidade.', 'warning')
         return redirect(url_for('classroom_detail', classroom_id=classroom_id))
         
     except Exception as e:
@@ -2463,14 +1825,21 @@ def admin_schedule_requests():
     """Admin page to view and manage schedule requests"""
     status_filter = request.args.get('status', 'pending')
     
-    query = ScheduleRequest.query.join(Classroom).filter(Classroom.school_id == active_school.id)
+    query = ScheduleRequest.query.join(Classroom).filter(Classroom.school_id == active_school.id).options(
+        db.contains_eager(ScheduleRequest.classroom)
+    )
     if status_filter and status_filter != 'all':
         query = query.filter(ScheduleRequest.status == status_filter)
     
     schedule_requests = query.order_by(ScheduleRequest.created_at.desc()).all()
     
+    # Conflict pre-check for every pending request in one batched pass
+    pending_requests = [r for r in schedule_requests if r.status == 'pending']
+    conflict_checks = {check.request.id: check for check in precheck_requests(pending_requests)}
+    
     return render_template('admin_schedule_requests.html', 
                          requests=schedule_requests, 
+                         conflict_checks=conflict_checks,
                          current_status=status_filter)
 
 @app.route('/admin/schedule_request/<int:request_id>/action', methods=['POST'])
@@ -2501,12 +1870,15 @@ def admin_schedule_request_action(request_id):
         if action == 'approve':
             # Create schedule entries for approved request
             try:
-                # Parse additional dates if they exist
-                dates_to_schedule = [schedule_request.requested_date]
-                if schedule_request.additional_dates:
-                    additional_dates = json.loads(schedule_request.additional_dates)
-                    for date_str in additional_dates:
-                        dates_to_schedule.append(datetime.strptime(date_str, '%Y-%m-%d').date())
+                # Requested date plus additional dates, checked against active schedules
+                check = precheck_requests([schedule_request])[0]
+                dates_to_schedule = check.dates
+                
+                # Refuse the approval if any requested date collides with an active schedule
+                if check.schedule_conflicts:
+                    flash(f'Solicitação não aprovada: {len(check.schedule_conflicts)} data(s) em conflito com horários existentes '
+                          f'({check.summary(include_requests=False)}).', 'error')
+                    return redirect(url_for('admin_schedule_requests'))
                 
                 # Create schedule entries for each date
                 for schedule_date in dates_to_schedule:
@@ -2529,6 +1901,7 @@ def admin_schedule_request_action(request_id):
                 schedule_request.admin_notes = admin_notes
                 schedule_request.reviewed_at = get_brazil_time()
                 schedule_request.reviewed_by = 'Admin'
+                bump_data_version(classroom.school_id)
                 
                 # Commit all changes together
                 db.session.commit()
@@ -2577,26 +1950,22 @@ def admin_schools():
 
 @app.route('/school_logo/<int:school_id>')
 def serve_school_logo(school_id):
-    """Serve school logo from database"""
+    """Serve school logo from the asset table"""
+    cached = not_modified_asset()
+    if cached:
+        return cached
     try:
-        school = School.query.get_or_404(school_id)
-        if not school.logo_data:
-            from flask import abort
-            abort(404)
-        
-        # Ensure logo_data is actually bytes and not empty
-        if len(school.logo_data) == 0:
-            from flask import abort
-            abort(404)
-        
-        return send_file(
-            io.BytesIO(school.logo_data),
-            mimetype=school.logo_mimetype or 'image/png'
-        )
+        return send_asset(school_logo_asset_id(school_id), 'image/png', public=True, cache=logo_bytes_cache)
     except Exception:
         from flask import abort
         abort(404)
 
+@app.route('/admin/cache_stats')
+@require_admin_auth
+def cache_stats():
+    """Hit/miss counters of the in-process caches of this worker"""
+    return jsonify(all_cache_stats())
+
 @app.route('/admin/schools/add', methods=['GET', 'POST'])
 @require_admin_auth
 def add_school():
@@ -2620,11 +1989,11 @@ def add_school():
             if 'logo' in request.files:
                 file = request.files['logo']
                 if file and file.filename and file.filename != '' and allowed_file(file.filename):
-                    new_school.logo_data = file.read()
-                    new_school.logo_mimetype = file.mimetype
+                    new_school.logo_asset_id = store_upload(file, 'logo').id
 
             db.session.add(new_school)
             db.session.commit()
+            forget_school(new_school.id)
             
             flash(f'Unidade "{name}" adicionada com sucesso!', 'success')
             return redirect(url_for('admin_schools'))
@@ -2660,10 +2029,13 @@ def edit_school(school_id):
             if 'logo' in request.files:
                 file = request.files['logo']
                 if file and file.filename and file.filename != '' and allowed_file(file.filename):
-                    school.logo_data = file.read()
-                    school.logo_mimetype = file.mimetype
+                    old_logo_id = school.logo_asset_id
+                    school.logo_asset_id = store_upload(file, 'logo').id
+                    release_asset(old_logo_id)
 
+            bump_data_version(school.id)
             db.session.commit()
+            forget_school(school.id)
             
             # If editing the current school, update session name
             if school.id == active_school.id:
@@ -2720,15 +2092,7 @@ def virtual_assistant():
         if not active_school:
             return jsonify({'response': '🏫 Por favor, selecione uma unidade escolar para que eu possa te ajudar com as salas e horários!'})
              
-        classrooms = Classroom.query.filter_by(school_id=active_school.id).all()
-        schedules = Schedule.query.join(Classroom).filter(
-            Classroom.school_id == active_school.id,
-            Schedule.is_active == True
-        ).all()
-        incidents = Incident.query.join(Classroom).filter(
-            Classroom.school_id == active_school.id,
-            Incident.is_active == True
-        ).all()
+        classrooms, schedules, incidents = availability_engine.load_school_snapshot(active_school.id)
         
         # Prepare response based on user question
         response = process_user_question(user_message, classrooms, schedules, incidents, current_time, current_date, current_hour, current_weekday, active_school)
@@ -2881,58 +2245,31 @@ def process_user_question(user_message, classrooms, schedules, incidents, curren
 def get_available_rooms_now_smart(classrooms, schedules, current_time, current_date, current_hour, current_weekday):
     """Return information about currently available rooms with real-time database analysis"""
     try:
-        from models import Classroom, Schedule
-        from app import db
-        from datetime import datetime, date, timedelta
-        import pytz
-        
-        # Get São Paulo timezone
-        sp_tz = pytz.timezone('America/Sao_Paulo')
-        current_sp_time = datetime.now(sp_tz)
-        current_date_sp = current_sp_time.date()
-        current_hour_sp = current_sp_time.hour
-        current_weekday_sp = current_sp_time.weekday()  # 0=Monday, 6=Sunday
+        # Same availability engine as /available_now, over the schedules already loaded
+        day = availability_engine.DayAvailability.from_schedules(current_date, classrooms, schedules)
+        now_shift = availability_engine.primary_shift(availability_engine.current_shifts(current_time))
+        if now_shift:
+            result = day.for_shift(now_shift, exact=(now_shift == 'fullday'))
+        else:
+            result = {'available_rooms': list(classrooms), 'occupied_schedule_map': {}}
         
-        # Use provided data
         all_classrooms = classrooms
-        active_schedules = [s for s in schedules if (s.start_date <= current_date_sp and s.end_date >= current_date_sp and s.day_of_week == current_weekday_sp and int(s.start_time) <= current_hour_sp and int(s.end_time) > current_hour_sp)]
-        
-        # Analyze real-time data
-        available_rooms = []
-        occupied_rooms = []
-        
-        for classroom in all_classrooms:
-            is_occupied = False
-            current_schedule = None
-            
-            # Check if classroom is currently occupied based on real schedule data
-            for schedule in active_schedules:
-                if schedule.classroom_id == classroom.id:
-                    is_occupied = True
-                    current_schedule = schedule
-                    break
-            
-            if not is_occupied:
-                available_rooms.append(classroom)
-            else:
-                occupied_rooms.append((classroom, current_schedule))
+        available_rooms = list(result['available_rooms'])
+        occupied_rooms = [(room, result['occupied_schedule_map'][room.id][0])
+                          for room in classrooms if room.id in result['occupied_schedule_map']]
         
         # Get usage statistics
-        total_schedules_today = len([s for s in schedules if (s.start_date <= current_date_sp and s.end_date >= current_date_sp and s.day_of_week == current_weekday_sp)])
+        total_schedules_today = len(day.schedules)
         
-        # Get upcoming availability
+        # Get upcoming availability: next class starting later today, per room
+        now_hhmm = current_time.strftime('%H:%M')
         next_available = {}
-        for room, schedule in occupied_rooms:
-            if schedule:
-                next_sched = next((s for s in schedules if (s.classroom_id == room.id and s.start_date <= current_date_sp and s.end_date >= current_date_sp and s.day_of_week == current_weekday_sp and int(s.start_time) > current_hour_sp)), None)
-                
-                if next_sched:
-                    next_available[room.id] = next_sched.start_time
-                else:
-                    next_available[room.id] = schedule.end_time
+        for schedule in sorted(day.schedules, key=lambda s: s.start_time or ''):
+            if schedule.start_time and schedule.start_time > now_hhmm:
+                next_available.setdefault(schedule.classroom_id, schedule.start_time)
         
         # Generate intelligent, real-time analysis response
-        time_greeting = get_time_greeting(current_hour_sp)
+        time_greeting = get_time_greeting(current_time.hour)
         
         if available_rooms:
             # Calculate availability percentage
@@ -2945,9 +2282,6 @@ def get_available_rooms_now_smart(classrooms, schedules, current_time, current_d
             available_rooms.sort(key=lambda x: x.capacity, reverse=True)
             
             for i, room in enumerate(available_rooms):
-                # Check if room has schedules later today
-                has_later_schedule = any(room.id in next_available.values() for room in available_rooms)
-                
                 response += f"{'🏆' if i == 0 else '⭐' if room.capacity >= 30 else '•'} **{room.name}** ({room.block})\n"
                 response += f"  💺 {room.capacity} pessoas"
                 if room.has_computers:
@@ -2960,7 +2294,7 @@ def get_available_rooms_now_smart(classrooms, schedules, current_time, current_d
                 # Add smart insights about room availability
                 if room.id in next_available:
                     next_time = next_available[room.id]
-                    response += f"  ⚠️ Ocupada às {next_time:02d}:00\n"
+                    response += f"  ⚠️ Ocupada às {next_time}\n"
                 else:
                     response += f"  ✅ Livre o resto do dia\n"
                     
@@ -2979,7 +2313,7 @@ def get_available_rooms_now_smart(classrooms, schedules, current_time, current_d
             
         else:
             response = f"{time_greeting} 😅\n\n"
-            response += f"🔴 **Análise: Todas as {len(all_classrooms)} salas estão ocupadas ({current_sp_time.strftime('%H:%M')})**\n\n"
+            response += f"🔴 **Análise: Todas as {len(all_classrooms)} salas estão ocupadas ({current_time.strftime('%H:%M')})**\n\n"
             
             if occupied_rooms:
                 response += "📚 **Atividades em andamento (dados em tempo real):**\n\n"
@@ -2988,7 +2322,7 @@ def get_available_rooms_now_smart(classrooms, schedules, current_time, current_d
                     if schedule and hasattr(schedule, 'course_name'):
                         response += f" - {schedule.course_name}"
                         if hasattr(schedule, 'end_time'):
-                            response += f" (até {schedule.end_time:02d}:00)"
+                            response += f" (até {schedule.end_time})"
                     response += "\n"
                 
                 if len(occupied_rooms) > 4:
@@ -3005,7 +2339,7 @@ def get_available_rooms_now_smart(classrooms, schedules, current_time, current_d
                         liberation_times[end_time].append(room.name)
                 
                 for time, rooms in sorted(liberation_times.items()):
-                    response += f"• {time:02d}:00 - {', '.join(rooms[:2])}"
+                    response += f"• {time} - {', '.join(rooms[:2])}"
                     if len(rooms) > 2:
                         response += f" (+{len(rooms)-2} outras)"
                     response += "\n"
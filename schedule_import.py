@@ -0,0 +1,388 @@
+"""Importação de horários em lote a partir de uma planilha (.xlsx) ou CSV.
+
+O arquivo usa as colunas da aba "Horários" de /export_excel: ID, Sala, Dia da
+Semana, Turno, Curso, Professor, Início, Fim e Ativo. As colunas opcionais
+"Data Início" e "Data Fim" (dd/mm/aaaa) definem o período do curso. O arquivo
+inteiro é validado de uma vez, sem uma consulta por linha:
+- as salas são buscadas pelo nome, numa única consulta das salas da escola;
+- dias, turnos, horários e datas são convertidos por tabelas, sem consulta;
+  Início/Fim em branco recebem a janela do turno;
+- os conflitos com os horários existentes, e entre as próprias linhas, são
+  conferidos com um único ConflictIndex (ver conflicts.py);
+- as linhas com o ID de um horário já cadastrado na escola são ignoradas, então
+  reimportar uma exportação não duplica nada.
+
+Se houver qualquer linha inválida, nada é gravado. As linhas em conflito são
+puladas, como em add_schedule. As demais são inseridas com um único INSERT
+(executemany), numa transação. Com dry-run nada é gravado e só o relatório é
+devolvido.
+
+Pela web: /import_schedules. Linha de comando:
+python schedule_import.py <school_id> <arquivo.xlsx|arquivo.csv> [--dry-run]
+"""
+import csv
+import io
+import logging
+import os
+import sys
+import unicodedata
+from datetime import date, datetime, time
+
+from app import app, db
+from availability import DAY_NAMES, SHIFT_NAMES, SHIFT_WINDOWS
+from cache import bump_data_version
+from conflicts import ConflictIndex, Slot, describe_conflicts, parse_minutes
+from models import Classroom, Schedule
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+SHEET_NAME = "Horários"
+MAX_TEXT_LENGTH = 100
+ID_BATCH_SIZE = 500
+
+# Normalized header -> field; see _normalize
+COLUMNS = {
+    'id': 'id',
+    'sala': 'room',
+    'dia da semana': 'day',
+    'dia': 'day',
+    'turno': 'shift',
+    'curso': 'course_name',
+    'professor': 'instructor',
+    'inicio': 'start_time',
+    'fim': 'end_time',
+    'ativo': 'is_active',
+    'data inicio': 'start_date',
+    'data fim': 'end_date',
+}
+REQUIRED_FIELDS = {'room': 'Sala', 'day': 'Dia da Semana', 'shift': 'Turno', 'course_name': 'Curso'}
+TRUE_VALUES = {'sim', 's', 'true', '1', 'yes', 'ativo'}
+FALSE_VALUES = {'nao', 'n', 'false', '0', 'no', 'inativo'}
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d')
+
+
+def _normalize(value):
+    """Lowercase, accents removed and spaces collapsed ('Terça-Feira ' -> 'terca-feira')"""
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(text.lower().split())
+
+
+DAYS = {}
+for _index, _name in enumerate(DAY_NAMES):
+    DAYS[_normalize(_name)] = _index
+    DAYS[_normalize(_name) + '-feira'] = _index
+    DAYS[_normalize(_name) + ' feira'] = _index
+SHIFTS = {_normalize(label): code for code, label in SHIFT_NAMES.items()}
+SHIFTS.update({code: code for code in SHIFT_NAMES})
+
+
+class ImportReport:
+    """What an import found (and did) for a file"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.total_rows = 0
+        self.errors = []     # (line, message): nothing is written while there are any
+        self.conflicts = []  # (line, message): rows skipped
+        self.existing = []   # lines whose ID is already stored
+        self.to_create = []  # parameter dicts for the INSERT
+        self.created = 0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def summary(self):
+        """Portuguese one-liner for flash messages and the CLI"""
+        if self.errors:
+            return (f"{len(self.errors)} linha(s) com erro em {self.total_rows}: corrija o arquivo, "
+                    f"nenhum horário foi importado.")
+        action = 'seriam importados' if self.dry_run else 'importados'
+        count = len(self.to_create) if self.dry_run else self.created
+        parts = [f"{count} horário(s) {action}"]
+        if self.conflicts:
+            parts.append(f"{len(self.conflicts)} em conflito (ignorados)")
+        if self.existing:
+            parts.append(f"{len(self.existing)} já cadastrado(s)")
+        return ', '.join(parts) + f" de {self.total_rows} linha(s)."
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _text(value):
+    if _is_blank(value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _read_xlsx(stream):
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sheet = workbook[SHEET_NAME] if SHEET_NAME in workbook.sheetnames else workbook.active
+        for line, values in enumerate(sheet.iter_rows(values_only=True), 1):
+            yield line, list(values)
+    finally:
+        workbook.close()
+
+
+def _read_csv(stream):
+    raw = stream.read()
+    try:
+        content = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        content = raw.decode('latin-1')  # Excel "CSV" on Windows
+    try:
+        dialect = csv.Sniffer().sniff(content[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    for line, values in enumerate(csv.reader(io.StringIO(content), dialect), 1):
+        yield line, values
+
+
+def read_table(stream, filename):
+    """(header line, {field: column}, [(line, values)]) of an .xlsx or .csv file; raises ValueError"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        rows = _read_csv(stream)
+    elif extension in ('.xlsx', '.xlsm'):
+        if openpyxl is None:
+            raise ValueError("Leitura de planilhas Excel não está disponível no momento.")
+        rows = _read_xlsx(stream)
+    else:
+        raise ValueError("Formato não suportado: envie um arquivo .xlsx ou .csv.")
+
+    header_line, columns, data = None, {}, []
+    for line, values in rows:
+        if all(_is_blank(value) for value in values):
+            continue
+        if header_line is None:
+            header_line = line
+            for position, header in enumerate(values):
+                field = COLUMNS.get(_normalize(header)) if not _is_blank(header) else None
+                if field and field not in columns:
+                    columns[field] = position
+            missing = [label for field, label in REQUIRED_FIELDS.items() if field not in columns]
+            if missing:
+                raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(missing)}.")
+            continue
+        data.append((line, values))
+    if header_line is None:
+        raise ValueError("O arquivo está vazio.")
+    return header_line, columns, data
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _parse_time(value):
+    """'HH:MM' from a cell (time, datetime or text), '' when blank, None when invalid"""
+    if _is_blank(value):
+        return ''
+    if isinstance(value, (time, datetime)):
+        return value.strftime('%H:%M')
+    minutes = parse_minutes(value)
+    if minutes is None or not 0 <= minutes < 24 * 60:
+        return None
+    return _format_minutes(minutes)
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _validate_row(values, columns, rooms):
+    """(schedule dict, stored id or None, [errors]) for one data row"""
+    def cell(field):
+        position = columns.get(field)
+        return values[position] if position is not None and position < len(values) else None
+
+    errors = []
+    row = {}
+
+    room_name = _normalize(_text(cell('room')))
+    classroom_id = rooms.get(room_name)
+    if not room_name:
+        errors.append("Sala em branco")
+    elif classroom_id is None:
+        errors.append(f"Sala '{_text(cell('room'))}' não encontrada nesta escola")
+    elif classroom_id == 0:
+        errors.append(f"Há mais de uma sala chamada '{_text(cell('room'))}'")
+    row['classroom_id'] = classroom_id
+
+    day = DAYS.get(_normalize(_text(cell('day'))))
+    if day is None:
+        errors.append(f"Dia da semana inválido: '{_text(cell('day'))}'")
+    row['day_of_week'] = day
+
+    shift = SHIFTS.get(_normalize(_text(cell('shift'))))
+    if shift is None:
+        errors.append(f"Turno inválido: '{_text(cell('shift'))}' (use Manhã, Tarde, Integral ou Noite)")
+    row['shift'] = shift
+
+    for field, label in (('course_name', 'Curso'), ('instructor', 'Professor')):
+        value = _text(cell(field))
+        if len(value) > MAX_TEXT_LENGTH:
+            errors.append(f"{label} com mais de {MAX_TEXT_LENGTH} caracteres")
+        row[field] = value
+    if not row['course_name']:
+        errors.append("Curso em branco")
+
+    start_time, end_time = _parse_time(cell('start_time')), _parse_time(cell('end_time'))
+    if start_time is None:
+        errors.append(f"Início inválido: '{_text(cell('start_time'))}' (use HH:MM)")
+    if end_time is None:
+        errors.append(f"Fim inválido: '{_text(cell('end_time'))}' (use HH:MM)")
+    if start_time is not None and end_time is not None:
+        if (not start_time or not end_time) and shift in SHIFT_WINDOWS:
+            # Blank times take the shift's window, like the schedule forms
+            window_start, window_end = SHIFT_WINDOWS[shift]
+            start_time = start_time or _format_minutes(window_start)
+            end_time = end_time or _format_minutes(window_end)
+        if start_time and end_time and parse_minutes(end_time) <= parse_minutes(start_time):
+            errors.append(f"Fim ({end_time}) antes do início ({start_time})")
+    row['start_time'], row['end_time'] = start_time, end_time
+
+    for field, label in (('start_date', 'Data Início'), ('end_date', 'Data Fim')):
+        value = cell(field)
+        parsed = None if _is_blank(value) else _parse_date(value)
+        if not _is_blank(value) and parsed is None:
+            errors.append(f"{label} inválida: '{_text(value)}' (use dd/mm/aaaa)")
+        row[field] = parsed
+    if row['start_date'] and row['end_date'] and row['start_date'] > row['end_date']:
+        errors.append("Data Início depois da Data Fim")
+
+    active = _normalize(_text(cell('is_active')))
+    if active and active not in TRUE_VALUES | FALSE_VALUES:
+        errors.append(f"Ativo inválido: '{_text(cell('is_active'))}' (use Sim ou Não)")
+    row['is_active'] = active not in FALSE_VALUES
+
+    stored_id = None
+    id_text = _text(cell('id'))
+    if id_text:
+        try:
+            stored_id = int(id_text)
+        except ValueError:
+            errors.append(f"ID inválido: '{id_text}'")
+    return row, stored_id, errors
+
+
+def _room_lookup(school_id):
+    """Normalized room name -> classroom id (0 when the name is repeated in the school)"""
+    rooms = {}
+    for classroom_id, name in db.session.query(Classroom.id, Classroom.name).filter(
+            Classroom.school_id == school_id):
+        key = _normalize(name or '')
+        rooms[key] = 0 if key in rooms else classroom_id
+    return rooms
+
+
+def _stored_ids(school_id, ids):
+    """The ids (of a file's ID column) that are schedules of this school"""
+    ids = sorted(ids)
+    found = set()
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        found.update(schedule_id for (schedule_id,) in db.session.query(Schedule.id).join(Classroom).filter(
+            Classroom.school_id == school_id,
+            Schedule.id.in_(ids[start:start + ID_BATCH_SIZE])
+        ))
+    return found
+
+
+def validate_schedules(school_id, stream, filename, dry_run=False):
+    """ImportReport for a file, with the rows to insert in report.to_create (nothing is written)"""
+    report = ImportReport(dry_run)
+    _, columns, data = read_table(stream, filename)
+    report.total_rows = len(data)
+
+    rooms = _room_lookup(school_id)
+    parsed = []
+    for line, values in data:
+        row, stored_id, errors = _validate_row(values, columns, rooms)
+        report.errors.extend((line, message) for message in errors)
+        if not errors:
+            parsed.append((line, row, stored_id))
+    if report.errors:
+        return report
+
+    stored = _stored_ids(school_id, {stored_id for _, _, stored_id in parsed if stored_id is not None})
+    new_rows = []
+    for line, row, stored_id in parsed:
+        if stored_id in stored:
+            report.existing.append(line)
+        else:
+            new_rows.append((line, row))
+
+    # Inactive rows don't occupy the room, so only active ones are checked
+    slots = [Slot(row['classroom_id'], row['day_of_week'], row['shift'], row['start_time'], row['end_time'],
+                  row['start_date'], row['end_date'], ref=line)
+             for line, row in new_rows if row['is_active']]
+    conflicting = {}
+    for slot, found in ConflictIndex.for_slots(slots).check(slots, accept=True):
+        if found:
+            conflicting[slot.ref] = found
+
+    for line, row in new_rows:
+        if line in conflicting:
+            found = conflicting[line]
+            parts = []
+            stored_found = [item for item in found if not isinstance(item, Slot)]
+            if stored_found:
+                parts.append(describe_conflicts(stored_found))
+            file_lines = [str(item.ref) for item in found if isinstance(item, Slot)]
+            if file_lines:
+                parts.append(f"linha(s) {', '.join(file_lines)} do arquivo")
+            report.conflicts.append(
+                (line, f"{DAY_NAMES[row['day_of_week']]} {row['start_time']}-{row['end_time']}: {'; '.join(parts)}"))
+        else:
+            report.to_create.append(row)
+    return report
+
+
+def import_schedules(school_id, stream, filename, dry_run=False):
+    """Validate a file and, unless dry_run or invalid, insert its schedules in one transaction"""
+    report = validate_schedules(school_id, stream, filename, dry_run)
+    if dry_run or not report.ok or not report.to_create:
+        return report
+    try:
+        db.session.execute(db.insert(Schedule), report.to_create)
+        bump_data_version(school_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    report.created = len(report.to_create)
+    logging.info(f"✅ {report.created} horários importados de {filename} (escola {school_id})")
+    return report
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != '--dry-run']
+    if len(args) != 2 or not args[0].isdigit():
+        print("Uso: python schedule_import.py <school_id> <arquivo.xlsx|arquivo.csv> [--dry-run]")
+        sys.exit(1)
+    with app.app_context():
+        with open(args[1], 'rb') as source:
+            result = import_schedules(int(args[0]), source, args[1], dry_run='--dry-run' in sys.argv)
+        for line, message in result.errors:
+            print(f"Linha {line}: {message}")
+        for line, message in result.conflicts:
+            print(f"Linha {line} (conflito): {message}")
+        print(result.summary())
+        sys.exit(0 if result.ok else 1)
@@ -0,0 +1,47 @@
+"""Dados da escola ativa em cache: no máximo uma consulta (a da versão de dados)
+por escola a cada ``VERSION_TTL_SECONDS`` de cache.py, em vez de uma por página.
+
+Quase toda rota chama ``get_active_school()`` e o base.html mostra o nome e o
+logo da escola. ``get_school_info`` guarda id, nome, senha de administrador e
+o asset do logo por escola, até a próxima mudança na versão de dados da escola
+(``edit_school`` incrementa a versão). Os bytes do logo ficam no
+``logo_bytes_cache`` de assets.py. Contadores em /admin/cache_stats.
+"""
+from collections import namedtuple
+
+from app import db
+from cache import VersionedCache, get_data_version
+from models import School
+
+# Read-only snapshot of a School row; use School.query to change a school
+SchoolInfo = namedtuple('SchoolInfo', 'id name admin_password logo_asset_id')
+
+school_cache = VersionedCache('school', max_entries=64)
+
+
+def load_school_info(school_id):
+    row = db.session.query(School.id, School.name, School.admin_password, School.logo_asset_id).filter(
+        School.id == school_id
+    ).first()
+    return SchoolInfo(*row) if row else None
+
+
+def get_school_info(school_id):
+    """Cached SchoolInfo for a school id, None if it doesn't exist"""
+    if not school_id:
+        return None
+    info = school_cache.get_or_compute(school_id, get_data_version(school_id), lambda: load_school_info(school_id))
+    if info is None:
+        # Don't remember missing schools: the id may be created later (add_school)
+        school_cache.discard(school_id)
+    return info
+
+
+def forget_school(school_id):
+    """Drop a school from this worker's cache right away (other workers follow its data version)"""
+    school_cache.discard(school_id)
+
+
+def school_logo_asset_id(school_id):
+    info = get_school_info(school_id)
+    return info.logo_asset_id if info else None
@@ -0,0 +1,201 @@
+"""Onde ficam os bytes dos assets: no banco (padrão) ou em disco.
+
+Configuração por variáveis de ambiente:
+- ``ASSET_STORAGE``: ``database`` (padrão) ou ``filesystem`` para novos uploads;
+- ``ASSET_STORAGE_DIR``: diretório do armazenamento em disco
+  (padrão ``instance/assets``);
+- ``ASSET_ACCEL_REDIRECT_PREFIX``: se definido (ex.: ``/_assets/``), os arquivos
+  em disco são entregues pelo nginx via ``X-Accel-Redirect``, com uma location
+  ``internal`` apontando para ASSET_STORAGE_DIR.
+
+Em disco, cada arquivo é guardado pelo seu sha256 (``ab/cd/abcd...``), então
+conteúdo repetido ocupa um único arquivo e um arquivo nunca é sobrescrito com
+outro conteúdo. A linha em ``asset`` continua existindo (id, mimetype, sha256),
+com ``storage = 'filesystem'`` e ``data`` vazio. Arquivos em disco são servidos
+com ``send_file`` no caminho real (sendfile do sistema operacional, sem passar
+os bytes pela memória do worker).
+
+Mover os assets existentes entre os dois: python storage.py filesystem|database
+
+Arquivos em disco que nenhum asset usa mais (a última referência foi solta, ver
+assets.release_asset) são apagados por: python storage.py gc
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+from app import app, db
+
+ASSET_STORAGE = os.environ.get('ASSET_STORAGE', 'database')
+ASSET_STORAGE_DIR = os.environ.get('ASSET_STORAGE_DIR') or os.path.join(app.instance_path, 'assets')
+ASSET_ACCEL_REDIRECT_PREFIX = os.environ.get('ASSET_ACCEL_REDIRECT_PREFIX', '')
+
+# Files younger than this are never collected: their asset row may not be committed yet
+GC_GRACE_SECONDS = 3600
+
+# An asset ready to be sent: either a real file path or the bytes from the database
+StoredAsset = namedtuple('StoredAsset', 'mimetype version sha256 path data')
+
+
+class DatabaseStorage:
+    """Bytes kept in asset.data"""
+    name = 'database'
+
+    def save(self, sha256, data):
+        """Value for asset.data"""
+        return data
+
+    def save_file(self, sha256, source):
+        # The INSERT needs the bytes in memory anyway
+        return source.read()
+
+    def read(self, sha256, data):
+        return bytes(data) if data else None
+
+    def path(self, sha256):
+        return None
+
+
+class FilesystemStorage:
+    """Content-addressed files under a root directory"""
+    name = 'filesystem'
+
+    def __init__(self, root):
+        self.root = root
+
+    def relative_path(self, sha256):
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def path(self, sha256):
+        return os.path.join(self.root, *self.relative_path(sha256).split('/'))
+
+    def save(self, sha256, data):
+        """Write the file once (atomically) and return the value for asset.data (empty)"""
+        return self._write(sha256, lambda target: target.write(data))
+
+    def save_file(self, sha256, source):
+        """Same as save, copying from a file object in chunks"""
+        return self._write(sha256, lambda target: shutil.copyfileobj(source, target))
+
+    def _write(self, sha256, write):
+        path = self.path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+            try:
+                with os.fdopen(handle, 'wb') as temp_file:
+                    write(temp_file)
+                os.replace(temp_path, path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        return b''
+
+    def read(self, sha256, data):
+        try:
+            with open(self.path(sha256), 'rb') as stored:
+                return stored.read()
+        except OSError as e:
+            logging.error(f"Arquivo do asset {sha256[:12]} não encontrado em {self.root}: {e}")
+            return None
+
+
+BACKENDS = {
+    DatabaseStorage.name: DatabaseStorage(),
+    FilesystemStorage.name: FilesystemStorage(ASSET_STORAGE_DIR),
+}
+
+if ASSET_STORAGE not in BACKENDS:
+    logging.warning(f"ASSET_STORAGE inválido: {ASSET_STORAGE!r}, usando 'database'")
+    ASSET_STORAGE = DatabaseStorage.name
+
+
+def get_backend(name=None):
+    """Backend by name; None (or an unknown name) means the one configured for new uploads"""
+    return BACKENDS.get(name or ASSET_STORAGE, BACKENDS[ASSET_STORAGE])
+
+
+def accel_redirect_path(sha256):
+    """Internal nginx URI of a file-backed asset, None when X-Accel-Redirect is off"""
+    if not ASSET_ACCEL_REDIRECT_PREFIX:
+        return None
+    return ASSET_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + BACKENDS['filesystem'].relative_path(sha256)
+
+
+def move_assets(target_name):
+    """Move every asset into the given backend, one at a time. Returns how many moved.
+
+    Moving to 'filesystem' is the reverse of migrate_uploads_to_db: the bytes
+    leave the database. Files left behind when moving back to 'database' are
+    not deleted, since other assets with the same content may still use them.
+    """
+    from models import Asset
+
+    target = BACKENDS[target_name]
+    pending_ids = db.session.query(Asset.id).filter(
+        db.func.coalesce(Asset.storage, DatabaseStorage.name) != target.name
+    ).order_by(Asset.id).all()
+
+    moved = 0
+    for (asset_id,) in pending_ids:
+        try:
+            row = db.session.query(Asset.sha256, Asset.storage, Asset.data).filter(Asset.id == asset_id).one()
+            data = get_backend(row.storage).read(row.sha256, row.data)
+            if data is None:
+                logging.warning(f"Asset {asset_id} sem conteúdo, não foi movido")
+                continue
+            db.session.query(Asset).filter(Asset.id == asset_id).update(
+                {'data': target.save(row.sha256, data), 'storage': target.name},
+                synchronize_session=False
+            )
+            db.session.commit()
+            moved += 1
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Erro ao mover asset {asset_id} para {target.name}: {e}")
+    if moved:
+        logging.info(f"✅ {moved} assets movidos para {target.name}")
+    return moved
+
+
+def remove_unreferenced_files(grace_seconds=GC_GRACE_SECONDS):
+    """Delete stored files no file-backed asset points to. Returns how many were removed."""
+    from models import Asset
+
+    root = BACKENDS['filesystem'].root
+    if not os.path.isdir(root):
+        return 0
+    in_use = {sha256 for (sha256,) in db.session.query(Asset.sha256).filter(
+        Asset.storage == FilesystemStorage.name).distinct()}
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if filename in in_use or os.path.getmtime(path) > cutoff:
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logging.warning(f"Não foi possível apagar {path}: {e}")
+    if removed:
+        logging.info(f"✅ {removed} arquivos sem referência removidos de {root}")
+    return removed
+
+
+if __name__ == "__main__":
+    commands = list(BACKENDS) + ['gc']
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print(f"Uso: python storage.py {'|'.join(commands)}")
+        sys.exit(1)
+    with app.app_context():
+        if sys.argv[1] == 'gc':
+            print(f"{remove_unreferenced_files()} arquivo(s) sem referência removido(s).")
+        else:
+            print(f"{move_assets(sys.argv[1])} asset(s) movido(s) para {sys.argv[1]}.")
@@ -0,0 +1,82 @@
+"""A página inicial faz um número fixo de consultas SQL, qualquer que seja o
+número de salas (sem N+1), num banco SQLite temporário.
+
+Uso: python -m pytest test_index_queries.py
+"""
+from bench_support import use_scratch_database
+
+use_scratch_database('index_queries_test_', 'test.db')
+
+from datetime import date  # noqa: E402
+
+import pytest  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import Classroom, Schedule  # noqa: E402
+from bench_support import QueryCounter, get_or_create_school  # noqa: E402
+import routes  # noqa: E402,F401
+import cache  # noqa: E402
+import facets  # noqa: E402
+import schools  # noqa: E402
+
+SIZES = [10, 50, 200]
+
+
+def populate(school_id, rooms):
+    for number in range(rooms):
+        classroom = Classroom(name=f'Sala {number:03d}', capacity=20 + number % 20, block=f'Bloco {number % 4}',
+                              software='Office, Python', school_id=school_id)
+        db.session.add(classroom)
+        db.session.flush()
+        for day in range(5):
+            db.session.add(Schedule(
+                classroom_id=classroom.id, day_of_week=day, shift='morning',
+                course_name=f'Curso {number % 7}', instructor=f'Professor {number % 5}',
+                start_time='07:30', end_time='12:00',
+                start_date=date(2025, 1, 1), end_date=date(2030, 12, 31)
+            ))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def app_context():
+    with app.app_context():
+        yield
+
+
+@pytest.fixture(scope='module')
+def school_with_rooms(app_context):
+    """Factory: id of a school with exactly `rooms` classrooms (created once per size)"""
+    def build(rooms):
+        school_id = get_or_create_school(f'Check Index {rooms}', 'check')
+        if not Classroom.query.filter_by(school_id=school_id).count():
+            populate(school_id, rooms)
+        return school_id
+    return build
+
+
+def index_queries(school_id):
+    """Queries run by a cold GET / for the school"""
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['active_school_id'] = school_id
+    # Cold caches, including the remembered data version, so every size runs the same queries
+    facets.facet_cache.clear()
+    facets.search_text_cache.clear()
+    schools.school_cache.clear()
+    cache._known_versions.clear()
+
+    with QueryCounter(db.engine) as counter:
+        response = client.get('/')
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.fixture(scope='module')
+def baseline_queries(school_with_rooms):
+    return index_queries(school_with_rooms(SIZES[0]))
+
+
+@pytest.mark.parametrize('rooms', SIZES)
+def test_index_query_count_is_constant(rooms, school_with_rooms, baseline_queries):
+    assert index_queries(school_with_rooms(rooms)) == baseline_queries
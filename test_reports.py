@@ -0,0 +1,43 @@
+"""Testes dos jobs de relatório (reports.py) num banco SQLite temporário.
+
+Uso: python -m pytest test_reports.py
+"""
+import os
+import tempfile
+
+from bench_support import use_scratch_database
+
+use_scratch_database('reports_test_', 'test.db')
+os.environ['EXPORT_DIR'] = tempfile.mkdtemp(prefix='reports_test_exports_')
+
+from datetime import datetime  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import Classroom, Incident  # noqa: E402
+from bench_support import get_or_create_school  # noqa: E402
+from jobs import start_job, wait_for_job, artifact_path  # noqa: E402
+import routes  # noqa: E402,F401 (registers every job kind)
+
+
+def test_incidents_report_job_on_sqlite():
+    # SQLite stores DateTime columns as text; the report must still format them
+    with app.app_context():
+        school_id = get_or_create_school('Teste Relatórios', 'teste')
+        classroom = Classroom(name='Sala 1', capacity=20, school_id=school_id)
+        db.session.add(classroom)
+        db.session.flush()
+        db.session.execute(db.insert(Incident), [
+            dict(classroom_id=classroom.id, reporter_name='Professor', reporter_email='p@senai.br',
+                 description='Projetor <quebrado> & sem cabo', created_at=datetime(2026, 3, 2, 8, 0),
+                 is_active=True, hidden_from_classroom=False, is_resolved=False),
+            dict(classroom_id=classroom.id, reporter_name='Professor', reporter_email='p@senai.br',
+                 description='Ar-condicionado', created_at=datetime(2026, 3, 3, 9, 0),
+                 is_active=True, hidden_from_classroom=False, is_resolved=True,
+                 admin_response='Resolvido', response_date=datetime(2026, 3, 4, 10, 0)),
+        ])
+        db.session.commit()
+
+        job = wait_for_job(start_job('incidents_report', school_id, {'status': ''}), timeout=60)
+        assert job.status == 'done', job.error
+        with open(artifact_path(job), 'rb') as report:
+            assert report.read(5) == b'%PDF-'
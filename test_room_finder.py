@@ -0,0 +1,57 @@
+"""Testes do room_finder.find_rooms num banco SQLite temporário.
+
+Uso: python -m pytest test_room_finder.py
+"""
+from bench_support import use_scratch_database
+
+use_scratch_database('room_finder_test_', 'test.db')
+
+from datetime import date, datetime  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import Classroom, Schedule  # noqa: E402
+from bench_support import get_or_create_school  # noqa: E402
+import room_finder  # noqa: E402
+
+MONDAY = date(2026, 3, 2)
+SUNDAY = date(2026, 3, 8)
+
+
+def setup_school():
+    school_id = get_or_create_school('Teste Busca de Salas', 'teste')
+    if not Classroom.query.filter_by(school_id=school_id).count():
+        small = Classroom(name='Sala 10', capacity=20, has_computers=True, software='Python', school_id=school_id)
+        large = Classroom(name='Sala 40', capacity=40, has_computers=True, software='Python', school_id=school_id)
+        busy = Classroom(name='Sala 30', capacity=30, has_computers=True, software='Python', school_id=school_id)
+        db.session.add_all([small, large, busy])
+        db.session.flush()
+        db.session.add(Schedule(classroom_id=busy.id, day_of_week=MONDAY.weekday(), shift='morning',
+                                course_name='Curso', instructor='Professor', start_time='07:30', end_time='12:00',
+                                start_date=date(2025, 1, 1), end_date=date(2030, 12, 31)))
+        db.session.commit()
+    return school_id
+
+
+def test_free_rooms_ranked_by_best_fit():
+    with app.app_context():
+        result = room_finder.find_rooms(setup_school(), MONDAY, shift='morning', min_capacity=15)
+        assert not result['closed']
+        assert [room.name for room in result['rooms']] == ['Sala 10', 'Sala 40']
+        assert result['matching_rooms'] == 3
+
+
+def test_sunday_offers_no_rooms():
+    with app.app_context():
+        school_id = setup_school()
+        for shift in (None, 'morning', 'night'):
+            result = room_finder.find_rooms(school_id, SUNDAY, shift=shift)
+            assert result['closed']
+            assert result['rooms'] == []
+            assert result['matching_rooms'] == 3
+
+
+def test_outside_school_hours_offers_no_rooms():
+    with app.app_context():
+        result = room_finder.find_rooms(setup_school(), MONDAY, now=datetime(2026, 3, 2, 23, 30))
+        assert result['closed']
+        assert result['rooms'] == []